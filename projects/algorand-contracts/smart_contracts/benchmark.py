@@ -0,0 +1,539 @@
+#!/usr/bin/env python3
+"""
+Opcode cost benchmarks for the PyTeal contracts
+
+Deploys both contracts to LocalNet, simulates every ABI method against them
+and reports opcode cost, box references, box bytes, program size and fee per
+call. Results are compared against benchmarks.json and the run fails when a
+metric regresses by more than the threshold. A run without a baseline
+records one and passes, so a fresh checkout starts gating from its first
+run.
+
+    algokit localnet start
+    python -m smart_contracts.benchmark             # compare against the baseline
+    python -m smart_contracts.benchmark --update    # record a new baseline
+"""
+
+import argparse
+import base64
+import copy
+import json
+import math
+from pathlib import Path
+
+from algosdk import account, encoding
+from algosdk.atomic_transaction_composer import (
+    AccountTransactionSigner,
+    AtomicTransactionComposer,
+    TransactionWithSigner,
+)
+from algosdk.error import AlgodHTTPError
+from algosdk.logic import get_application_address
+from algosdk.transaction import (
+    ApplicationCreateTxn,
+    AssetCreateTxn,
+    AssetTransferTxn,
+    OnComplete,
+    PaymentTxn,
+    StateSchema,
+)
+from algosdk.v2client import algod
+from algosdk.v2client.models import SimulateRequest, SimulateTraceConfig
+
+from smart_contracts.box_export import DIRECTORY_PREFIX, EMPLOYEE_PREFIX
+from smart_contracts.file_sharing_app import contract as file_sharing_contract
+from smart_contracts.network import get_account, get_algod_client
+from smart_contracts.payroll_app import contract as payroll_contract
+from smart_contracts.payroll_app import merkle
+
+BASELINE_PATH = Path(__file__).with_name("benchmarks.json")
+METRICS = ("opcode_cost", "box_refs", "box_bytes", "program_size", "fee")
+DEFAULT_THRESHOLD = 0.05
+
+# Opcode budget of a single app call; calls above it need budget padding
+APP_CALL_BUDGET = 700
+MAX_PROGRAM_PAGE_SIZE = 2048
+
+# Measured calls may exceed the budget of a single call, so simulate grants
+# enough extra budget to report their full cost
+EXTRA_OPCODE_BUDGET = 320000
+
+class Benchmark:
+    """LocalNet deployment of a contract and the measured calls against it"""
+
+    def __init__(self, client: algod.AlgodClient, dispenser: AccountTransactionSigner, dispenser_address: str):
+        self.client = client
+        self.dispenser = dispenser
+        self.dispenser_address = dispenser_address
+        self.sp = client.suggested_params()
+        self.results = {}
+
+        # Application under measurement, set by deploy()
+        self.app_name = None
+        self.app_id = 0
+        self.contract = None
+        self.program_size = 0
+
+    def params(self, fee_txns: int = 1):
+        """Suggested params paying the minimum fee for fee_txns transactions"""
+        sp = copy.copy(self.sp)
+        sp.flat_fee = True
+        sp.fee = max(sp.min_fee, 1000) * fee_txns
+        return sp
+
+    def new_account(self, amount: int = 10_000_000) -> tuple[str, AccountTransactionSigner]:
+        """Create an account funded by the dispenser"""
+        private_key, address = account.generate_account()
+        if amount:
+            self.pay(address, amount)
+        return address, AccountTransactionSigner(private_key)
+
+    def pay(self, receiver: str, amount: int):
+        """Send ALGO from the dispenser"""
+        atc = AtomicTransactionComposer()
+        atc.add_transaction(TransactionWithSigner(
+            PaymentTxn(self.dispenser_address, self.params(), receiver, amount),
+            self.dispenser,
+        ))
+        atc.execute(self.client, 4)
+
+    def create_asset(self, creator: str, signer: AccountTransactionSigner) -> int:
+        """Create a test asset held by creator"""
+        atc = AtomicTransactionComposer()
+        atc.add_transaction(TransactionWithSigner(
+            AssetCreateTxn(creator, self.params(), 10**15, 6, False, unit_name="BENCH", asset_name="Bench asset"),
+            signer,
+        ))
+        result = atc.execute(self.client, 4)
+        return self.client.pending_transaction_info(result.tx_ids[0])["asset-index"]
+
+    def payment(self, sender: str, signer: AccountTransactionSigner, receiver: str, amount: int) -> TransactionWithSigner:
+        """Payment transaction argument for an ABI method call"""
+        return TransactionWithSigner(PaymentTxn(sender, self.params(), receiver, amount), signer)
+
+    def compile_program(self, teal: str) -> bytes:
+        """Assemble TEAL with algod"""
+        return base64.b64decode(self.client.compile(teal)["result"])
+
+    def deploy(self, name: str, contract_module, sender: str, signer: AccountTransactionSigner,
+               global_schema: StateSchema, create_method: str = None, create_args: list = ()) -> int:
+        """Create an application and measure its creation call"""
+        approval, clear, contract = contract_module.compile_contract()
+        approval_program = self.compile_program(approval)
+        clear_program = self.compile_program(clear)
+        program_size = len(approval_program) + len(clear_program)
+        extra_pages = max(0, math.ceil(program_size / MAX_PROGRAM_PAGE_SIZE) - 1)
+
+        atc = AtomicTransactionComposer()
+        if create_method:
+            atc.add_method_call(
+                app_id=0,
+                method=contract.get_method_by_name(create_method),
+                sender=sender,
+                sp=self.params(),
+                signer=signer,
+                method_args=list(create_args),
+                approval_program=approval_program,
+                clear_program=clear_program,
+                global_schema=global_schema,
+                local_schema=StateSchema(0, 0),
+                extra_pages=extra_pages,
+            )
+        else:
+            atc.add_transaction(TransactionWithSigner(
+                ApplicationCreateTxn(
+                    sender, self.params(), OnComplete.NoOpOC,
+                    approval_program, clear_program,
+                    global_schema, StateSchema(0, 0),
+                    extra_pages=extra_pages,
+                ),
+                signer,
+            ))
+
+        self.app_name = name
+        self.app_id = 0
+        self.contract = contract
+        self.program_size = program_size
+        self.results[name] = {}
+
+        result = self.run("create", atc)
+        self.app_id = self.client.pending_transaction_info(result.tx_ids[0])["application-index"]
+        return self.app_id
+
+    def call(self, method_name: str, args: list, sender: str, signer: AccountTransactionSigner,
+             boxes: list = (), fee_txns: int = 1,
+             atc: AtomicTransactionComposer | None = None) -> AtomicTransactionComposer:
+        """Build an ABI method call to the deployed application, appended to atc if given"""
+        atc = atc or AtomicTransactionComposer()
+        atc.add_method_call(
+            app_id=self.app_id,
+            method=self.contract.get_method_by_name(method_name),
+            sender=sender,
+            sp=self.params(fee_txns),
+            signer=signer,
+            method_args=args,
+            boxes=[(0, name) for name in boxes],
+        )
+        return atc
+
+    def measure(self, name: str, atc: AtomicTransactionComposer) -> dict:
+        """Simulate a transaction group and record its metrics under name"""
+        request = SimulateRequest(
+            txn_groups=[],
+            allow_more_logs=True,
+            allow_unnamed_resources=True,
+            extra_opcode_budget=EXTRA_OPCODE_BUDGET,
+            exec_trace_config=SimulateTraceConfig(enable=True, state_change=True),
+        )
+        response = atc.simulate(self.client, request)
+        if response.failure_message:
+            raise RuntimeError(f"{self.app_name}.{name} failed: {response.failure_message}")
+
+        group = response.simulate_response["txn-groups"][0]
+        txns = [t.txn for t in atc.txn_list]
+
+        # Explicit box references plus those simulate had to fill in
+        box_names = set()
+        box_refs = 0
+        for txn in txns:
+            for box in getattr(txn, "boxes", None) or []:
+                box_names.add(box.name)
+                box_refs += 1
+        unnamed = [group.get("unnamed-resources-accessed") or {}]
+        unnamed += [t.get("unnamed-resources-accessed") or {} for t in group["txn-results"]]
+        for resources in unnamed:
+            for box in resources.get("boxes", []):
+                box_names.add(base64.b64decode(box.get("name", "")))
+                box_refs += 1
+            box_refs += resources.get("extra-box-refs", 0)
+
+        # Box bytes touched: the larger of each box's size before the call and
+        # the size written by it
+        written = {}
+        for txn_result in group["txn-results"]:
+            for step in (txn_result.get("exec-trace") or {}).get("approval-program-trace", []):
+                for change in step.get("state-changes", []):
+                    if change.get("app-state-type") != "b":
+                        continue
+                    key = base64.b64decode(change["key"])
+                    value = base64.b64decode((change.get("new-value") or {}).get("bytes", ""))
+                    written[key] = max(written.get(key, 0), len(value))
+        box_bytes = sum(max(self.box_size(name), written.get(name, 0)) for name in box_names)
+
+        # Fee the group needs, including pooled inner transaction fees
+        min_fee = max(self.sp.min_fee, 1000)
+        if response.group_usage is not None:
+            fee = math.ceil(response.group_usage * min_fee / 1_000_000)
+        else:
+            inner_txns = sum(len(t["txn-result"].get("inner-txns", [])) for t in group["txn-results"])
+            fee = (len(txns) + inner_txns) * min_fee
+
+        metrics = {
+            "opcode_cost": group.get("app-budget-consumed", 0),
+            "box_refs": box_refs,
+            "box_bytes": box_bytes,
+            "program_size": self.program_size,
+            "fee": fee,
+        }
+        self.results[self.app_name][name] = metrics
+
+        app_calls = sum(1 for txn in txns if txn.type == "appl")
+        if metrics["opcode_cost"] > APP_CALL_BUDGET * app_calls:
+            print(f"⚠️  {self.app_name}.{name} needs {metrics['opcode_cost']} opcode budget, "
+                  f"more than {app_calls} app call(s) provide")
+
+        return metrics
+
+    def run(self, name: str, atc: AtomicTransactionComposer):
+        """Measure a transaction group (unless name is None), then execute it"""
+        if name:
+            self.measure(name, atc)
+        return atc.execute(self.client, 4)
+
+    def box_size(self, name: bytes) -> int:
+        """Current size of a box of the deployed application, 0 if missing"""
+        if not self.app_id:
+            return 0
+        try:
+            box = self.client.application_box_by_name(self.app_id, name)
+        except AlgodHTTPError:
+            return 0
+        return len(base64.b64decode(box["value"]))
+
+def employee_box(address: str) -> bytes:
+    """Payroll employee box name"""
+    return EMPLOYEE_PREFIX + encoding.decode_address(address)
+
+def directory_box(slot: int) -> bytes:
+    """Payroll slot directory shard box name of a slot"""
+    shard = slot // payroll_contract.DIRECTORY_SHARD_SLOTS.value
+    return DIRECTORY_PREFIX + shard.to_bytes(8, "big")
+
+def bench_payroll(bench: Benchmark):
+    """Measure every payroll method on a payroll of 17 employees"""
+    admin, admin_signer = bench.new_account(50_000_000)
+    app_id = bench.deploy(
+        "payroll_app", payroll_contract, admin, admin_signer,
+        StateSchema(payroll_contract.GLOBAL_NUM_UINTS, payroll_contract.GLOBAL_NUM_BYTE_SLICES),
+        create_method="create_payroll", create_args=[0, 1, admin],
+    )
+    bench.pay(get_application_address(app_id), 20_000_000)
+
+    amount = 200_000
+    employees = [account.generate_account()[1] for _ in range(17)]
+    page = employees[1:]
+
+    # Adding allocates a slot in the directory: every employee here fits in
+    # its first shard
+    bench.run("add_employee", bench.call(
+        "add_employee", [employees[0], amount], admin, admin_signer,
+        boxes=[employee_box(employees[0]), directory_box(0)],
+    ))
+    bench.measure("add_employee_with_asset", bench.call(
+        "add_employee_with_asset", [account.generate_account()[1], amount, 0], admin, admin_signer,
+    ))
+    streamer = account.generate_account()[1]
+    bench.run("add_streaming_employee", bench.call(
+        "add_streaming_employee", [streamer, amount], admin, admin_signer,
+        boxes=[employee_box(streamer), directory_box(1)],
+    ))
+
+    # A batch of 8 fills its call's references, so a companion call carries
+    # the directory shard
+    atc = bench.call(
+        "add_employees", [[(e, amount) for e in page[:8]]], admin, admin_signer,
+        boxes=[employee_box(e) for e in page[:8]],
+    )
+    bench.run("add_employees", bench.call(
+        "get_total_employees", [], admin, admin_signer, boxes=[directory_box(2)], atc=atc,
+    ))
+    atc = bench.call(
+        "add_employees", [[(e, amount) for e in page[8:]]], admin, admin_signer,
+        boxes=[employee_box(e) for e in page[8:]],
+    )
+    bench.run(None, bench.call(
+        "get_total_employees", [], admin, admin_signer, boxes=[directory_box(10)], atc=atc,
+    ))
+    bench.run("pause_employee", bench.call(
+        "pause_employee", [employees[0], True], admin, admin_signer,
+        boxes=[employee_box(employees[0])],
+    ))
+
+    atc = bench.call(
+        "fund_app", [bench.payment(admin, admin_signer, get_application_address(app_id), 1_000_000), 1_000_000],
+        admin, admin_signer,
+    )
+    bench.run("fund_app", atc)
+
+    # Multi-asset funding: opt the app in, then fund it in the same group
+    asset_id = bench.create_asset(admin, admin_signer)
+    bench.run("opt_in_assets", bench.call("opt_in_assets", [[asset_id]], admin, admin_signer, fee_txns=2))
+    atc = bench.call("fund_app_assets", [[asset_id]], admin, admin_signer)
+    atc.add_transaction(TransactionWithSigner(
+        AssetTransferTxn(admin, bench.params(), get_application_address(app_id), 1_000_000, asset_id),
+        admin_signer,
+    ))
+    bench.run("fund_app_assets", atc)
+
+    bench.measure("get_employee_info", bench.call("get_employee_info", [employees[0]], admin, admin_signer))
+    bench.measure("get_employees_info", bench.call(
+        "get_employees_info", [page[:payroll_contract.MAX_EMPLOYEE_INFO_BATCH.value]], admin, admin_signer,
+    ))
+    bench.measure("get_payroll_info", bench.call("get_payroll_info", [], admin, admin_signer))
+    bench.measure("get_total_employees", bench.call("get_total_employees", [], admin, admin_signer))
+
+    # The same page by slot range: the first employee holds slot 0 and the
+    # streaming employee slot 1
+    bench.measure("disburse_slots", bench.call(
+        "disburse_slots", [2, len(page)], admin, admin_signer, fee_txns=1 + len(page),
+    ))
+    bench.measure("get_slot_directory", bench.call("get_slot_directory", [0, 16], admin, admin_signer))
+
+    # A full page: one pooled fee per inner payment
+    bench.measure("disburse", bench.call(
+        "disburse", [page], admin, admin_signer, fee_txns=1 + len(page),
+    ))
+
+    # The same page as a Merkle payroll, claimed by its first leaf
+    tree = merkle.build_tree((e, amount, 0) for e in page)
+    bench.run("commit_merkle_root", bench.call("commit_merkle_root", [tree.root, tree.size], admin, admin_signer))
+    bench.measure("claim_merkle", bench.call(
+        "claim_merkle", [page[0], amount, 0, 0, tree.proof(0)], admin, admin_signer, fee_txns=2,
+    ))
+
+    # Accrued over the rounds since the streaming employee was added
+    bench.measure("claim", bench.call(
+        "claim", [streamer], admin, admin_signer, fee_txns=2,
+        boxes=[employee_box(streamer)],
+    ))
+
+    # Removing frees the slot in the directory; a batch of 8 needs a
+    # companion call for its shard
+    bench.run("remove_employee", bench.call(
+        "remove_employee", [employees[0]], admin, admin_signer,
+        boxes=[employee_box(employees[0]), directory_box(0)],
+    ))
+    atc = bench.call(
+        "remove_employees", [page[:8]], admin, admin_signer,
+        boxes=[employee_box(e) for e in page[:8]],
+    )
+    bench.run("remove_employees", bench.call(
+        "get_total_employees", [], admin, admin_signer, boxes=[directory_box(2)], atc=atc,
+    ))
+    bench.measure("create_payroll", bench.call("create_payroll", [0, 1, admin], admin, admin_signer))
+
+def file_request_boxes(file_id: str, sender: str, recipient: str) -> list[bytes]:
+    """File sharing box names touched when creating a file request"""
+    boxes = [b"file_req_" + file_id.encode()]
+    for user in (sender, recipient):
+        address = encoding.decode_address(user)
+        boxes += [b"user_files_" + address, b"user_page_" + address + (0).to_bytes(8, "big")]
+    return boxes
+
+def bench_file_sharing(bench: Benchmark):
+    """Measure every file sharing method through the escrow lifecycle"""
+    admin, admin_signer = bench.new_account(50_000_000)
+    app_id = bench.deploy(
+        "file_sharing_app", file_sharing_contract, admin, admin_signer,
+        StateSchema(file_sharing_contract.GLOBAL_NUM_UINTS, file_sharing_contract.GLOBAL_NUM_BYTE_SLICES),
+    )
+    app_address = get_application_address(app_id)
+    bench.pay(app_address, 20_000_000)
+
+    sender, sender_signer = bench.new_account()
+    recipient, recipient_signer = bench.new_account()
+    file_hash = bytes(32)
+    fee = 100_000
+
+    def create(name, file_id):
+        bench.run(name, bench.call(
+            "create_file_request",
+            [file_id, recipient, file_hash, 1024, fee, "pdf", False, ""],
+            sender, sender_signer,
+            boxes=file_request_boxes(file_id, sender, recipient),
+        ))
+
+    def approve_and_pay(name, file_id):
+        bench.run(name, bench.call(
+            "approve_and_pay",
+            [file_id, bench.payment(recipient, recipient_signer, app_address, fee)],
+            recipient, recipient_signer,
+            boxes=[b"file_req_" + file_id.encode()],
+        ))
+
+    # Completed transfer
+    create("create_file_request", "bench-a")
+    approve_and_pay("approve_and_pay", "bench-a")
+    bench.measure("get_file_request", bench.call("get_file_request", ["bench-a"], sender, sender_signer))
+    bench.run("confirm_receipt", bench.call(
+        "confirm_receipt", ["bench-a", file_hash], recipient, recipient_signer,
+        boxes=[b"file_req_bench-a"],
+    ))
+
+    # Disputed transfer
+    create(None, "bench-b")
+    approve_and_pay(None, "bench-b")
+    bench.run("dispute_transfer", bench.call(
+        "dispute_transfer", ["bench-b", "not received"], sender, sender_signer,
+        boxes=[b"file_req_bench-b"],
+    ))
+    bench.run("resolve_dispute", bench.call(
+        "resolve_dispute", ["bench-b", "sender_wins"], admin, admin_signer,
+        boxes=[b"file_req_bench-b"],
+    ))
+
+    # Batch settlement of two completed and two disputed transfers
+    for file_id in ("bench-d", "bench-e", "bench-f", "bench-g"):
+        create(None, file_id)
+        approve_and_pay(None, file_id)
+    for file_id in ("bench-f", "bench-g"):
+        bench.run(None, bench.call(
+            "dispute_transfer", [file_id, "not received"], sender, sender_signer,
+            boxes=[b"file_req_" + file_id.encode()],
+        ))
+    bench.run("confirm_receipts", bench.call(
+        "confirm_receipts", [["bench-d", "bench-e"], [file_hash, file_hash]], recipient, recipient_signer,
+        boxes=[b"file_req_bench-d", b"file_req_bench-e"], fee_txns=3,
+    ))
+    bench.run("resolve_disputes", bench.call(
+        "resolve_disputes", [["bench-f", "bench-g"], ["sender_wins", "recipient_wins"]], admin, admin_signer,
+        boxes=[b"file_req_bench-f", b"file_req_bench-g"], fee_txns=3,
+    ))
+
+    # Cancelled request
+    create(None, "bench-c")
+    bench.run("update_file_metadata", bench.call(
+        "update_file_metadata", ["bench-c", bytes(range(32)), 2048, 2 * fee], sender, sender_signer,
+        boxes=[b"file_req_bench-c"],
+    ))
+    bench.run("cancel_request", bench.call(
+        "cancel_request", ["bench-c"], sender, sender_signer,
+        boxes=[b"file_req_bench-c"],
+    ))
+
+    bench.measure("get_user_file_requests", bench.call("get_user_file_requests", [sender, 0, 32], sender, sender_signer))
+    bench.measure("get_stats", bench.call("get_stats", [], admin, admin_signer))
+    bench.measure("emergency_withdraw", bench.call("emergency_withdraw", [100_000], admin, admin_signer))
+    bench.measure("initialize", bench.call("initialize", [admin], admin, admin_signer))
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """List metrics that regressed by more than threshold against the baseline"""
+    regressions = []
+    for app_name, methods in results.items():
+        for method_name, metrics in methods.items():
+            previous = baseline.get(app_name, {}).get(method_name)
+            if previous is None:
+                continue
+            for metric in METRICS:
+                old, new = previous.get(metric), metrics[metric]
+                if old is None:
+                    continue
+                if new > old * (1 + threshold):
+                    regressions.append(f"{app_name}.{method_name} {metric}: {old} -> {new}")
+    return regressions
+
+def print_results(results: dict):
+    """Print one table of metrics per application"""
+    for app_name, methods in results.items():
+        print(f"\n📊 {app_name}")
+        print(f"{'method':<26}" + "".join(f"{metric:>14}" for metric in METRICS))
+        for method_name, metrics in methods.items():
+            print(f"{method_name:<26}" + "".join(f"{metrics[metric]:>14}" for metric in METRICS))
+
+def main():
+    """Run the benchmarks and compare them with the recorded baseline"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--update", action="store_true", help="record the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed relative increase per metric (default: %(default)s)")
+    args = parser.parse_args()
+
+    print("🏁 Benchmarking contracts on LocalNet...")
+    client = get_algod_client()
+    dispenser_address, dispenser = get_account(client, "DISPENSER_MNEMONIC")
+    bench = Benchmark(client, dispenser, dispenser_address)
+
+    bench_payroll(bench)
+    bench_file_sharing(bench)
+    print_results(bench.results)
+
+    # Without a baseline there is nothing to gate on: this run becomes it
+    if not args.update and not BASELINE_PATH.exists():
+        print(f"\n⚠️  No baseline found, recording this run as {BASELINE_PATH.name}")
+    if args.update or not BASELINE_PATH.exists():
+        BASELINE_PATH.write_text(json.dumps(bench.results, indent=2) + "\n")
+        print(f"\n💾 Baseline saved to {BASELINE_PATH.name}")
+        return 0
+
+    regressions = compare(bench.results, json.loads(BASELINE_PATH.read_text()), args.threshold)
+    if regressions:
+        print(f"\n❌ {len(regressions)} metric(s) regressed by more than {args.threshold:.0%}:")
+        for regression in regressions:
+            print(f"   {regression}")
+        return 1
+
+    print(f"\n✅ No regressions beyond {args.threshold:.0%}")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
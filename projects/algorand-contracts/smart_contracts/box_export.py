@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+Streaming export of the box storage of a payroll or file sharing application
+
+Box names are listed page by page, box values are fetched by a bounded pool
+of worker threads and every box is decoded with the contract's own layout
+into a flat record. Records are written as they arrive, so memory stays
+constant whatever the number of boxes.
+
+    python -m smart_contracts.box_export payroll_app 1234 --output employees.jsonl
+    python -m smart_contracts.box_export file_sharing_app 5678 --format csv --output files.csv
+    python -m smart_contracts.box_export payroll_app 1234 --format parquet --output employees.parquet
+
+Parquet output needs pyarrow.
+"""
+
+import argparse
+import base64
+import csv
+import json
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator
+
+from algosdk import encoding
+from algosdk.error import AlgodHTTPError
+from algosdk.v2client import algod
+
+from smart_contracts.file_sharing_app import contract as file_sharing_contract
+from smart_contracts.network import get_algod_client
+from smart_contracts.payroll_app import contract as payroll_contract
+
+DEFAULT_PAGE_SIZE = 1000
+DEFAULT_CONCURRENCY = 8
+
+# Parquet row group size, the number of records buffered before a write
+PARQUET_BATCH_SIZE = 10_000
+
+def get_prefix(constant) -> bytes:
+    """Box name prefix of a contract's Bytes constant"""
+    return json.loads(constant.byte_str).encode()
+
+# Box name prefixes, as used by the contracts
+EMPLOYEE_PREFIX = get_prefix(payroll_contract.EMPLOYEE_PREFIX)
+MERKLE_CLAIMED_PREFIX = get_prefix(payroll_contract.MERKLE_CLAIMED_PREFIX)
+PAID_PREFIX = get_prefix(payroll_contract.PAID_PREFIX)
+DIRECTORY_PREFIX = get_prefix(payroll_contract.DIRECTORY_PREFIX)
+FILE_REQUEST_PREFIX = get_prefix(file_sharing_contract.FILE_REQUEST_PREFIX)
+USER_FILES_PREFIX = get_prefix(file_sharing_contract.USER_FILES_PREFIX)
+USER_FILES_PAGE_PREFIX = get_prefix(file_sharing_contract.USER_FILES_PAGE_PREFIX)
+
+FILE_REQUEST_STATUSES = {
+    value: name.removeprefix("STATUS_").lower()
+    for name, value in vars(file_sharing_contract).items()
+    if name.startswith("STATUS_") and isinstance(value, int)
+}
+
+# Record fields of each application, as name -> type (str, int, bool or list)
+RECORD_FIELDS = {
+    "payroll_app": {
+        "type": "str",
+        "address": "str",
+        "amount": "int",
+        "paused": "bool",
+        "streaming": "bool",
+        "slot": "int",
+        "stream_state": "int",
+        "asa_id": "int",
+        "cycle": "int",
+        "shard": "int",
+        "claimed": "int",
+        "bitmap": "str",
+        "addresses": "list",
+        "name": "str",
+        "value": "str",
+    },
+    "file_sharing_app": {
+        "type": "str",
+        "file_id": "str",
+        "sender": "str",
+        "recipient": "str",
+        "file_hash": "str",
+        "file_size": "int",
+        "access_fee": "int",
+        "status": "str",
+        "is_ipfs": "bool",
+        "file_type": "str",
+        "ipfs_cid": "str",
+        "address": "str",
+        "count": "int",
+        "page": "int",
+        "file_ids": "list",
+        "name": "str",
+        "value": "str",
+    },
+}
+
+def uint64(value: bytes, offset: int) -> int:
+    """Big-endian uint64 at offset"""
+    return int.from_bytes(value[offset:offset + 8], "big")
+
+def unknown_box(name: bytes, value: bytes) -> dict:
+    """Record of a box the decoder does not know"""
+    return {
+        "type": "unknown",
+        "name": base64.b64encode(name).decode(),
+        "value": base64.b64encode(value).decode(),
+    }
+
+def is_slot_set(bitmap: bytes, slot: int) -> bool:
+    """Bit of a slot in a bitmap shard, counted from the most significant bit as GetBit does"""
+    offset = slot % (8 * len(bitmap))
+    return bool(bitmap[offset // 8] >> (7 - offset % 8) & 1)
+
+def decode_payroll_box(name: bytes, value: bytes) -> dict:
+    """Decode a payroll employee, slot directory, paid bitmap or Merkle claimed bitmap box"""
+    if name.startswith(DIRECTORY_PREFIX) and len(name) == len(DIRECTORY_PREFIX) + 8:
+        # Free slots hold a free list link (24 zero bytes first) and are empty
+        marker = payroll_contract.FREE_SLOT_MARKER_LENGTH.value
+        entries = (value[i:i + 32] for i in range(0, len(value), 32))
+        return {
+            "type": "slot_directory",
+            "shard": uint64(name, len(DIRECTORY_PREFIX)),
+            "addresses": ["" if entry[:marker] == bytes(marker) else encoding.encode_address(entry) for entry in entries],
+        }
+
+    for prefix, record_type in ((PAID_PREFIX, "paid_bitmap"), (MERKLE_CLAIMED_PREFIX, "merkle_claims")):
+        if name.startswith(prefix) and len(name) == len(prefix) + 16:
+            return {
+                "type": record_type,
+                "cycle": uint64(name, len(prefix)),
+                "shard": uint64(name, len(prefix) + 8),
+                "claimed": int.from_bytes(value, "big").bit_count(),
+                "bitmap": value.hex(),
+            }
+
+    if not name.startswith(EMPLOYEE_PREFIX):
+        return unknown_box(name, value)
+
+    flags = value[payroll_contract.EMPLOYEE_FLAGS_OFFSET.value]
+    record = {
+        "type": "employee",
+        "address": encoding.encode_address(name[len(EMPLOYEE_PREFIX):]),
+        "amount": uint64(value, payroll_contract.EMPLOYEE_AMOUNT_OFFSET.value),
+        # Bits are counted from the most significant bit, as GetBit does
+        "paused": bool(flags >> (7 - payroll_contract.EMPLOYEE_PAUSED_BIT.value) & 1),
+        "streaming": bool(flags >> (7 - payroll_contract.EMPLOYEE_STREAMING_BIT.value) & 1),
+        "slot": uint64(value, payroll_contract.EMPLOYEE_SLOT_OFFSET.value),
+    }
+    # Only streaming employees carry a stream state: the time they are paid
+    # up to, or the seconds still owed while paused. Employees paid per
+    # cycle are tracked in the paid bitmaps
+    record_size = payroll_contract.EMPLOYEE_BOX_SIZE.value
+    if record["streaming"]:
+        record["stream_state"] = uint64(value, payroll_contract.EMPLOYEE_STREAM_STATE_OFFSET.value)
+        record_size += payroll_contract.STREAM_STATE_LENGTH.value
+    # Only employees paid in another asset than the payroll's carry an ASA ID
+    if len(value) > record_size:
+        record["asa_id"] = uint64(value, record_size)
+    return record
+
+def decode_file_sharing_box(name: bytes, value: bytes) -> dict:
+    """Decode a file request, user file index or user file index page box"""
+    c = file_sharing_contract
+    address_length = c.ADDRESS_LENGTH.value
+
+    if name.startswith(FILE_REQUEST_PREFIX):
+        cid_offset = c.IPFS_CID_OFFSET.value + 2
+        cid_length = int.from_bytes(value[c.IPFS_CID_OFFSET.value:cid_offset], "big")
+        file_type = value[c.FILE_TYPE_OFFSET.value:c.FILE_TYPE_OFFSET.value + c.FILE_TYPE_LENGTH.value]
+        return {
+            "type": "file_request",
+            "file_id": name[len(FILE_REQUEST_PREFIX):].decode(errors="replace"),
+            "sender": encoding.encode_address(value[c.SENDER_OFFSET.value:c.SENDER_OFFSET.value + address_length]),
+            "recipient": encoding.encode_address(value[c.RECIPIENT_OFFSET.value:c.RECIPIENT_OFFSET.value + address_length]),
+            "file_hash": value[c.FILE_HASH_OFFSET.value:c.FILE_HASH_OFFSET.value + c.FILE_HASH_LENGTH.value].hex(),
+            "file_size": uint64(value, c.FILE_SIZE_OFFSET.value),
+            "access_fee": uint64(value, c.ACCESS_FEE_OFFSET.value),
+            "status": FILE_REQUEST_STATUSES.get(value[c.STATUS_OFFSET.value], str(value[c.STATUS_OFFSET.value])),
+            "is_ipfs": bool(value[c.IS_IPFS_OFFSET.value]),
+            "file_type": file_type.rstrip(b"\0").decode(errors="replace"),
+            "ipfs_cid": value[cid_offset:cid_offset + cid_length].decode(errors="replace"),
+        }
+
+    if name.startswith(USER_FILES_PREFIX) and len(name) == len(USER_FILES_PREFIX) + address_length:
+        return {
+            "type": "user_files",
+            "address": encoding.encode_address(name[len(USER_FILES_PREFIX):]),
+            "count": uint64(value, 0),
+        }
+
+    if name.startswith(USER_FILES_PAGE_PREFIX) and len(name) == len(USER_FILES_PAGE_PREFIX) + address_length + 8:
+        # Slots are a length byte and a zero padded file ID; unused slots are empty
+        slot_length = c.FILE_ID_SLOT_LENGTH.value
+        slots = (value[i:i + slot_length] for i in range(0, len(value), slot_length))
+        return {
+            "type": "user_files_page",
+            "address": encoding.encode_address(name[len(USER_FILES_PAGE_PREFIX):-8]),
+            "page": uint64(name, len(name) - 8),
+            "file_ids": [slot[1:1 + slot[0]].decode(errors="replace") for slot in slots if slot[0]],
+        }
+
+    return unknown_box(name, value)
+
+DECODERS = {
+    "payroll_app": decode_payroll_box,
+    "file_sharing_app": decode_file_sharing_box,
+}
+
+def list_box_names(algod_client: algod.AlgodClient, app_id: int, page_size: int = DEFAULT_PAGE_SIZE) -> Iterator[bytes]:
+    """Box names of an application, listed page by page"""
+    params = {"max": page_size}
+    while True:
+        response = algod_client.algod_request("GET", f"/applications/{app_id}/boxes", params=params)
+        for box in response.get("boxes", []):
+            yield base64.b64decode(box["name"])
+
+        # Nodes without paging return every box in one response
+        next_token = response.get("next-token")
+        if not next_token:
+            return
+        params = {"max": page_size, "next": next_token}
+
+def get_box_value(algod_client: algod.AlgodClient, app_id: int, name: bytes) -> bytes | None:
+    """Value of a box, None if it was deleted since it was listed"""
+    try:
+        return base64.b64decode(algod_client.application_box_by_name(app_id, name)["value"])
+    except AlgodHTTPError as e:
+        if e.code == 404:
+            return None
+        raise
+
+def fetch_boxes(algod_client: algod.AlgodClient, app_id: int, names: Iterable[bytes],
+                concurrency: int = DEFAULT_CONCURRENCY) -> Iterator[tuple[bytes, bytes]]:
+    """Fetch box values concurrently, in listing order
+
+    At most twice `concurrency` fetches are pending at any time, so only a
+    bounded window of boxes is held in memory.
+    """
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        pending = deque()
+        for name in names:
+            pending.append((name, pool.submit(get_box_value, algod_client, app_id, name)))
+            if len(pending) >= 2 * concurrency:
+                name, future = pending.popleft()
+                if (value := future.result()) is not None:
+                    yield name, value
+
+        while pending:
+            name, future = pending.popleft()
+            if (value := future.result()) is not None:
+                yield name, value
+
+def export_records(algod_client: algod.AlgodClient, app_name: str, app_id: int,
+                   page_size: int = DEFAULT_PAGE_SIZE, concurrency: int = DEFAULT_CONCURRENCY) -> Iterator[dict]:
+    """Decoded records of every box of an application"""
+    decode = DECODERS[app_name]
+    names = list_box_names(algod_client, app_id, page_size)
+    for name, value in fetch_boxes(algod_client, app_id, names, concurrency):
+        yield decode(name, value)
+
+class JsonlSink:
+    """Write records as JSON lines"""
+
+    def __init__(self, output, fields: dict):
+        self.output = output
+
+    def write(self, record: dict):
+        self.output.write(json.dumps(record) + "\n")
+
+    def close(self):
+        pass
+
+class CsvSink:
+    """Write records as CSV rows over the union of the application's fields"""
+
+    def __init__(self, output, fields: dict):
+        self.lists = [name for name, kind in fields.items() if kind == "list"]
+        self.writer = csv.DictWriter(output, fieldnames=list(fields))
+        self.writer.writeheader()
+
+    def write(self, record: dict):
+        for name in self.lists:
+            if name in record:
+                record = {**record, name: json.dumps(record[name])}
+        self.writer.writerow(record)
+
+    def close(self):
+        pass
+
+class ParquetSink:
+    """Write records as Parquet row groups of PARQUET_BATCH_SIZE records"""
+
+    def __init__(self, output, fields: dict):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        types = {"str": pa.string(), "int": pa.uint64(), "bool": pa.bool_(), "list": pa.list_(pa.string())}
+        self.pa = pa
+        self.schema = pa.schema([(name, types[kind]) for name, kind in fields.items()])
+        self.writer = pq.ParquetWriter(output, self.schema)
+        self.batch = []
+
+    def write(self, record: dict):
+        self.batch.append(record)
+        if len(self.batch) >= PARQUET_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.batch:
+            self.writer.write_table(self.pa.Table.from_pylist(self.batch, schema=self.schema))
+            self.batch = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+SINKS = {
+    "jsonl": JsonlSink,
+    "csv": CsvSink,
+    "parquet": ParquetSink,
+}
+
+def main():
+    """Export the boxes of an application to a file or stdout"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("app", choices=DECODERS, help="contract of the application")
+    parser.add_argument("app_id", type=int, help="application ID")
+    parser.add_argument("--format", choices=SINKS, default="jsonl", help="output format (default: %(default)s)")
+    parser.add_argument("--output", help="output file (default: stdout, not for parquet)")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE,
+                        help="box names listed per request (default: %(default)s)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="concurrent box fetches (default: %(default)s)")
+    args = parser.parse_args()
+
+    if args.format == "parquet" and not args.output:
+        parser.error("parquet output needs --output")
+
+    if args.format == "parquet":
+        output = args.output
+    elif args.output:
+        output = open(args.output, "w", newline="")
+    else:
+        output = sys.stdout
+
+    algod_client = get_algod_client()
+    sink = SINKS[args.format](output, RECORD_FIELDS[args.app])
+    count = 0
+    try:
+        for record in export_records(algod_client, args.app, args.app_id, args.page_size, args.concurrency):
+            sink.write(record)
+            count += 1
+    finally:
+        sink.close()
+        if output not in (sys.stdout, args.output):
+            output.close()
+
+    print(f"✅ Exported {count} boxes of App ID {args.app_id}", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
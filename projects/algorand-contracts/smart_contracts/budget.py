@@ -0,0 +1,139 @@
+"""
+Opcode budget padding for app calls that can exceed a single call's budget
+
+Every app call in a group adds 700 to the group's pooled opcode budget. A
+BudgetPadder simulates a call once, works out the fewest bare no-op calls
+to the same application that make it fit, and appends them to the group.
+The decision is cached per method and payload size bucket (powers of two),
+so later calls of a similar size go out padded without simulating first,
+and small payloads never pay for the worst case.
+
+The application must approve bare no-op calls, as FileSharingApp and
+PayrollApp do.
+
+    padder = BudgetPadder(algod_client, app_id, sender, signer, cache_path=Path("budget_cache.json"))
+    padder.execute("update_file_metadata", len(file_id), lambda atc: atc.add_method_call(...))
+"""
+
+import json
+import math
+import os
+from pathlib import Path
+from typing import Callable
+
+from algosdk.atomic_transaction_composer import (
+    AtomicTransactionComposer,
+    AtomicTransactionResponse,
+    TransactionSigner,
+    TransactionWithSigner,
+)
+from algosdk.error import AlgodHTTPError
+from algosdk.transaction import ApplicationNoOpTxn
+from algosdk.v2client import algod
+from algosdk.v2client.models import SimulateRequest
+
+# Opcode budget added by each app call in a group
+APP_CALL_BUDGET = 700
+MAX_GROUP_SIZE = 16
+
+# Budget granted to the measuring simulation, enough for any call
+EXTRA_OPCODE_BUDGET = 320000
+
+BUDGET_EXCEEDED = "dynamic cost budget exceeded"
+
+class BudgetError(Exception):
+    """A call needs more budget than a full group of padding provides"""
+
+def get_bucket(payload_size: int) -> int:
+    """Payload size bucket: the next power of two"""
+    return 1 << max(0, payload_size - 1).bit_length()
+
+class BudgetPadder:
+    """Pads transaction groups of one application with opcode budget calls"""
+
+    def __init__(self, algod_client: algod.AlgodClient, app_id: int, sender: str, signer: TransactionSigner,
+                 cache_path: Path | None = None):
+        self.algod_client = algod_client
+        self.app_id = app_id
+        self.sender = sender
+        self.signer = signer
+        self.cache_path = cache_path
+        self.cache = json.loads(cache_path.read_text()) if cache_path and cache_path.exists() else {}
+
+    def compose(self, build: Callable[[AtomicTransactionComposer], None], padding: int) -> AtomicTransactionComposer:
+        """Group built by build() followed by padding budget calls"""
+        atc = AtomicTransactionComposer()
+        build(atc)
+        if padding + atc.get_tx_count() > MAX_GROUP_SIZE:
+            raise BudgetError(f"{padding} budget calls do not fit in a group of {atc.get_tx_count()}")
+
+        # Fresh params for every group: a long-lived padder would otherwise
+        # outlive their validity window
+        sp = self.algod_client.suggested_params() if padding else None
+        for _ in range(padding):
+            # Random notes keep the otherwise identical calls distinct
+            atc.add_transaction(TransactionWithSigner(
+                ApplicationNoOpTxn(self.sender, sp, self.app_id, note=b"budget:" + os.urandom(8)),
+                self.signer,
+            ))
+        return atc
+
+    def simulate(self, build: Callable[[AtomicTransactionComposer], None], padding: int,
+                 extra_opcode_budget: int = 0) -> dict:
+        """Simulate a padded group, returning its first group result"""
+        request = SimulateRequest(txn_groups=[], extra_opcode_budget=extra_opcode_budget)
+        response = self.compose(build, padding).simulate(self.algod_client, request)
+        group = response.simulate_response["txn-groups"][0]
+        if response.failure_message and BUDGET_EXCEEDED not in response.failure_message:
+            raise RuntimeError(response.failure_message)
+        return group
+
+    def measure(self, build: Callable[[AtomicTransactionComposer], None]) -> int:
+        """Fewest budget calls that let the group succeed"""
+        atc = AtomicTransactionComposer()
+        build(atc)
+        app_calls = sum(1 for txn in atc.txn_list if txn.txn.type == "appl")
+
+        # Estimate from the unpadded cost, then add calls until it fits: the
+        # budget calls cost a few opcodes themselves
+        cost = self.simulate(build, 0, EXTRA_OPCODE_BUDGET).get("app-budget-consumed", 0)
+        padding = max(0, math.ceil(cost / APP_CALL_BUDGET) - app_calls)
+        while "failure-message" in self.simulate(build, padding):
+            padding += 1
+        return padding
+
+    def get_padding(self, method_name: str, payload_size: int) -> int | None:
+        """Cached padding of a method and payload size, None if unknown"""
+        return self.cache.get(method_name, {}).get(str(get_bucket(payload_size)))
+
+    def set_padding(self, method_name: str, payload_size: int, padding: int):
+        """Record the padding of a bucket, keeping the largest one seen"""
+        bucket = self.cache.setdefault(method_name, {})
+        key = str(get_bucket(payload_size))
+        bucket[key] = max(bucket.get(key, 0), padding)
+        if self.cache_path:
+            self.cache_path.write_text(json.dumps(self.cache, indent=2, sort_keys=True) + "\n")
+
+    def execute(self, method_name: str, payload_size: int, build: Callable[[AtomicTransactionComposer], None],
+                wait_rounds: int = 4) -> AtomicTransactionResponse:
+        """Execute a group padded with the cached (or measured) budget calls
+
+        build(atc) adds the group's transactions; it may be called several
+        times. A group rejected for lack of budget is measured again and
+        retried once.
+        """
+        padding = self.get_padding(method_name, payload_size)
+        if padding is None:
+            padding = self.measure(build)
+            self.set_padding(method_name, payload_size, padding)
+
+        try:
+            return self.compose(build, padding).execute(self.algod_client, wait_rounds)
+        except AlgodHTTPError as e:
+            if BUDGET_EXCEEDED not in str(e):
+                raise
+
+        # A larger payload of the same bucket needed more budget
+        padding = self.measure(build)
+        self.set_padding(method_name, payload_size, padding)
+        return self.compose(build, padding).execute(self.algod_client, wait_rounds)
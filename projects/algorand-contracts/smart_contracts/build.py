@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Incremental build of the PyTeal contracts
+
+Each contract is rebuilt only when its source, the PyTeal version or the
+build options changed since the last build, and stale contracts are built in
+parallel worker processes. Outputs are written next to each contract:
+
+    contract.algo / contract.clear.algo    approval and clear TEAL
+    contract.json                          ARC-4 contract description
+    contract.algo.bin / contract.clear.algo.bin
+                                           assembled programs (--assemble)
+
+    python -m smart_contracts.build                     # build what changed
+    python -m smart_contracts.build payroll_app --profile debug
+    python -m smart_contracts.build --assemble          # also assemble with algod
+"""
+
+import argparse
+import base64
+import hashlib
+import importlib
+import json
+from concurrent.futures import ProcessPoolExecutor
+from importlib import metadata
+from pathlib import Path
+
+SMART_CONTRACTS_DIR = Path(__file__).parent
+CACHE_PATH = SMART_CONTRACTS_DIR / ".build_cache.json"
+
+# Bump to invalidate every cached build when the build outputs change
+BUILD_FORMAT_VERSION = 1
+
+# Contracts built by default, as folder name -> contract module
+CONTRACTS = {
+    "payroll_app": "smart_contracts.payroll_app.contract",
+    "file_sharing_app": "smart_contracts.file_sharing_app.contract",
+}
+
+def get_output_paths(app_name: str, assemble: bool) -> list[Path]:
+    """Files written by the build of a contract"""
+    app_dir = SMART_CONTRACTS_DIR / app_name
+    paths = [app_dir / "contract.algo", app_dir / "contract.clear.algo", app_dir / "contract.json"]
+    if assemble:
+        paths += [app_dir / "contract.algo.bin", app_dir / "contract.clear.algo.bin"]
+    return paths
+
+def get_build_hash(app_name: str, options: dict) -> str:
+    """Content hash of everything a contract build depends on"""
+    digest = hashlib.sha256()
+    digest.update((SMART_CONTRACTS_DIR / app_name / "contract.py").read_bytes())
+    digest.update(json.dumps({
+        "format": BUILD_FORMAT_VERSION,
+        "pyteal": metadata.version("pyteal"),
+        "options": options,
+    }, sort_keys=True).encode())
+    return digest.hexdigest()
+
+def load_cache() -> dict:
+    """Build hashes of the last successful builds"""
+    if not CACHE_PATH.exists():
+        return {}
+    try:
+        return json.loads(CACHE_PATH.read_text())
+    except json.JSONDecodeError:
+        return {}
+
+def build_contract(app_name: str, options: dict) -> str:
+    """Compile one contract and write its outputs (runs in a worker process)"""
+    contract_module = importlib.import_module(CONTRACTS[app_name])
+
+    # Only contracts with compile profiles take one
+    if hasattr(contract_module, "PROFILES"):
+        approval, clear, contract = contract_module.compile_contract(options["profile"])
+    else:
+        approval, clear, contract = contract_module.compile_contract()
+
+    approval_path, clear_path, contract_path, *bin_paths = get_output_paths(app_name, options["assemble"])
+    approval_path.write_text(approval)
+    clear_path.write_text(clear)
+    contract_path.write_text(json.dumps(contract.dictify(), indent=2))
+
+    if options["assemble"]:
+        from smart_contracts.network import get_algod_client
+
+        client = get_algod_client()
+        for teal, bin_path in zip((approval, clear), bin_paths):
+            bin_path.write_bytes(base64.b64decode(client.compile(teal)["result"]))
+
+    return app_name
+
+def main():
+    """Build the contracts whose inputs changed since the last build"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("contracts", nargs="*", help=f"contracts to build (default: {', '.join(CONTRACTS)})")
+    parser.add_argument("--profile", choices=("debug", "release"), default="release",
+                        help="compile profile of contracts that have one (default: %(default)s)")
+    parser.add_argument("--assemble", action="store_true", help="also assemble the TEAL with algod")
+    parser.add_argument("--force", action="store_true", help="rebuild even if nothing changed")
+    args = parser.parse_args()
+
+    unknown = set(args.contracts) - set(CONTRACTS)
+    if unknown:
+        parser.error(f"unknown contracts: {', '.join(sorted(unknown))}")
+
+    options = {"profile": args.profile, "assemble": args.assemble}
+    cache = load_cache()
+
+    stale = {}
+    for app_name in args.contracts or CONTRACTS:
+        build_hash = get_build_hash(app_name, options)
+        outputs_exist = all(path.exists() for path in get_output_paths(app_name, args.assemble))
+        if not args.force and outputs_exist and cache.get(app_name) == build_hash:
+            print(f"⏭️  {app_name} is up to date")
+        else:
+            stale[app_name] = build_hash
+
+    if not stale:
+        return 0
+
+    # One fresh process per contract: PyTeal keeps compile state per process
+    print(f"🔨 Building {', '.join(stale)}...")
+    failed = False
+    with ProcessPoolExecutor(max_workers=len(stale), max_tasks_per_child=1) as pool:
+        futures = {app_name: pool.submit(build_contract, app_name, options) for app_name in stale}
+        for app_name, future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                print(f"❌ {app_name} build failed: {e}")
+                cache.pop(app_name, None)
+                failed = True
+            else:
+                print(f"✅ {app_name} built")
+                cache[app_name] = stale[app_name]
+
+    CACHE_PATH.write_text(json.dumps(cache, indent=2, sort_keys=True) + "\n")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -1,529 +1,704 @@
 from pyteal import *
 from typing import Literal
+from algosdk import abi as sdk_abi
 
 # Constants
 FILE_REQUEST_PREFIX = Bytes("file_req_")
 USER_FILES_PREFIX = Bytes("user_files_")
+USER_FILES_PAGE_PREFIX = Bytes("user_page_")
 STATS_PREFIX = Bytes("stats")
 ADMIN_KEY = Bytes("admin")
 TOTAL_FILES_KEY = Bytes("total_files")
 TOTAL_VALUE_KEY = Bytes("total_value")
+ESCROWED_VALUE_KEY = Bytes("escrowed_value")
 
-def file_sharing_contract() -> Expr:
-    """Main contract logic for secure file sharing with escrow"""
-    
-    # On creation, initialize the contract
-    on_creation = Seq([
-        App.globalPut(ADMIN_KEY, Txn.sender()),
-        App.globalPut(TOTAL_FILES_KEY, Int(0)),
-        App.globalPut(TOTAL_VALUE_KEY, Int(0)),
-        Approve()
+# Global state schema: admin is the only byte slice, the uints are the
+# totals, the escrowed value and one counter per status
+GLOBAL_NUM_UINTS = 9
+GLOBAL_NUM_BYTE_SLICES = 1
+
+# File request record layout (fixed offsets, big-endian integers):
+# sender(32) | recipient(32) | file_hash(32) | file_size(8) | access_fee(8) |
+# status(1) | is_ipfs(1) | file_type(16, zero padded) | cid_length(2) | ipfs_cid
+ADDRESS_LENGTH = Int(32)
+FILE_HASH_LENGTH = Int(32)
+FILE_TYPE_LENGTH = Int(16)
+MAX_IPFS_CID_LENGTH = Int(128)
+SENDER_OFFSET = Int(0)
+RECIPIENT_OFFSET = Int(32)
+FILE_HASH_OFFSET = Int(64)
+FILE_SIZE_OFFSET = Int(96)
+ACCESS_FEE_OFFSET = Int(104)
+STATUS_OFFSET = Int(112)
+IS_IPFS_OFFSET = Int(113)
+FILE_TYPE_OFFSET = Int(114)
+IPFS_CID_OFFSET = Int(130)
+
+# File request status codes
+STATUS_PENDING = 0
+STATUS_PAID = 1
+STATUS_COMPLETED = 2
+STATUS_DISPUTED = 3
+STATUS_RESOLVED_SENDER = 4
+STATUS_RESOLVED_RECIPIENT = 5
+
+# Number of file requests in each status, kept up to date on every transition
+STATUS_COUNT_KEYS = {
+    STATUS_PENDING: Bytes("pending_count"),
+    STATUS_PAID: Bytes("paid_count"),
+    STATUS_COMPLETED: Bytes("completed_count"),
+    STATUS_DISPUTED: Bytes("disputed_count"),
+    STATUS_RESOLVED_SENDER: Bytes("resolved_sender_count"),
+    STATUS_RESOLVED_RECIPIENT: Bytes("resolved_recipient_count"),
+}
+
+# Per-user file index: a head box `user_files_<addr>` holding the uint64 count
+# of file IDs, and append-only page boxes `user_page_<addr><page uint64>` of
+# fixed-width slots, each a length byte followed by the zero padded file ID
+MAX_FILE_ID_LENGTH = Int(31)
+FILE_ID_SLOT_LENGTH = Int(32)
+FILE_IDS_PER_PAGE = Int(32)
+USER_FILES_PAGE_SIZE = Int(1024)
+
+# getUserFileRequests pages: at most one index page of entries, read with
+# simulate as a page outgrows the references and budget of a single call
+MAX_USER_FILE_REQUESTS_LIMIT = Int(32)
+
+# Batch settlement: one inner payment per file request, and an inner group
+# holds at most 16 transactions
+MAX_SETTLEMENT_BATCH = Int(16)
+
+# Program version (9 for group resource sharing, so the box and account
+# references of a settlement batch can be spread across the group)
+PROGRAM_VERSION = 9
+
+class FileRequest(abi.NamedTuple):
+    """File request record as returned by get_user_file_requests
+
+    Its ABI encoding is the box record with is_ipfs as an ABI bool and the
+    offset of ipfs_cid inserted before it.
+    """
+    sender: abi.Field[abi.Address]
+    recipient: abi.Field[abi.Address]
+    file_hash: abi.Field[abi.StaticBytes[Literal[32]]]
+    file_size: abi.Field[abi.Uint64]
+    access_fee: abi.Field[abi.Uint64]
+    status: abi.Field[abi.Uint8]
+    is_ipfs: abi.Field[abi.Bool]
+    file_type: abi.Field[abi.StaticBytes[Literal[16]]]
+    ipfs_cid: abi.Field[abi.String]
+
+class UserFileRequest(abi.NamedTuple):
+    """Entry of a user's file index as returned by get_user_file_requests
+
+    slot is the entry's position in the index. Cancelled requests keep
+    their slot, with exists false and an all-zero request.
+    """
+    slot: abi.Field[abi.Uint64]
+    file_id: abi.Field[abi.String]
+    exists: abi.Field[abi.Bool]
+    request: abi.Field[FileRequest]
+
+class FileSharingStats(abi.NamedTuple):
+    """Application statistics as returned by get_stats"""
+    total_files: abi.Field[abi.Uint64]
+    total_value: abi.Field[abi.Uint64]
+    escrowed_value: abi.Field[abi.Uint64]
+    pending: abi.Field[abi.Uint64]
+    paid: abi.Field[abi.Uint64]
+    completed: abi.Field[abi.Uint64]
+    disputed: abi.Field[abi.Uint64]
+    resolved_sender: abi.Field[abi.Uint64]
+    resolved_recipient: abi.Field[abi.Uint64]
+
+def status_byte(status: int) -> Expr:
+    """Single byte encoding of a status code"""
+    return Bytes("base16", "%02x" % status)
+
+def get_sender(file_request_key: Expr) -> Expr:
+    """Read the sender address of a file request"""
+    return App.box_extract(file_request_key, SENDER_OFFSET, ADDRESS_LENGTH)
+
+def get_recipient(file_request_key: Expr) -> Expr:
+    """Read the recipient address of a file request"""
+    return App.box_extract(file_request_key, RECIPIENT_OFFSET, ADDRESS_LENGTH)
+
+def get_access_fee(file_request_key: Expr) -> Expr:
+    """Read the access fee of a file request"""
+    return ExtractUint64(App.box_extract(file_request_key, ACCESS_FEE_OFFSET, Int(8)), Int(0))
+
+def get_status(file_request_key: Expr) -> Expr:
+    """Read the status code of a file request"""
+    return GetByte(App.box_extract(file_request_key, STATUS_OFFSET, Int(1)), Int(0))
+
+def set_status(file_request_key: Expr, status: int) -> Expr:
+    """Update the status of a file request in place"""
+    return App.box_replace(file_request_key, STATUS_OFFSET, status_byte(status))
+
+def add_to_global(key: Expr, amount: Expr) -> Expr:
+    """Increase a global counter"""
+    return App.globalPut(key, App.globalGet(key) + amount)
+
+def subtract_from_global(key: Expr, amount: Expr) -> Expr:
+    """Decrease a global counter"""
+    return App.globalPut(key, App.globalGet(key) - amount)
+
+def transition(file_request_key: Expr, from_status: int, to_status: int) -> Expr:
+    """Move a file request from one status to another, updating the counters"""
+    return Seq([
+        set_status(file_request_key, to_status),
+        subtract_from_global(STATUS_COUNT_KEYS[from_status], Int(1)),
+        add_to_global(STATUS_COUNT_KEYS[to_status], Int(1)),
     ])
-    
-    # Handle different application calls
-    handle_noop = Cond(
-        [Txn.application_args[0] == Bytes("initialize"), handle_initialize()],
-        [Txn.application_args[0] == Bytes("create_file_request"), handle_create_file_request()],
-        [Txn.application_args[0] == Bytes("approve_and_pay"), handle_approve_and_pay()],
-        [Txn.application_args[0] == Bytes("confirm_receipt"), handle_confirm_receipt()],
-        [Txn.application_args[0] == Bytes("dispute_transfer"), handle_dispute_transfer()],
-        [Txn.application_args[0] == Bytes("resolve_dispute"), handle_resolve_dispute()],
-        [Txn.application_args[0] == Bytes("cancel_request"), handle_cancel_request()],
-        [Txn.application_args[0] == Bytes("get_file_request"), handle_get_file_request()],
-        [Txn.application_args[0] == Bytes("get_user_file_requests"), handle_get_user_file_requests()],
-        [Txn.application_args[0] == Bytes("update_file_metadata"), handle_update_file_metadata()],
-        [Txn.application_args[0] == Bytes("emergency_withdraw"), handle_emergency_withdraw()],
-        [Txn.application_args[0] == Bytes("get_stats"), handle_get_stats()],
-    )
-    
-    # Handle opt-in
-    handle_optin = Approve()
-    
-    # Handle close-out
-    handle_closeout = Approve()
-    
-    # Handle update application (admin only)
-    handle_updateapp = Return(Txn.sender() == App.globalGet(ADMIN_KEY))
-    
-    # Handle delete application (admin only)
-    handle_deleteapp = Return(Txn.sender() == App.globalGet(ADMIN_KEY))
-    
-    return Cond(
-        [Txn.application_id() == Int(0), on_creation],
-        [Txn.on_completion() == OnComplete.OptIn, handle_optin],
-        [Txn.on_completion() == OnComplete.CloseOut, handle_closeout],
-        [Txn.on_completion() == OnComplete.UpdateApplication, handle_updateapp],
-        [Txn.on_completion() == OnComplete.DeleteApplication, handle_deleteapp],
-        [Txn.on_completion() == OnComplete.NoOp, handle_noop],
+
+def settle(file_request_key: Expr, receiver: Expr, from_status: int, to_status: int) -> Expr:
+    """Set inner payment fields releasing an escrowed fee and update the request"""
+    return Seq([
+        # Fees are pooled on the outer batch call
+        InnerTxnBuilder.SetFields({
+            TxnField.type_enum: TxnType.Payment,
+            TxnField.receiver: receiver,
+            TxnField.amount: get_access_fee(file_request_key),
+            TxnField.fee: Int(0),
+        }),
+        transition(file_request_key, from_status, to_status),
+        subtract_from_global(ESCROWED_VALUE_KEY, get_access_fee(file_request_key)),
+    ])
+
+def uint16_bytes(value: Expr) -> Expr:
+    """Two byte big-endian encoding of a value, as ABI lengths and offsets"""
+    return Extract(Itob(value), Int(6), Int(2))
+
+def encode_file_request(record: Expr) -> Expr:
+    """ABI encoding of a FileRequest from a file request record"""
+    return Concat(
+        Extract(record, SENDER_OFFSET, IS_IPFS_OFFSET),
+        If(GetByte(record, IS_IPFS_OFFSET), Bytes("base16", "80"), Bytes("base16", "00")),
+        Extract(record, FILE_TYPE_OFFSET, FILE_TYPE_LENGTH),
+        # ipfs_cid is the only dynamic field: its tail follows the head
+        uint16_bytes(IPFS_CID_OFFSET + Int(2)),
+        Suffix(record, IPFS_CID_OFFSET),
     )
 
-def handle_initialize() -> Expr:
+def get_user_files_page_key(user_address: Expr, page: Expr) -> Expr:
+    """Generate box storage key for a page of a user's file index"""
+    return Concat(USER_FILES_PAGE_PREFIX, user_address, Itob(page))
+
+@Subroutine(TealType.none)
+def append_user_file(user_address: Expr, file_id: Expr) -> Expr:
+    """Append a file ID to a user's paged file index"""
+    user_files_key = Concat(USER_FILES_PREFIX, user_address)
+    user_files = App.box_get(user_files_key)
+    count = ScratchVar(TealType.uint64)
+    page_key = ScratchVar(TealType.bytes)
+
+    return Seq([
+        user_files,
+        count.store(If(user_files.hasValue(), Btoi(user_files.value()), Int(0))),
+        page_key.store(get_user_files_page_key(user_address, count.load() / FILE_IDS_PER_PAGE)),
+
+        # Open a new page when the previous one is full
+        If(count.load() % FILE_IDS_PER_PAGE == Int(0),
+            Assert(App.box_create(page_key.load(), USER_FILES_PAGE_SIZE))
+        ),
+
+        # Write the slot and bump the count, both constant size writes
+        App.box_replace(
+            page_key.load(),
+            (count.load() % FILE_IDS_PER_PAGE) * FILE_ID_SLOT_LENGTH,
+            Concat(Extract(Itob(Len(file_id)), Int(7), Int(1)), file_id),
+        ),
+        App.box_put(user_files_key, Itob(count.load() + Int(1))),
+    ])
+
+def is_admin() -> Expr:
+    """Check the caller is the application admin"""
+    return Txn.sender() == App.globalGet(ADMIN_KEY)
+
+# Secure file sharing with escrow. Methods are matched against the selector
+# in registration order, so the file request lifecycle calls come first.
+router = Router(
+    "FileSharingApp",
+    BareCallActions(
+        # On creation, initialize the contract. Later bare calls do nothing:
+        # clients add them to a group to pool more opcode budget
+        no_op=OnCompleteAction.always(If(Txn.application_id() == Int(0), Seq([
+            App.globalPut(ADMIN_KEY, Txn.sender()),
+            App.globalPut(TOTAL_FILES_KEY, Int(0)),
+            App.globalPut(TOTAL_VALUE_KEY, Int(0)),
+            App.globalPut(ESCROWED_VALUE_KEY, Int(0)),
+            *[App.globalPut(key, Int(0)) for key in STATUS_COUNT_KEYS.values()],
+        ]))),
+        opt_in=OnCompleteAction.call_only(Approve()),
+        close_out=OnCompleteAction.call_only(Approve()),
+        # Update and delete application (admin only)
+        update_application=OnCompleteAction.call_only(Assert(is_admin())),
+        delete_application=OnCompleteAction.call_only(Assert(is_admin())),
+    ),
+    clear_state=Approve(),
+)
+
+@router.method(name="initialize")
+def handle_initialize(admin: abi.Address) -> Expr:
     """Initialize the file sharing application"""
     return Seq([
-        Assert(Txn.sender() == App.globalGet(ADMIN_KEY)),
-        App.globalPut(ADMIN_KEY, Txn.application_args[1]),
-        Approve()
+        Assert(is_admin()),
+        App.globalPut(ADMIN_KEY, admin.get()),
     ])
 
-def handle_create_file_request() -> Expr:
+@router.method(name="create_file_request")
+def handle_create_file_request(
+    file_id: abi.String,
+    recipient: abi.Address,
+    file_hash: abi.StaticBytes[Literal[32]],
+    file_size: abi.Uint64,
+    access_fee: abi.Uint64,
+    file_type: abi.String,
+    is_ipfs: abi.Bool,
+    ipfs_cid: abi.String,
+) -> Expr:
     """Create a file sharing request with escrow"""
-    file_id = Txn.application_args[1]
-    recipient = Txn.application_args[2]
-    file_hash = Txn.application_args[3]
-    file_size = Btoi(Txn.application_args[4])
-    access_fee = Btoi(Txn.application_args[5])
-    file_type = Txn.application_args[6]
-    is_ipfs = Txn.application_args[7]
-    ipfs_cid = Txn.application_args[8]
-    
     # Create file request key
-    file_request_key = Concat(FILE_REQUEST_PREFIX, file_id)
-    
-    # Create user files key for sender
-    sender_files_key = Concat(USER_FILES_PREFIX, Txn.sender())
-    
-    # Create user files key for recipient
-    recipient_files_key = Concat(USER_FILES_PREFIX, recipient)
-    
+    file_request_key = Concat(FILE_REQUEST_PREFIX, file_id.get())
+    file_request = App.box_length(file_request_key)
+
     return Seq([
         # Check if file request already exists
-        Assert(App.box_get(file_request_key)[1] == Int(0)),
-        
-        # Create file request data
-        file_data = Concat(
-            Concat(
-                Concat(
-                    Concat(
-                        Concat(
-                            Concat(
-                                Concat(
-                                    Concat(Txn.sender(), Bytes(",")),
-                                    Concat(recipient, Bytes(","))
-                                ),
-                                Concat(file_hash, Bytes(","))
-                            ),
-                            Concat(Itob(file_size), Bytes(","))
-                        ),
-                        Concat(Itob(access_fee), Bytes(","))
-                    ),
-                    Concat(file_type, Bytes(","))
-                ),
-                Concat(is_ipfs, Bytes(","))
-            ),
-            ipfs_cid
-        ),
-        
+        file_request,
+        Assert(Not(file_request.hasValue())),
+
+        # Validate variable-width fields (addresses and hashes are fixed by the ABI)
+        Assert(file_id.length() <= MAX_FILE_ID_LENGTH),
+        Assert(file_type.length() <= FILE_TYPE_LENGTH),
+        Assert(ipfs_cid.length() <= MAX_IPFS_CID_LENGTH),
+
         # Store file request in box storage
-        App.box_put(file_request_key, file_data),
-        
+        App.box_put(file_request_key, Concat(
+            Txn.sender(),
+            recipient.get(),
+            file_hash.get(),
+            Itob(file_size.get()),
+            Itob(access_fee.get()),
+            status_byte(STATUS_PENDING),
+            Extract(Itob(is_ipfs.get()), Int(7), Int(1)),
+            file_type.get(),
+            BytesZero(FILE_TYPE_LENGTH - file_type.length()),
+            Extract(Itob(ipfs_cid.length()), Int(6), Int(2)),
+            ipfs_cid.get(),
+        )),
+
         # Add to sender's file list
-        sender_files = App.box_get(sender_files_key),
-        If(sender_files[1] == Int(0),
-            App.box_put(sender_files_key, file_id),
-            App.box_put(sender_files_key, Concat(sender_files[0], Concat(Bytes(","), file_id)))
-        ),
-        
+        append_user_file(Txn.sender(), file_id.get()),
+
         # Add to recipient's file list
-        recipient_files = App.box_get(recipient_files_key),
-        If(recipient_files[1] == Int(0),
-            App.box_put(recipient_files_key, file_id),
-            App.box_put(recipient_files_key, Concat(recipient_files[0], Concat(Bytes(","), file_id)))
-        ),
-        
+        append_user_file(recipient.get(), file_id.get()),
+
         # Update statistics
-        App.globalPut(TOTAL_FILES_KEY, App.globalGet(TOTAL_FILES_KEY) + Int(1)),
-        App.globalPut(TOTAL_VALUE_KEY, App.globalGet(TOTAL_VALUE_KEY) + access_fee),
-        
-        Approve()
+        add_to_global(TOTAL_FILES_KEY, Int(1)),
+        add_to_global(TOTAL_VALUE_KEY, access_fee.get()),
+        add_to_global(STATUS_COUNT_KEYS[STATUS_PENDING], Int(1)),
     ])
 
-def handle_approve_and_pay() -> Expr:
+@router.method(name="approve_and_pay")
+def handle_approve_and_pay(file_id: abi.String, payment: abi.PaymentTransaction) -> Expr:
     """Recipient approves and pays for file access"""
-    file_id = Txn.application_args[1]
-    file_request_key = Concat(FILE_REQUEST_PREFIX, file_id)
-    
+    file_request_key = Concat(FILE_REQUEST_PREFIX, file_id.get())
+    file_request = App.box_length(file_request_key)
+
     return Seq([
         # Get file request
-        file_request = App.box_get(file_request_key),
-        Assert(file_request[1] == Int(1)),
-        
-        # Parse file request data
-        file_data = file_request[0],
-        
-        # Extract recipient address (second field)
-        recipient_start = Substring(file_data, Int(0), IndexOf(file_data, Bytes(","))),
-        remaining = Substring(file_data, Add(IndexOf(file_data, Bytes(",")), Int(1)), Len(file_data)),
-        recipient_end = Add(IndexOf(remaining, Bytes(",")), IndexOf(file_data, Bytes(","))),
-        recipient = Substring(file_data, Add(IndexOf(file_data, Bytes(",")), Int(1)), recipient_end),
-        
-        # Check caller is the recipient
-        Assert(Txn.sender() == recipient),
-        
-        # Check payment amount
-        # Extract access fee (fifth field)
-        fee_start = Add(recipient_end, Int(1)),
-        fee_remaining = Substring(file_data, fee_start, Len(file_data)),
-        fee_end = Add(fee_start, IndexOf(fee_remaining, Bytes(","))),
-        access_fee = Btoi(Substring(file_data, fee_start, fee_end)),
-        
+        file_request,
+        Assert(file_request.hasValue()),
+
+        # Check caller is the recipient and the request is awaiting payment
+        Assert(Txn.sender() == get_recipient(file_request_key)),
+        Assert(get_status(file_request_key) == Int(STATUS_PENDING)),
+
         # Verify payment transaction
-        Assert(Gtxn[1].type_enum() == TxnType.Payment),
-        Assert(Gtxn[1].sender() == Txn.sender()),
-        Assert(Gtxn[1].receiver() == Global.current_application_address()),
-        Assert(Gtxn[1].amount() == access_fee),
-        
-        # Update file request status to "paid"
-        updated_data = Concat(file_data, Concat(Bytes(","), Bytes("paid"))),
-        App.box_put(file_request_key, updated_data),
-        
-        Approve()
+        Assert(payment.get().sender() == Txn.sender()),
+        Assert(payment.get().receiver() == Global.current_application_address()),
+        Assert(payment.get().amount() == get_access_fee(file_request_key)),
+
+        # Update file request status to "paid", holding the fee in escrow
+        transition(file_request_key, STATUS_PENDING, STATUS_PAID),
+        add_to_global(ESCROWED_VALUE_KEY, get_access_fee(file_request_key)),
     ])
 
-def handle_confirm_receipt() -> Expr:
+@router.method(name="confirm_receipt")
+def handle_confirm_receipt(file_id: abi.String, confirmation_hash: abi.StaticBytes[Literal[32]]) -> Expr:
     """Recipient confirms file receipt and releases payment"""
-    file_id = Txn.application_args[1]
-    confirmation_hash = Txn.application_args[2]
-    file_request_key = Concat(FILE_REQUEST_PREFIX, file_id)
-    
+    file_request_key = Concat(FILE_REQUEST_PREFIX, file_id.get())
+    file_request = App.box_length(file_request_key)
+
     return Seq([
         # Get file request
-        file_request = App.box_get(file_request_key),
-        Assert(file_request[1] == Int(1)),
-        
+        file_request,
+        Assert(file_request.hasValue()),
+
         # Check file request status is "paid"
-        file_data = file_request[0],
-        Assert(Substring(file_data, Sub(Len(file_data), Int(4)), Len(file_data)) == Bytes("paid")),
-        
-        # Extract sender and access fee
-        sender_start = Int(0),
-        sender_end = IndexOf(file_data, Bytes(",")),
-        sender = Substring(file_data, sender_start, sender_end),
-        
-        # Calculate fee position in the data string
-        remaining = Substring(file_data, Add(sender_end, Int(1)), Len(file_data)),
-        recipient_end = Add(IndexOf(remaining, Bytes(",")), sender_end),
-        fee_start = Add(recipient_end, Int(1)),
-        fee_remaining = Substring(file_data, fee_start, Len(file_data)),
-        fee_end = Add(fee_start, IndexOf(fee_remaining, Bytes(","))),
-        access_fee = Btoi(Substring(file_data, fee_start, fee_end)),
-        
+        Assert(get_status(file_request_key) == Int(STATUS_PAID)),
+
         # Verify caller is recipient
-        recipient_start = Add(sender_end, Int(1)),
-        recipient = Substring(file_data, recipient_start, recipient_end),
-        Assert(Txn.sender() == recipient),
-        
+        Assert(Txn.sender() == get_recipient(file_request_key)),
+
         # Send payment to sender
         InnerTxnBuilder.Begin(),
         InnerTxnBuilder.SetFields({
             TxnField.type_enum: TxnType.Payment,
             TxnField.sender: Global.current_application_address(),
-            TxnField.receiver: sender,
-            TxnField.amount: access_fee,
+            TxnField.receiver: get_sender(file_request_key),
+            TxnField.amount: get_access_fee(file_request_key),
         }),
         InnerTxnBuilder.Submit(),
-        
+
         # Update file request status to "completed"
-        updated_data = Concat(Substring(file_data, Int(0), Sub(Len(file_data), Int(4))), Bytes("completed")),
-        App.box_put(file_request_key, updated_data),
-        
-        Approve()
+        transition(file_request_key, STATUS_PAID, STATUS_COMPLETED),
+        subtract_from_global(ESCROWED_VALUE_KEY, get_access_fee(file_request_key)),
     ])
 
-def handle_dispute_transfer() -> Expr:
+@router.method(name="confirm_receipts")
+def handle_confirm_receipts(
+    file_ids: abi.DynamicArray[abi.String],
+    confirmation_hashes: abi.DynamicArray[abi.StaticBytes[Literal[32]]],
+) -> Expr:
+    """Recipient confirms receipt of several files, releasing all payments in one inner group"""
+    i = ScratchVar(TealType.uint64)
+    file_id = abi.String()
+    file_request_key = ScratchVar(TealType.bytes)
+    file_request = App.box_length(file_request_key.load())
+
+    return Seq([
+        Assert(file_ids.length() > Int(0)),
+        Assert(file_ids.length() <= MAX_SETTLEMENT_BATCH),
+        Assert(confirmation_hashes.length() == file_ids.length()),
+
+        For(i.store(Int(0)), i.load() < file_ids.length(), i.store(i.load() + Int(1))).Do(Seq([
+            file_ids[i.load()].store_into(file_id),
+            file_request_key.store(Concat(FILE_REQUEST_PREFIX, file_id.get())),
+
+            # Same checks as confirm_receipt; a repeated file ID fails here
+            file_request,
+            Assert(file_request.hasValue()),
+            Assert(get_status(file_request_key.load()) == Int(STATUS_PAID)),
+            Assert(Txn.sender() == get_recipient(file_request_key.load())),
+
+            If(i.load() == Int(0), InnerTxnBuilder.Begin(), InnerTxnBuilder.Next()),
+            settle(file_request_key.load(), get_sender(file_request_key.load()), STATUS_PAID, STATUS_COMPLETED),
+        ])),
+
+        InnerTxnBuilder.Submit(),
+    ])
+
+@router.method(name="dispute_transfer")
+def handle_dispute_transfer(file_id: abi.String, reason: abi.String) -> Expr:
     """Handle dispute for file transfer"""
-    file_id = Txn.application_args[1]
-    reason = Txn.application_args[2]
-    file_request_key = Concat(FILE_REQUEST_PREFIX, file_id)
-    
+    file_request_key = Concat(FILE_REQUEST_PREFIX, file_id.get())
+    file_request = App.box_length(file_request_key)
+
     return Seq([
         # Get file request
-        file_request = App.box_get(file_request_key),
-        Assert(file_request[1] == Int(1)),
-        
-        # Extract sender and recipient
-        file_data = file_request[0],
-        sender_start = Int(0),
-        sender_end = IndexOf(file_data, Bytes(",")),
-        sender = Substring(file_data, sender_start, sender_end),
-        
-        remaining = Substring(file_data, Add(sender_end, Int(1)), Len(file_data)),
-        recipient_end = Add(IndexOf(remaining, Bytes(",")), sender_end),
-        recipient = Substring(file_data, Add(sender_end, Int(1)), recipient_end),
-        
+        file_request,
+        Assert(file_request.hasValue()),
+
         # Check caller is either sender or recipient
-        Assert(Or(Txn.sender() == sender, Txn.sender() == recipient)),
-        
+        Assert(Or(
+            Txn.sender() == get_sender(file_request_key),
+            Txn.sender() == get_recipient(file_request_key),
+        )),
+
+        # Only escrowed payments can be disputed
+        Assert(get_status(file_request_key) == Int(STATUS_PAID)),
+
         # Update file request status to "disputed"
-        updated_data = Concat(file_data, Concat(Bytes(","), Bytes("disputed"))),
-        App.box_put(file_request_key, updated_data),
-        
-        Approve()
+        transition(file_request_key, STATUS_PAID, STATUS_DISPUTED),
     ])
 
-def handle_resolve_dispute() -> Expr:
+@router.method(name="resolve_dispute")
+def handle_resolve_dispute(file_id: abi.String, resolution: abi.String) -> Expr:
     """Admin resolves dispute"""
-    file_id = Txn.application_args[1]
-    resolution = Txn.application_args[2]
-    file_request_key = Concat(FILE_REQUEST_PREFIX, file_id)
-    
+    file_request_key = Concat(FILE_REQUEST_PREFIX, file_id.get())
+    file_request = App.box_length(file_request_key)
+
     return Seq([
         # Check caller is admin
-        Assert(Txn.sender() == App.globalGet(ADMIN_KEY)),
-        
+        Assert(is_admin()),
+
         # Get file request
-        file_request = App.box_get(file_request_key),
-        Assert(file_request[1] == Int(1)),
-        
+        file_request,
+        Assert(file_request.hasValue()),
+
         # Check file request status is "disputed"
-        file_data = file_request[0],
-        Assert(Substring(file_data, Sub(Len(file_data), Int(8)), Len(file_data)) == Bytes("disputed")),
-        
-        # Extract sender, recipient, and access fee
-        sender_start = Int(0),
-        sender_end = IndexOf(file_data, Bytes(",")),
-        sender = Substring(file_data, sender_start, sender_end),
-        
-        remaining = Substring(file_data, Add(sender_end, Int(1)), Len(file_data)),
-        recipient_end = Add(IndexOf(remaining, Bytes(",")), sender_end),
-        recipient = Substring(file_data, Add(sender_end, Int(1)), recipient_end),
-        
-        fee_start = Add(recipient_end, Int(1)),
-        fee_remaining = Substring(file_data, fee_start, Len(file_data)),
-        fee_end = Add(fee_start, IndexOf(fee_remaining, Bytes(","))),
-        access_fee = Btoi(Substring(file_data, fee_start, fee_end)),
-        
+        Assert(get_status(file_request_key) == Int(STATUS_DISPUTED)),
+
         # Resolve dispute based on resolution
-        If(resolution == Bytes("sender_wins"),
+        If(resolution.get() == Bytes("sender_wins"),
             # Send payment to sender
             Seq([
                 InnerTxnBuilder.Begin(),
                 InnerTxnBuilder.SetFields({
                     TxnField.type_enum: TxnType.Payment,
                     TxnField.sender: Global.current_application_address(),
-                    TxnField.receiver: sender,
-                    TxnField.amount: access_fee,
+                    TxnField.receiver: get_sender(file_request_key),
+                    TxnField.amount: get_access_fee(file_request_key),
                 }),
                 InnerTxnBuilder.Submit(),
-                
+
                 # Update status to "resolved_sender"
-                updated_data = Concat(Substring(file_data, Int(0), Sub(Len(file_data), Int(8))), Bytes("resolved_sender")),
-                App.box_put(file_request_key, updated_data),
+                transition(file_request_key, STATUS_DISPUTED, STATUS_RESOLVED_SENDER),
+                subtract_from_global(ESCROWED_VALUE_KEY, get_access_fee(file_request_key)),
             ]),
             # Send payment to recipient
-            If(resolution == Bytes("recipient_wins"),
+            If(resolution.get() == Bytes("recipient_wins"),
                 Seq([
                     InnerTxnBuilder.Begin(),
                     InnerTxnBuilder.SetFields({
                         TxnField.type_enum: TxnType.Payment,
                         TxnField.sender: Global.current_application_address(),
-                        TxnField.receiver: recipient,
-                        TxnField.amount: access_fee,
+                        TxnField.receiver: get_recipient(file_request_key),
+                        TxnField.amount: get_access_fee(file_request_key),
                     }),
                     InnerTxnBuilder.Submit(),
-                    
+
                     # Update status to "resolved_recipient"
-                    updated_data = Concat(Substring(file_data, Int(0), Sub(Len(file_data), Int(8))), Bytes("resolved_recipient")),
-                    App.box_put(file_request_key, updated_data),
+                    transition(file_request_key, STATUS_DISPUTED, STATUS_RESOLVED_RECIPIENT),
+                    subtract_from_global(ESCROWED_VALUE_KEY, get_access_fee(file_request_key)),
                 ]),
                 Reject()
             )
         ),
-        
-        Approve()
     ])
 
-def handle_cancel_request() -> Expr:
+@router.method(name="resolve_disputes")
+def handle_resolve_disputes(
+    file_ids: abi.DynamicArray[abi.String],
+    resolutions: abi.DynamicArray[abi.String],
+) -> Expr:
+    """Admin resolves several disputes, releasing all payments in one inner group"""
+    i = ScratchVar(TealType.uint64)
+    file_id = abi.String()
+    resolution = abi.String()
+    file_request_key = ScratchVar(TealType.bytes)
+    file_request = App.box_length(file_request_key.load())
+
+    return Seq([
+        Assert(is_admin()),
+        Assert(file_ids.length() > Int(0)),
+        Assert(file_ids.length() <= MAX_SETTLEMENT_BATCH),
+        Assert(resolutions.length() == file_ids.length()),
+
+        For(i.store(Int(0)), i.load() < file_ids.length(), i.store(i.load() + Int(1))).Do(Seq([
+            file_ids[i.load()].store_into(file_id),
+            resolutions[i.load()].store_into(resolution),
+            file_request_key.store(Concat(FILE_REQUEST_PREFIX, file_id.get())),
+
+            # Same checks as resolve_dispute; a repeated file ID fails here
+            file_request,
+            Assert(file_request.hasValue()),
+            Assert(get_status(file_request_key.load()) == Int(STATUS_DISPUTED)),
+
+            If(i.load() == Int(0), InnerTxnBuilder.Begin(), InnerTxnBuilder.Next()),
+            If(resolution.get() == Bytes("sender_wins"),
+                settle(file_request_key.load(), get_sender(file_request_key.load()), STATUS_DISPUTED, STATUS_RESOLVED_SENDER),
+                If(resolution.get() == Bytes("recipient_wins"),
+                    settle(file_request_key.load(), get_recipient(file_request_key.load()), STATUS_DISPUTED, STATUS_RESOLVED_RECIPIENT),
+                    Reject()
+                )
+            ),
+        ])),
+
+        InnerTxnBuilder.Submit(),
+    ])
+
+@router.method(name="cancel_request")
+def handle_cancel_request(file_id: abi.String) -> Expr:
     """Cancel file request (only by sender before approval)"""
-    file_id = Txn.application_args[1]
-    file_request_key = Concat(FILE_REQUEST_PREFIX, file_id)
-    
+    file_request_key = Concat(FILE_REQUEST_PREFIX, file_id.get())
+    file_request = App.box_length(file_request_key)
+
     return Seq([
         # Get file request
-        file_request = App.box_get(file_request_key),
-        Assert(file_request[1] == Int(1)),
-        
-        # Extract sender
-        file_data = file_request[0],
-        sender_start = Int(0),
-        sender_end = IndexOf(file_data, Bytes(",")),
-        sender = Substring(file_data, sender_start, sender_end),
-        
+        file_request,
+        Assert(file_request.hasValue()),
+
         # Check caller is the sender
-        Assert(Txn.sender() == sender),
-        
+        Assert(Txn.sender() == get_sender(file_request_key)),
+
         # Check request is not yet paid
-        Assert(Substring(file_data, Sub(Len(file_data), Int(4)), Len(file_data)) != Bytes("paid")),
-        
-        # Delete file request
-        App.box_delete(file_request_key),
-        
-        Approve()
+        Assert(get_status(file_request_key) == Int(STATUS_PENDING)),
+
+        # Remove the request from the statistics, then delete it
+        subtract_from_global(TOTAL_FILES_KEY, Int(1)),
+        subtract_from_global(TOTAL_VALUE_KEY, get_access_fee(file_request_key)),
+        subtract_from_global(STATUS_COUNT_KEYS[STATUS_PENDING], Int(1)),
+        Assert(App.box_delete(file_request_key)),
     ])
 
-def handle_get_file_request() -> Expr:
+@router.method(name="get_file_request")
+def handle_get_file_request(file_id: abi.String, *, output: abi.DynamicBytes) -> Expr:
     """Get file request information"""
-    file_id = Txn.application_args[1]
-    file_request_key = Concat(FILE_REQUEST_PREFIX, file_id)
-    
+    file_request_key = Concat(FILE_REQUEST_PREFIX, file_id.get())
+    file_request = App.box_get(file_request_key)
+
     return Seq([
-        file_request = App.box_get(file_request_key),
-        If(file_request[1] == Int(1),
-            Log(file_request[0]),
-            Log(Bytes("not_found"))
+        file_request,
+        # Returns an empty record if the request does not exist
+        If(file_request.hasValue(),
+            output.set(file_request.value()),
+            output.set(Bytes(""))
         ),
-        Approve()
     ])
 
-def handle_get_user_file_requests() -> Expr:
-    """Get all file requests for a user"""
-    user_address = Txn.application_args[1]
-    user_files_key = Concat(USER_FILES_PREFIX, user_address)
-    
+@router.method(name="get_user_file_requests")
+def handle_get_user_file_requests(
+    user_address: abi.Address,
+    offset: abi.Uint64,
+    limit: abi.Uint64,
+    *,
+    output: abi.DynamicArray[UserFileRequest],
+) -> Expr:
+    """Get a page of file requests for a user (read-only method)
+
+    Returns the entries of the user's file index in [offset, offset + limit),
+    so a page shorter than limit is the last one. Each entry reads its
+    file_req_ box on top of the user_files_ box and its index page box, so
+    beyond a few entries a page needs more box references, opcode budget and
+    log space than one call has. Pages are meant to be read with simulate,
+    allowing unnamed resources, extra opcode budget and more logs; a call
+    missing any of those fails rather than returning a shorter page.
+    """
+    user_files_key = Concat(USER_FILES_PREFIX, user_address.get())
+    user_files = App.box_get(user_files_key)
+
+    count = ScratchVar(TealType.uint64)
+    length = ScratchVar(TealType.uint64)
+    i = ScratchVar(TealType.uint64)
+    index_slot = ScratchVar(TealType.bytes)
+    heads = ScratchVar(TealType.bytes)
+    tails = ScratchVar(TealType.bytes)
+
+    slot = abi.Uint64()
+    file_id = abi.String()
+    exists = abi.Bool()
+    request = FileRequest()
+    entry = UserFileRequest()
+    file_request = App.box_get(Concat(FILE_REQUEST_PREFIX, file_id.get()))
+
     return Seq([
-        user_files = App.box_get(user_files_key),
-        If(user_files[1] == Int(1),
-            Log(user_files[0]),
-            Log(Bytes("[]"))
-        ),
-        Approve()
+        Assert(limit.get() <= MAX_USER_FILE_REQUESTS_LIMIT),
+
+        user_files,
+        count.store(If(user_files.hasValue(), Btoi(user_files.value()), Int(0))),
+        length.store(If(offset.get() < count.load(), count.load() - offset.get(), Int(0))),
+        If(length.load() > limit.get(), length.store(limit.get())),
+
+        # UserFileRequest is a dynamic type, so the array encoding is the
+        # element count, one offset per element, then the elements
+        heads.store(Bytes("")),
+        tails.store(Bytes("")),
+        For(i.store(Int(0)), i.load() < length.load(), i.store(i.load() + Int(1))).Do(Seq([
+            slot.set(offset.get() + i.load()),
+            index_slot.store(App.box_extract(
+                get_user_files_page_key(user_address.get(), slot.get() / FILE_IDS_PER_PAGE),
+                (slot.get() % FILE_IDS_PER_PAGE) * FILE_ID_SLOT_LENGTH,
+                FILE_ID_SLOT_LENGTH,
+            )),
+            file_id.set(Extract(index_slot.load(), Int(1), GetByte(index_slot.load(), Int(0)))),
+
+            file_request,
+            exists.set(file_request.hasValue()),
+            request.decode(encode_file_request(
+                If(file_request.hasValue(), file_request.value(), BytesZero(IPFS_CID_OFFSET + Int(2)))
+            )),
+
+            entry.set(slot, file_id, exists, request),
+            heads.store(Concat(heads.load(), uint16_bytes(Int(2) * length.load() + Len(tails.load())))),
+            tails.store(Concat(tails.load(), entry.encode())),
+        ])),
+
+        output.decode(Concat(uint16_bytes(length.load()), heads.load(), tails.load())),
     ])
 
-def handle_update_file_metadata() -> Expr:
+@router.method(name="update_file_metadata")
+def handle_update_file_metadata(
+    file_id: abi.String,
+    new_file_hash: abi.StaticBytes[Literal[32]],
+    new_file_size: abi.Uint64,
+    new_access_fee: abi.Uint64,
+) -> Expr:
     """Update file metadata (only by sender before approval)"""
-    file_id = Txn.application_args[1]
-    new_file_hash = Txn.application_args[2]
-    new_file_size = Btoi(Txn.application_args[3])
-    new_access_fee = Btoi(Txn.application_args[4])
-    file_request_key = Concat(FILE_REQUEST_PREFIX, file_id)
-    
+    file_request_key = Concat(FILE_REQUEST_PREFIX, file_id.get())
+    file_request = App.box_length(file_request_key)
+
     return Seq([
         # Get file request
-        file_request = App.box_get(file_request_key),
-        Assert(file_request[1] == Int(1)),
-        
-        # Extract sender
-        file_data = file_request[0],
-        sender_start = Int(0),
-        sender_end = IndexOf(file_data, Bytes(",")),
-        sender = Substring(file_data, sender_start, sender_end),
-        
+        file_request,
+        Assert(file_request.hasValue()),
+
         # Check caller is the sender
-        Assert(Txn.sender() == sender),
-        
+        Assert(Txn.sender() == get_sender(file_request_key)),
+
         # Check request is not yet paid
-        Assert(Substring(file_data, Sub(Len(file_data), Int(4)), Len(file_data)) != Bytes("paid")),
-        
-        # Update file metadata (reconstruct with new values)
-        # Keep sender, recipient, update hash, size, fee
-        recipient_start = Add(sender_end, Int(1)),
-        remaining = Substring(file_data, recipient_start, Len(file_data)),
-        recipient_end = Add(IndexOf(remaining, Bytes(",")), recipient_start),
-        recipient = Substring(file_data, recipient_start, recipient_end),
-        
-        # Extract other fields to preserve
-        file_type_start = Add(recipient_end, Int(1)),
-        file_type_remaining = Substring(file_data, file_type_start, Len(file_data)),
-        file_type_end = Add(file_type_start, IndexOf(file_type_remaining, Bytes(","))),
-        file_type = Substring(file_data, file_type_start, file_type_end),
-        
-        is_ipfs_start = Add(file_type_end, Int(1)),
-        is_ipfs_remaining = Substring(file_data, is_ipfs_start, Len(file_data)),
-        is_ipfs_end = Add(is_ipfs_start, IndexOf(is_ipfs_remaining, Bytes(","))),
-        is_ipfs = Substring(file_data, is_ipfs_start, is_ipfs_end),
-        
-        ipfs_cid_start = Add(is_ipfs_end, Int(1)),
-        ipfs_cid = Substring(file_data, ipfs_cid_start, Len(file_data)),
-        
-        # Reconstruct with updated values
-        updated_data = Concat(
-            Concat(
-                Concat(
-                    Concat(
-                        Concat(
-                            Concat(
-                                Concat(
-                                    Concat(sender, Bytes(",")),
-                                    Concat(recipient, Bytes(","))
-                                ),
-                                Concat(new_file_hash, Bytes(","))
-                            ),
-                            Concat(Itob(new_file_size), Bytes(","))
-                        ),
-                        Concat(Itob(new_access_fee), Bytes(","))
-                    ),
-                    Concat(file_type, Bytes(","))
-                ),
-                Concat(is_ipfs, Bytes(","))
-            ),
-            ipfs_cid
-        ),
-        
-        App.box_put(file_request_key, updated_data),
-        
-        Approve()
+        Assert(get_status(file_request_key) == Int(STATUS_PENDING)),
+
+        # Keep the total value in line with the new fee
+        subtract_from_global(TOTAL_VALUE_KEY, get_access_fee(file_request_key)),
+        add_to_global(TOTAL_VALUE_KEY, new_access_fee.get()),
+
+        # Hash, size and fee are contiguous in the record, so update them in place
+        App.box_replace(file_request_key, FILE_HASH_OFFSET, Concat(
+            new_file_hash.get(),
+            Itob(new_file_size.get()),
+            Itob(new_access_fee.get()),
+        )),
     ])
 
-def handle_emergency_withdraw() -> Expr:
+@router.method(name="emergency_withdraw")
+def handle_emergency_withdraw(amount: abi.Uint64) -> Expr:
     """Emergency withdrawal by admin"""
-    amount = Btoi(Txn.application_args[1])
-    
     return Seq([
         # Check caller is admin
-        Assert(Txn.sender() == App.globalGet(ADMIN_KEY)),
-        
+        Assert(is_admin()),
+
         # Send payment to admin
         InnerTxnBuilder.Begin(),
         InnerTxnBuilder.SetFields({
             TxnField.type_enum: TxnType.Payment,
             TxnField.sender: Global.current_application_address(),
             TxnField.receiver: Txn.sender(),
-            TxnField.amount: amount,
+            TxnField.amount: amount.get(),
         }),
         InnerTxnBuilder.Submit(),
-        
-        Approve()
     ])
 
-def handle_get_user_file_requests() -> Expr:
-    """Get all file requests for a user (read-only method)"""
-    user_address = Txn.application_args[1]
-    
-    # This is a simplified version - in production you'd iterate through all box keys
-    # For now, we'll return a placeholder response
-    return Seq([
-        Log(Concat(Bytes("User file requests for: "), user_address)),
-        Log(Bytes("[]")),  # Empty array for now
-        Approve()
-    ])
-
-def handle_get_file_request() -> Expr:
-    """Get specific file request by ID (read-only method)"""
-    file_id = Txn.application_args[1]
-    file_request_key = Concat(FILE_REQUEST_PREFIX, file_id)
-    
-    return Seq([
-        # Get file request from box storage
-        file_request = App.box_get(file_request_key),
-        If(file_request[1] == Int(1), [
-            # File request exists, log it
-            Log(file_request[0])
-        ], [
-            # File request not found
-            Log(Bytes("not_found"))
-        ]),
-        Approve()
-    ])
-
-def handle_get_stats() -> Expr:
+@router.method(name="get_stats")
+def handle_get_stats(*, output: FileSharingStats) -> Expr:
     """Get application statistics"""
+    total_files = abi.Uint64()
+    total_value = abi.Uint64()
+    escrowed_value = abi.Uint64()
+    status_counts = {status: abi.Uint64() for status in STATUS_COUNT_KEYS}
+
     return Seq([
-        stats = Concat(
-            Concat(Bytes("total_files:"), Itob(App.globalGet(TOTAL_FILES_KEY))),
-            Concat(Bytes(",total_value:"), Itob(App.globalGet(TOTAL_VALUE_KEY)))
+        total_files.set(App.globalGet(TOTAL_FILES_KEY)),
+        total_value.set(App.globalGet(TOTAL_VALUE_KEY)),
+        escrowed_value.set(App.globalGet(ESCROWED_VALUE_KEY)),
+        *[count.set(App.globalGet(STATUS_COUNT_KEYS[status])) for status, count in status_counts.items()],
+        output.set(
+            total_files,
+            total_value,
+            escrowed_value,
+            status_counts[STATUS_PENDING],
+            status_counts[STATUS_PAID],
+            status_counts[STATUS_COMPLETED],
+            status_counts[STATUS_DISPUTED],
+            status_counts[STATUS_RESOLVED_SENDER],
+            status_counts[STATUS_RESOLVED_RECIPIENT],
         ),
-        Log(stats),
-        Approve()
     ])
 
+def compile_contract() -> tuple[str, str, sdk_abi.Contract]:
+    """Compile approval and clear programs and the ARC-4 contract description"""
+    return router.compile_program(version=PROGRAM_VERSION, optimize=OptimizeOptions(scratch_slots=True))
+
 if __name__ == "__main__":
-    compileTeal(file_sharing_contract(), Mode.Application, version=8)
+    compile_contract()
@@ -1,67 +1,133 @@
 #!/usr/bin/env python3
 """
-Deployment script for File Sharing App smart contract
+Deployment of the FileSharingApp smart contract
+
+The application is created by a bare call, which makes the deployer (the
+DEPLOYER_MNEMONIC account, or the LocalNet default account) its admin. Its
+App ID is written to deployment_info.json and app_id.txt next to this
+script.
+
+Deploys are idempotent: the app already recorded there is compared with the
+compiled programs by hash, and only updated when its approval or clear
+program differs.
+
+    python -m smart_contracts.file_sharing_app.deploy
 """
 
+import base64
 import json
-import os
 from datetime import datetime
+from pathlib import Path
 
-def deploy_file_sharing_app():
-    """Deploy the File Sharing App smart contract"""
-    
-    print("🚧 File Sharing App deployment script")
-    print("Note: This is a mock deployment for demo purposes")
-    print("In production, you would compile and deploy the PyTeal contract")
-    
-    # Mock deployment info
-    deployment_info = {
-        "app_id": 0,  # Will be set after real deployment
-        "app_address": "MOCK_ADDRESS_FOR_DEMO",
-        "admin_address": "MOCK_ADMIN_ADDRESS", 
-        "network": "testnet",
-        "deployment_time": datetime.now().isoformat(),
-        "status": "demo_mode"
-    }
-    
-    # Write to file
-    with open("deployment_info.json", "w") as f:
-        json.dump(deployment_info, f, indent=2)
-    
-    print(f"✅ Mock deployment info saved to deployment_info.json")
-    
-    # Write app ID to file for frontend
-    with open("app_id.txt", "w") as f:
-        f.write("0")  # Mock app ID
-    
-    print(f"✅ Mock App ID saved to app_id.txt")
-    print("📝 Next steps:")
-    print("1. Compile the PyTeal contract: python -m pyteal.compile contract.py")
-    print("2. Deploy using AlgoKit or Algorand SDK")
-    print("3. Update the App ID in the frontend")
-    print("4. Replace mock methods in FileSharingApp.ts with real contract calls")
-    
-    return deployment_info
+from algosdk import abi
+from algosdk.atomic_transaction_composer import (
+    AccountTransactionSigner,
+    AtomicTransactionComposer,
+    TransactionWithSigner,
+)
+from algosdk.logic import get_application_address
+from algosdk.transaction import ApplicationCreateTxn, ApplicationUpdateTxn, OnComplete, StateSchema
+from algosdk.v2client import algod
+
+from smart_contracts.file_sharing_app import contract
+from smart_contracts.network import get_account, get_algod_client
+from smart_contracts.payroll_app.deploy import get_app_params, get_extra_pages, program_hash
+
+DEPLOYMENT_INFO_PATH = Path(__file__).with_name("deployment_info.json")
+APP_ID_PATH = Path(__file__).with_name("app_id.txt")
+
+def load_deployment_info() -> dict:
+    """Deployment recorded by a previous run, including a legacy app_id.txt"""
+    if DEPLOYMENT_INFO_PATH.exists():
+        deployment_info = json.loads(DEPLOYMENT_INFO_PATH.read_text())
+        if deployment_info.get("app_id"):
+            return deployment_info
+    if APP_ID_PATH.exists():
+        return {"app_id": int(APP_ID_PATH.read_text().strip())}
+    return {}
+
+def compile_programs(algod_client: algod.AlgodClient) -> tuple[bytes, bytes, abi.Contract]:
+    """Compile the file sharing contract and assemble it with algod"""
+    approval, clear, abi_contract = contract.compile_contract()
+    approval_program = base64.b64decode(algod_client.compile(approval)["result"])
+    clear_program = base64.b64decode(algod_client.compile(clear)["result"])
+    return approval_program, clear_program, abi_contract
+
+def create_app(algod_client: algod.AlgodClient, deployer: str, signer: AccountTransactionSigner,
+               approval_program: bytes, clear_program: bytes) -> int:
+    """Create the application, returning its App ID"""
+    atc = AtomicTransactionComposer()
+    atc.add_transaction(TransactionWithSigner(
+        ApplicationCreateTxn(
+            deployer, algod_client.suggested_params(), OnComplete.NoOpOC,
+            approval_program, clear_program,
+            StateSchema(contract.GLOBAL_NUM_UINTS, contract.GLOBAL_NUM_BYTE_SLICES), StateSchema(0, 0),
+            extra_pages=get_extra_pages(approval_program, clear_program),
+        ),
+        signer,
+    ))
+    result = atc.execute(algod_client, 4)
+    return algod_client.pending_transaction_info(result.tx_ids[0])["application-index"]
+
+def update_app(algod_client: algod.AlgodClient, deployer: str, signer: AccountTransactionSigner, app_id: int,
+               approval_program: bytes, clear_program: bytes):
+    """Update the programs of the application (the deployer must be its admin)"""
+    atc = AtomicTransactionComposer()
+    atc.add_transaction(TransactionWithSigner(
+        ApplicationUpdateTxn(deployer, algod_client.suggested_params(), app_id, approval_program, clear_program),
+        signer,
+    ))
+    atc.execute(algod_client, 4)
 
 def main():
-    """Main deployment function"""
-    try:
-        deployment_info = deploy_file_sharing_app()
-        
-        print("\n" + "="*50)
-        print("🎉 MOCK DEPLOYMENT COMPLETED SUCCESSFULLY!")
-        print("="*50)
-        print(f"App ID: {deployment_info['app_id']}")
-        print(f"App Address: {deployment_info['app_address']}")
-        print(f"Admin Address: {deployment_info['admin_address']}")
-        print(f"Network: {deployment_info['network']}")
-        print("\nThe frontend is now ready to use with mock contract calls!")
-        
-    except Exception as e:
-        print(f"❌ Deployment failed: {str(e)}")
-        return 1
-    
+    """Create or update the file sharing application"""
+    print("🚀 Deploying FileSharingApp...")
+
+    algod_client = get_algod_client()
+    deployer, signer = get_account(algod_client, "DEPLOYER_MNEMONIC")
+    print(f"Using account: {deployer}")
+
+    deployment_info = load_deployment_info()
+
+    print("📦 Compiling application...")
+    approval_program, clear_program, _ = compile_programs(algod_client)
+    approval_hash, clear_hash = program_hash(approval_program), program_hash(clear_program)
+
+    # Compare the existing application with the compiled programs
+    app_id = deployment_info.get("app_id")
+    params = app_id and get_app_params(algod_client, app_id)
+    if not params:
+        if app_id:
+            print(f"⚠️  App ID {app_id} no longer exists, creating a new one")
+        app_id = create_app(algod_client, deployer, signer, approval_program, clear_program)
+        deployment_info = {"app_id": app_id, "admin_address": deployer}
+        print(f"✅ App ID {app_id} created")
+    else:
+        onchain_hashes = (
+            program_hash(base64.b64decode(params["approval-program"])),
+            program_hash(base64.b64decode(params["clear-state-program"])),
+        )
+        if onchain_hashes == (approval_hash, clear_hash):
+            print("⏭️  FileSharingApp is up to date")
+            return 0
+        if params.get("extra-program-pages", 0) < get_extra_pages(approval_program, clear_program):
+            # Extra pages are fixed at creation
+            print(f"⚠️  Programs outgrew App ID {app_id}, it must be redeployed")
+            return 1
+        update_app(algod_client, deployer, signer, app_id, approval_program, clear_program)
+        print(f"🔄 App ID {app_id} updated")
+
+    deployment_info.update({
+        "app_address": get_application_address(app_id),
+        "approval_hash": approval_hash,
+        "clear_hash": clear_hash,
+        "deployer_address": deployer,
+        "deployment_time": datetime.now().isoformat(),
+    })
+    DEPLOYMENT_INFO_PATH.write_text(json.dumps(deployment_info, indent=2) + "\n")
+    APP_ID_PATH.write_text(str(app_id))
+    print(f"💾 App ID saved to {DEPLOYMENT_INFO_PATH} and {APP_ID_PATH}")
     return 0
 
 if __name__ == "__main__":
-    exit(main())
\ No newline at end of file
+    exit(main())
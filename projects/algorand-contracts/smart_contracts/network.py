@@ -0,0 +1,51 @@
+"""
+Algod connection and account helpers shared by the Python tooling
+
+Settings follow the AlgoKit .env files (ALGOD_SERVER, ALGOD_PORT,
+ALGOD_TOKEN, INDEXER_SERVER, ...) and default to LocalNet.
+"""
+
+import os
+
+from algosdk import account, mnemonic
+from algosdk.atomic_transaction_composer import AccountTransactionSigner
+from algosdk.kmd import KMDClient
+from algosdk.v2client import algod, indexer
+
+LOCALNET_SERVER = "http://localhost"
+LOCALNET_TOKEN = "a" * 64
+LOCALNET_WALLET = "unencrypted-default-wallet"
+
+def get_service_address(prefix: str, default_port: str) -> str:
+    """Address of an Algorand service from <prefix>_SERVER and <prefix>_PORT"""
+    server = os.getenv(f"{prefix}_SERVER", LOCALNET_SERVER)
+    port = os.getenv(f"{prefix}_PORT", default_port if server == LOCALNET_SERVER else "")
+    return f"{server}:{port}" if port else server
+
+def get_algod_client() -> algod.AlgodClient:
+    """Algod client for the configured network"""
+    return algod.AlgodClient(os.getenv("ALGOD_TOKEN", LOCALNET_TOKEN), get_service_address("ALGOD", "4001"))
+
+def get_indexer_client() -> indexer.IndexerClient:
+    """Indexer client for the configured network"""
+    return indexer.IndexerClient(os.getenv("INDEXER_TOKEN", LOCALNET_TOKEN), get_service_address("INDEXER", "8980"))
+
+def get_kmd_client() -> KMDClient:
+    """KMD client for the configured network (LocalNet only)"""
+    return KMDClient(os.getenv("KMD_TOKEN", LOCALNET_TOKEN), get_service_address("KMD", "4002"))
+
+def get_account(algod_client: algod.AlgodClient, mnemonic_env: str) -> tuple[str, AccountTransactionSigner]:
+    """Account from a mnemonic environment variable, or the richest LocalNet account"""
+    if os.getenv(mnemonic_env):
+        private_key = mnemonic.to_private_key(os.environ[mnemonic_env])
+        return account.address_from_private_key(private_key), AccountTransactionSigner(private_key)
+
+    kmd = get_kmd_client()
+    wallet = next(w for w in kmd.list_wallets() if w["name"] == LOCALNET_WALLET)
+    handle = kmd.init_wallet_handle(wallet["id"], "")
+    try:
+        address = max(kmd.list_keys(handle), key=lambda a: algod_client.account_info(a)["amount"])
+        private_key = kmd.export_key(handle, "", address)
+    finally:
+        kmd.release_wallet_handle(handle)
+    return address, AccountTransactionSigner(private_key)
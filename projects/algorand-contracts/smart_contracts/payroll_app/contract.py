@@ -1,4 +1,6 @@
 from pyteal import *
+from typing import Literal
+from algosdk import abi as sdk_abi
 
 # Global state keys
 ASA_ID_KEY = Bytes("asa_id")
@@ -6,277 +8,1159 @@ CYCLE_SECS_KEY = Bytes("cycle_secs")
 ADMIN_KEY = Bytes("admin")
 TOTAL_EMPLOYEES_KEY = Bytes("total_employees")
 LAST_DISBURSEMENT_KEY = Bytes("last_disbursement")
+DISBURSE_CYCLE_KEY = Bytes("disburse_cycle")
+DISBURSED_COUNT_KEY = Bytes("disbursed_count")
+MERKLE_ROOT_KEY = Bytes("merkle_root")
+MERKLE_SIZE_KEY = Bytes("merkle_size")
+MERKLE_CYCLE_KEY = Bytes("merkle_cycle")
+NEXT_SLOT_KEY = Bytes("next_slot")
+FREE_SLOT_HEAD_KEY = Bytes("free_slot_head")
+
+# Global state schema: admin and merkle_root are the byte slices
+GLOBAL_NUM_UINTS = 10
+GLOBAL_NUM_BYTE_SLICES = 2
+
+# Employee box layout: amount (uint64) | flags (1 byte) | slot (uint64) |
+# stream state (uint64, streaming employees only) | optional ASA ID override
+# (uint64). Records without an override are paid in the payroll's
+# ASA_ID_KEY asset. Streaming employees accrue amount per CYCLE_SECS_KEY
+# seconds; their stream state is the time they are paid up to, or while
+# paused the seconds still owed. Employees paid per cycle are tracked in
+# the cycle's paid bitmap instead, at their slot, and their boxes carry no
+# stream state.
+EMPLOYEE_PREFIX = Bytes("emp_")
+EMPLOYEE_BOX_SIZE = Int(17)
+EMPLOYEE_AMOUNT_OFFSET = Int(0)
+EMPLOYEE_FLAGS_OFFSET = Int(8)
+EMPLOYEE_SLOT_OFFSET = Int(9)
+EMPLOYEE_STREAM_STATE_OFFSET = Int(17)
+STREAM_STATE_LENGTH = Int(8)
+
+# Employee flag bits, counted from the most significant bit of the flags byte
+EMPLOYEE_PAUSED_BIT = Int(7)
+EMPLOYEE_STREAMING_BIT = Int(6)
+
+# Disbursement page limits: one inner transaction per employee, and an
+# app call may issue at most 16 inner transactions
+ADDRESS_LENGTH = Int(32)
+MAX_DISBURSE_PAGE = Int(16)
+
+# Bulk onboarding and removal batch size, a tunable. With group resource
+# sharing the 8 references of one transaction do not bound it: the emp_ box
+# and directory shard references of a batch can be carried by other calls in
+# the group, as disburse pages do. The group does: at most 16 transactions
+# to carry them and pool opcode budget (see smart_contracts/budget.py), and
+# the inner payments streaming employees are settled with on removal, 16 per
+# app call. 16 keeps a batch of streaming removals within its own call's.
+EMPLOYEE_ENTRY_LENGTH = Int(40)
+MAX_EMPLOYEE_BATCH = Int(16)
+
+# ABI dynamic arrays are prefixed with a uint16 element count
+ABI_ARRAY_HEADER_LENGTH = Int(2)
+
+# Batched reads: one box reference per employee (plus the current paid
+# bitmap shards of their slots), and a 65-byte EmployeeInfo
+# per employee in the return value, which must fit in a single 1 KB log
+MAX_EMPLOYEE_INFO_BATCH = Int(15)
+
+# Slot directory reads: 32 bytes per slot in the return value, which must
+# fit in a single 1 KB log
+MAX_DIRECTORY_BATCH = Int(16)
+
+# Multi-asset funding: one inner opt-in per asset, and an inner group holds
+# at most 16 transactions
+MAX_ASSET_BATCH = Int(16)
+
+# Merkle payrolls: the admin commits the root of a tree of (address, amount,
+# asset) leaves per cycle and employees claim with a proof. Leaves and
+# inner nodes are hashed with distinct prefixes, and the tree is padded to
+# a power of two with empty (zero) leaves, so the leaf index picks the side
+# of each proof step.
+MERKLE_LEAF_PREFIX = Bytes("base16", "00")
+MERKLE_NODE_PREFIX = Bytes("base16", "01")
+MERKLE_HASH_LENGTH = Int(32)
+MAX_MERKLE_DEPTH = Int(32)
+
+# Claimed bitmaps: one bit per leaf (Merkle payrolls) or per employee slot
+# (paid bitmaps of disburse), split into 1 KB shard boxes (the I/O budget
+# of one box reference) so a bit costs a single box reference
+MERKLE_CLAIMED_PREFIX = Bytes("mclaim_")
+PAID_PREFIX = Bytes("paid_")
+
+# Slot directory: the address of each employee slot, 32 slots per 1 KB
+# shard box. Removed employees' slots form a free list through their
+# directory entries: 24 zero bytes then the next free slot + 1 (0 ends the
+# list), and FREE_SLOT_HEAD_KEY holds the first free slot + 1. Slots are
+# only allocated past NEXT_SLOT_KEY when the free list is empty, so they
+# stay dense.
+DIRECTORY_PREFIX = Bytes("dir_")
+DIRECTORY_SHARD_SIZE = Int(1024)
+DIRECTORY_SHARD_SLOTS = Int(32)
+FREE_SLOT_MARKER_LENGTH = Int(24)
+BITMAP_SHARD_SIZE = Int(1024)
+BITMAP_SHARD_BITS = Int(8192)
+
+# Program version (9 for group resource sharing, so the box and account
+# references of a disburse page can be spread across the group)
+PROGRAM_VERSION = 9
+
+# Compile profiles: "debug" keeps the create_payroll trace logs for LocalNet,
+# "release" drops them for smaller programs and cheaper calls
+DEBUG_PROFILE = "debug"
+RELEASE_PROFILE = "release"
+PROFILES = (DEBUG_PROFILE, RELEASE_PROFILE)
+
+# Profile of the current build, set by compile_contract()
+profile = None
+
+class EmployeeInfo(abi.NamedTuple):
+    """Employee record as returned by get_employee_info
+
+    last_paid_cycle is the current disburse cycle if an employee paid per
+    cycle was paid in it, 0 otherwise. stream_state is the stream state of
+    streaming employees, 0 for the others.
+    """
+    address: abi.Field[abi.Address]
+    exists: abi.Field[abi.Bool]
+    paused: abi.Field[abi.Bool]
+    streaming: abi.Field[abi.Bool]
+    amount: abi.Field[abi.Uint64]
+    asa_id: abi.Field[abi.Uint64]
+    last_paid_cycle: abi.Field[abi.Uint64]
+    stream_state: abi.Field[abi.Uint64]
+
+class PayrollInfo(abi.NamedTuple):
+    """Payroll global state as returned by get_payroll_info"""
+    asa_id: abi.Field[abi.Uint64]
+    cycle_secs: abi.Field[abi.Uint64]
+    admin: abi.Field[abi.Address]
+    total_employees: abi.Field[abi.Uint64]
+    last_disbursement: abi.Field[abi.Uint64]
+    disburse_cycle: abi.Field[abi.Uint64]
+    disbursed_count: abi.Field[abi.Uint64]
 
 def get_employee_box_key(employee_address: Expr) -> Expr:
     """Generate box storage key for employee data"""
-    return Concat(Bytes("emp_"), employee_address)
+    return Concat(EMPLOYEE_PREFIX, employee_address)
+
+def get_employee_amount(employee_box_key: Expr) -> Expr:
+    """Read employee amount from box storage"""
+    return ExtractUint64(App.box_extract(employee_box_key, EMPLOYEE_AMOUNT_OFFSET, Int(8)), Int(0))
+
+def get_employee_paused(employee_box_key: Expr) -> Expr:
+    """Read employee paused status from box storage"""
+    return GetBit(App.box_extract(employee_box_key, EMPLOYEE_FLAGS_OFFSET, Int(1)), EMPLOYEE_PAUSED_BIT)
+
+def set_employee_paused(employee_box_key: Expr, paused: Expr) -> Expr:
+    """Update employee paused status in box storage"""
+    return App.box_replace(
+        employee_box_key,
+        EMPLOYEE_FLAGS_OFFSET,
+        SetBit(App.box_extract(employee_box_key, EMPLOYEE_FLAGS_OFFSET, Int(1)), EMPLOYEE_PAUSED_BIT, paused),
+    )
+
+def get_employee_streaming(employee_box_key: Expr) -> Expr:
+    """Read whether an employee is paid by streaming from box storage"""
+    return GetBit(App.box_extract(employee_box_key, EMPLOYEE_FLAGS_OFFSET, Int(1)), EMPLOYEE_STREAMING_BIT)
+
+def get_employee_stream_state(employee_box_key: Expr) -> Expr:
+    """Read a streaming employee's paid up to time, or seconds owed while paused"""
+    return ExtractUint64(App.box_extract(employee_box_key, EMPLOYEE_STREAM_STATE_OFFSET, Int(8)), Int(0))
+
+def set_employee_stream_state(employee_box_key: Expr, stream_state: Expr) -> Expr:
+    """Update a streaming employee's stream state in box storage"""
+    return App.box_replace(employee_box_key, EMPLOYEE_STREAM_STATE_OFFSET, Itob(stream_state))
+
+def get_employee_slot(employee_box_key: Expr) -> Expr:
+    """Read employee slot number from box storage"""
+    return ExtractUint64(App.box_extract(employee_box_key, EMPLOYEE_SLOT_OFFSET, Int(8)), Int(0))
+
+def get_employee_record_size(employee_box_key: Expr) -> Expr:
+    """Size of an employee record without its ASA ID override"""
+    return EMPLOYEE_BOX_SIZE + get_employee_streaming(employee_box_key) * STREAM_STATE_LENGTH
+
+def get_employee_asa_id(employee_box_key: Expr, employee_box_size: Expr) -> Expr:
+    """Read the asset an employee is paid in, falling back to ASA_ID_KEY
+
+    The override, when there is one, is the last 8 bytes of the box.
+    """
+    return If(employee_box_size > get_employee_record_size(employee_box_key),
+        ExtractUint64(App.box_extract(employee_box_key, employee_box_size - Int(8), Int(8)), Int(0)),
+        App.globalGet(ASA_ID_KEY)
+    )
+
+def is_opted_in(account: Expr, asa_id: Expr) -> Expr:
+    """Check an account can receive an asset (always true for ALGO)"""
+    holding = AssetHolding.balance(account, asa_id)
+    return If(asa_id == Int(0), Int(1), Seq(holding, holding.hasValue()))
+
+def get_accrued_amount(employee_box_key: Expr) -> Expr:
+    """Amount an unpaused streaming employee accrued since they were last paid"""
+    last_paid_time = get_employee_stream_state(employee_box_key)
+    return If(Global.latest_timestamp() > last_paid_time,
+        WideRatio(
+            [get_employee_amount(employee_box_key), Global.latest_timestamp() - last_paid_time],
+            [App.globalGet(CYCLE_SECS_KEY)],
+        ),
+        Int(0)
+    )
+
+def get_bitmap_shard_key(prefix: Expr, cycle: Expr, index: Expr) -> Expr:
+    """Key of the bitmap shard box holding a cycle's bit at index"""
+    return Concat(prefix, Itob(cycle), Itob(index / BITMAP_SHARD_BITS))
+
+def get_merkle_leaf(employee_address: Expr, amount: Expr, asa_id: Expr) -> Expr:
+    """Hash of a Merkle payroll leaf"""
+    return Sha512_256(Concat(MERKLE_LEAF_PREFIX, employee_address, Itob(amount), Itob(asa_id)))
 
-def get_employee_amount_key() -> Expr:
-    """Get employee amount key"""
-    return Bytes("amount")
+def get_directory_key(slot: Expr) -> Expr:
+    """Key of the slot directory shard box holding a slot"""
+    return Concat(DIRECTORY_PREFIX, Itob(slot / DIRECTORY_SHARD_SLOTS))
 
-def get_employee_paused_key() -> Expr:
-    """Get employee paused key"""
-    return Bytes("paused")
+def get_directory_offset(slot: Expr) -> Expr:
+    """Offset of a slot's entry in its directory shard"""
+    return (slot % DIRECTORY_SHARD_SLOTS) * ADDRESS_LENGTH
+
+def get_directory_entry(slot: Expr) -> Expr:
+    """Read a slot's directory entry: an address, or a free list link"""
+    return App.box_extract(get_directory_key(slot), get_directory_offset(slot), ADDRESS_LENGTH)
+
+def is_free_slot_entry(entry: Expr) -> Expr:
+    """Check a directory entry is a free list link"""
+    return Extract(entry, Int(0), FREE_SLOT_MARKER_LENGTH) == BytesZero(FREE_SLOT_MARKER_LENGTH)
+
+def get_current_cycle() -> Expr:
+    """Current payroll cycle number derived from CYCLE_SECS_KEY"""
+    return Global.latest_timestamp() / App.globalGet(CYCLE_SECS_KEY)
+
+def debug_log(message: Expr) -> Expr:
+    """Log a trace message in the debug profile, nothing in release"""
+    return Log(message) if profile == DEBUG_PROFILE else Seq()
+
+def get_array_element(array: Expr, index: Expr, length: Expr) -> Expr:
+    """Extract a static-size element from an ABI encoded dynamic array"""
+    return Extract(array, ABI_ARRAY_HEADER_LENGTH + index * length, length)
+
+def is_admin() -> Expr:
+    """Check the caller is the payroll admin"""
+    return Txn.sender() == App.globalGet(ADMIN_KEY)
+
+@Subroutine(TealType.uint64)
+def set_bitmap_bit(shard_key: Expr, index: Expr) -> Expr:
+    """Set the bit of index in a bitmap shard, creating the shard if needed
+
+    Returns the previous value of the bit.
+    """
+    offset = ScratchVar(TealType.uint64)
+    bit = ScratchVar(TealType.uint64)
+    shard_byte = ScratchVar(TealType.bytes)
 
-def create_payroll() -> Expr:
-    """Create payroll system (only during contract creation)"""
-    asa_id = Btoi(Txn.application_args[0])
-    cycle_secs = Btoi(Txn.application_args[1])
-    admin = Txn.application_args[2]
-    
     return Seq([
-        # Set global state
-        App.globalPut(ASA_ID_KEY, asa_id),
-        App.globalPut(CYCLE_SECS_KEY, cycle_secs),
-        App.globalPut(ADMIN_KEY, admin),
-        App.globalPut(TOTAL_EMPLOYEES_KEY, Int(0)),
-        App.globalPut(LAST_DISBURSEMENT_KEY, Int(0)),
-        
-        Approve()
+        # A no-op when the shard already exists
+        Pop(App.box_create(shard_key, BITMAP_SHARD_SIZE)),
+
+        offset.store((index % BITMAP_SHARD_BITS) / Int(8)),
+        bit.store(index % Int(8)),
+        shard_byte.store(App.box_extract(shard_key, offset.load(), Int(1))),
+        App.box_replace(shard_key, offset.load(), SetBit(shard_byte.load(), bit.load(), Int(1))),
+        GetBit(shard_byte.load(), bit.load()),
     ])
 
-def initialize_payroll() -> Expr:
-    """Initialize payroll system (after contract creation)"""
+@Subroutine(TealType.uint64)
+def get_bitmap_bit(shard_key: Expr, index: Expr) -> Expr:
+    """Read the bit of index in a bitmap shard, 0 if the shard does not exist"""
+    shard = App.box_length(shard_key)
+
     return Seq([
-        # Debug logs
-        Log(Bytes("Starting initialize_payroll")),
-        Log(Concat(Bytes("OnCompletion: "), Itob(Txn.on_completion()))),
-        Log(Concat(Bytes("Group size: "), Itob(Global.group_size()))),
-        Log(Concat(Bytes("Args count: "), Itob(Txn.num_app_args()))),
-        
-        Assert(Txn.on_completion() == OnComplete.NoOp),
-        Assert(Global.group_size() == Int(1)),
-        Assert(Txn.num_app_args() == Int(3)),
-        
-        # Get parameters from application args
-        asa_id = Btoi(Txn.application_args[0]),
-        cycle_secs = Btoi(Txn.application_args[1]),
-        admin = Txn.application_args[2],
-        
-        # Debug parameter values
-        Log(Concat(Bytes("ASA ID: "), Itob(asa_id))),
-        Log(Concat(Bytes("Cycle secs: "), Itob(cycle_secs))),
-        Log(Concat(Bytes("Admin: "), admin)),
-        
-        # Update global state (allow re-initialization)
-        App.globalPut(ASA_ID_KEY, asa_id),
-        App.globalPut(CYCLE_SECS_KEY, cycle_secs),
-        App.globalPut(ADMIN_KEY, admin),
-        App.globalPut(TOTAL_EMPLOYEES_KEY, Int(0)),
-        App.globalPut(LAST_DISBURSEMENT_KEY, Int(0)),
-        
-        Log(Bytes("initialize_payroll completed successfully")),
-        Approve()
+        shard,
+        If(shard.hasValue(),
+            GetBit(App.box_extract(shard_key, (index % BITMAP_SHARD_BITS) / Int(8), Int(1)), index % Int(8)),
+            Int(0)
+        ),
     ])
 
-def add_employee() -> Expr:
-    """Add employee to payroll"""
-    employee_address = Txn.application_args[0]
-    amount = Btoi(Txn.application_args[1])
-    
+@Subroutine(TealType.uint64)
+def allocate_slot(employee_address: Expr) -> Expr:
+    """Assign a slot to an address, reusing the most recently freed one"""
+    slot = ScratchVar(TealType.uint64)
+
+    return Seq([
+        If(App.globalGet(FREE_SLOT_HEAD_KEY) > Int(0),
+            Seq([
+                # Pop the head of the free list
+                slot.store(App.globalGet(FREE_SLOT_HEAD_KEY) - Int(1)),
+                App.globalPut(FREE_SLOT_HEAD_KEY, ExtractUint64(get_directory_entry(slot.load()), FREE_SLOT_MARKER_LENGTH)),
+            ]),
+            Seq([
+                slot.store(App.globalGet(NEXT_SLOT_KEY)),
+                App.globalPut(NEXT_SLOT_KEY, slot.load() + Int(1)),
+                # A no-op unless the slot starts a new shard
+                Pop(App.box_create(get_directory_key(slot.load()), DIRECTORY_SHARD_SIZE)),
+            ])
+        ),
+        App.box_replace(get_directory_key(slot.load()), get_directory_offset(slot.load()), employee_address),
+        slot.load(),
+    ])
+
+@Subroutine(TealType.none)
+def release_slot(slot: Expr) -> Expr:
+    """Push a slot onto the free list"""
+    return Seq([
+        App.box_replace(get_directory_key(slot), get_directory_offset(slot), Concat(
+            BytesZero(FREE_SLOT_MARKER_LENGTH),
+            Itob(App.globalGet(FREE_SLOT_HEAD_KEY)),
+        )),
+        App.globalPut(FREE_SLOT_HEAD_KEY, slot + Int(1)),
+    ])
+
+@Subroutine(TealType.none)
+def create_employee(employee_address: Expr, amount: Expr, stream_state: Expr, asa_override: Expr) -> Expr:
+    """Create the box storage record of a new employee
+
+    stream_state is either empty, for employees paid per cycle, or the
+    8-byte time a streaming employee starts accruing from. asa_override is
+    either empty or the 8-byte ID of the asset the employee is paid in.
+    """
+    employee_box_key = get_employee_box_key(employee_address)
+    employee_box = App.box_length(employee_box_key)
+
     return Seq([
-        Assert(Txn.on_completion() == OnComplete.NoOp),
-        Assert(Global.group_size() == Int(1)),
-        Assert(Txn.sender() == App.globalGet(ADMIN_KEY)),
         Assert(amount > Int(0)),
-        
-        # Create employee box storage
-        employee_box_key = get_employee_box_key(employee_address),
-        amount_key = get_employee_amount_key(),
-        paused_key = get_employee_paused_key(),
-        
+        Assert(Len(employee_address) == ADDRESS_LENGTH),
+
         # Check if employee already exists
-        Assert(App.box_length(employee_box_key) == Int(0)),
-        
-        # Create box with employee data (amount + paused status)
-        App.box_create(employee_box_key, Int(16)),  # 8 bytes for amount + 8 bytes for paused
-        
-        # Store employee data
-        App.box_put(employee_box_key, amount_key, Itob(amount)),
-        App.box_put(employee_box_key, paused_key, Itob(Int(0))),  # Not paused
-        
+        employee_box,
+        Assert(Not(employee_box.hasValue())),
+
+        # Write the whole record at once: not paused, never paid
+        App.box_put(employee_box_key, Concat(
+            Itob(amount),
+            SetBit(Bytes("base16", "00"), EMPLOYEE_STREAMING_BIT, Len(stream_state) > Int(0)),
+            Itob(allocate_slot(employee_address)),
+            stream_state,
+            asa_override,
+        )),
+    ])
+
+@Subroutine(TealType.none)
+def delete_employee(employee_address: Expr) -> Expr:
+    """Delete the box storage record of an existing employee"""
+    employee_box_key = get_employee_box_key(employee_address)
+    employee_box = App.box_length(employee_box_key)
+
+    return Seq([
+        # Check if employee exists
+        employee_box,
+        Assert(employee_box.hasValue()),
+
+        If(get_employee_streaming(employee_box_key) == Int(1),
+            # Streaming employees are paid what they accrued before leaving,
+            # unless they cannot receive their asset. A paused employee's
+            # owed seconds are turned back into a last paid time, as an
+            # unpause does, so they are settled too
+            Seq([
+                If(get_employee_paused(employee_box_key) == Int(1),
+                    set_employee_stream_state(employee_box_key,
+                        Global.latest_timestamp() - get_employee_stream_state(employee_box_key)
+                    )
+                ),
+                Pop(settle_stream(employee_address)),
+            ]),
+        ),
+
+        # Free the slot for the next employee, then delete employee box
+        # storage. The slot's bit in the current paid bitmap is left set, so
+        # the next employee to take the slot in this cycle, such as the same
+        # address added back from the head of the free list, is not paid again
+        release_slot(get_employee_slot(employee_box_key)),
+        Assert(App.box_delete(employee_box_key)),
+    ])
+
+
+def pay_employee(employee_address: Expr, amount: Expr, asa_id: Expr) -> Expr:
+    """Set inner transaction fields paying one employee in ALGO or ASA"""
+    # Fees are pooled on the outer disburse call
+    return If(asa_id > Int(0),
+        InnerTxnBuilder.SetFields({
+            TxnField.type_enum: TxnType.AssetTransfer,
+            TxnField.xfer_asset: asa_id,
+            TxnField.asset_receiver: employee_address,
+            TxnField.asset_amount: amount,
+            TxnField.fee: Int(0),
+        }),
+        InnerTxnBuilder.SetFields({
+            TxnField.type_enum: TxnType.Payment,
+            TxnField.receiver: employee_address,
+            TxnField.amount: amount,
+            TxnField.fee: Int(0),
+        })
+    )
+
+@Subroutine(TealType.uint64)
+def settle_stream(employee_address: Expr) -> Expr:
+    """Pay a streaming employee what accrued since they were last paid
+
+    The caller covers the inner payment fee. Returns the amount paid, 0 when
+    the employee is not opted in to their asset and the payment is deferred.
+    """
+    employee_box_key = get_employee_box_key(employee_address)
+    employee_box = App.box_length(employee_box_key)
+    accrued = ScratchVar(TealType.uint64)
+    employee_asa_id = ScratchVar(TealType.uint64)
+
+    return Seq([
+        employee_box,
+        accrued.store(get_accrued_amount(employee_box_key)),
+        If(accrued.load() == Int(0), Return(Int(0))),
+
+        # Keep accruing until the employee can receive the asset
+        employee_asa_id.store(get_employee_asa_id(employee_box_key, employee_box.value())),
+        If(Not(is_opted_in(employee_address, employee_asa_id.load())), Return(Int(0))),
+
+        # Move forward only by the time paid for, so the rounded-down
+        # remainder keeps accruing
+        set_employee_stream_state(employee_box_key,
+            get_employee_stream_state(employee_box_key)
+            + WideRatio([accrued.load(), App.globalGet(CYCLE_SECS_KEY)], [get_employee_amount(employee_box_key)])
+        ),
+
+        InnerTxnBuilder.Begin(),
+        pay_employee(employee_address, accrued.load(), employee_asa_id.load()),
+        InnerTxnBuilder.Submit(),
+        accrued.load(),
+    ])
+
+router = Router(
+    "PayrollApp",
+    BareCallActions(
+        # Bare calls do nothing: clients add them to a group to pool more
+        # opcode budget
+        no_op=OnCompleteAction.call_only(Approve()),
+        opt_in=OnCompleteAction.call_only(Approve()),
+        close_out=OnCompleteAction.call_only(Approve()),
+        update_application=OnCompleteAction.call_only(Assert(is_admin())),
+        delete_application=OnCompleteAction.call_only(Assert(is_admin())),
+    ),
+    clear_state=Approve(),
+)
+
+# Methods are matched against the selector in registration order, so the
+# hot payroll calls are registered first
+
+@Subroutine(TealType.uint64)
+def pay_if_due(employee_address: Expr, cycle: Expr, payments: Expr) -> Expr:
+    """Add an employee's payment to the inner group if they are due one in cycle
+
+    payments is the number of payments already in the group. Returns 1 if
+    the employee was paid, 0 if skipped.
+    """
+    employee_box_key = get_employee_box_key(employee_address)
+    employee_box = App.box_length(employee_box_key)
+    employee_asa_id = ScratchVar(TealType.uint64)
+    slot = ScratchVar(TealType.uint64)
+    paid_key = ScratchVar(TealType.bytes)
+
+    return Seq([
+        employee_box,
+
+        # Skip removed, paused, streaming and already paid employees (Or() does
+        # not short-circuit, so box reads must come after the existence check)
+        If(Not(employee_box.hasValue()), Return(Int(0))),
+        If(Or(
+            get_employee_paused(employee_box_key) == Int(1),
+            get_employee_streaming(employee_box_key) == Int(1),
+        ), Return(Int(0))),
+
+        slot.store(get_employee_slot(employee_box_key)),
+        paid_key.store(get_bitmap_shard_key(PAID_PREFIX, cycle, slot.load())),
+        If(get_bitmap_bit(paid_key.load(), slot.load()), Return(Int(0))),
+
+        # Employees not opted in to their asset are left unpaid for a later
+        # page instead of failing the whole page
+        employee_asa_id.store(get_employee_asa_id(employee_box_key, employee_box.value())),
+        If(Not(is_opted_in(employee_address, employee_asa_id.load())), Return(Int(0))),
+
+        If(payments == Int(0),
+            InnerTxnBuilder.Begin(),
+            InnerTxnBuilder.Next()
+        ),
+        pay_employee(employee_address, get_employee_amount(employee_box_key), employee_asa_id.load()),
+        Pop(set_bitmap_bit(paid_key.load(), slot.load())),
+        Int(1),
+    ])
+
+def start_disbursement(cycle: ScratchVar, payments: ScratchVar) -> Expr:
+    """Checks and cycle bookkeeping shared by the disburse methods"""
+    return Seq([
+        Assert(is_admin()),
+        Assert(App.globalGet(CYCLE_SECS_KEY) > Int(0)),
+
+        # Start a new cycle cursor on the first disbursement of a cycle
+        cycle.store(get_current_cycle()),
+        If(cycle.load() != App.globalGet(DISBURSE_CYCLE_KEY), Seq([
+            App.globalPut(DISBURSE_CYCLE_KEY, cycle.load()),
+            App.globalPut(DISBURSED_COUNT_KEY, Int(0)),
+        ])),
+        payments.store(Int(0)),
+    ])
+
+def finish_disbursement(payments: ScratchVar) -> Expr:
+    """Submit the inner group of a disburse method and record progress"""
+    return Seq([
+        # Submit all payments of the page as a single inner group
+        If(payments.load() > Int(0), InnerTxnBuilder.Submit()),
+
+        # Update last disbursement timestamp and cycle progress
+        App.globalPut(LAST_DISBURSEMENT_KEY, Global.latest_timestamp()),
+        App.globalPut(DISBURSED_COUNT_KEY, App.globalGet(DISBURSED_COUNT_KEY) + payments.load()),
+    ])
+
+@router.method
+def disburse(page: abi.DynamicArray[abi.Address], *, output: abi.Uint64) -> Expr:
+    """Disburse payments to a page of employees in one inner transaction group
+
+    Each employee is paid at most once per cycle: the cycle's paid bitmap
+    has a bit per employee slot, so a retried or overlapping page only pays
+    the employees that were missed, and emp_ boxes are only read. The page
+    needs references to the paid bitmap shards of its slots too.
+    DISBURSED_COUNT_KEY tracks progress of the current cycle for resuming a
+    run. Returns the number of employees paid.
+    """
+    page_bytes = page.encode()
+
+    cycle = ScratchVar(TealType.uint64)
+    i = ScratchVar(TealType.uint64)
+    payments = ScratchVar(TealType.uint64)
+
+    return Seq([
+        Assert(page.length() > Int(0)),
+        Assert(page.length() <= MAX_DISBURSE_PAGE),
+        start_disbursement(cycle, payments),
+
+        For(i.store(Int(0)), i.load() < page.length(), i.store(i.load() + Int(1))).Do(
+            payments.store(payments.load() + pay_if_due(
+                get_array_element(page_bytes, i.load(), ADDRESS_LENGTH), cycle.load(), payments.load(),
+            ))
+        ),
+
+        finish_disbursement(payments),
+
+        # Return number of employees paid
+        output.set(payments.load()),
+    ])
+
+@router.method
+def disburse_slots(start: abi.Uint64, count: abi.Uint64, *, output: abi.Uint64) -> Expr:
+    """Disburse payments to the employees of a contiguous slot range
+
+    Like disburse, with employees read from the slot directory instead of
+    passed in: free slots are skipped. The group needs references to the
+    directory shards of the range as well. Returns the number of employees
+    paid.
+    """
+    cycle = ScratchVar(TealType.uint64)
+    slot = ScratchVar(TealType.uint64)
+    payments = ScratchVar(TealType.uint64)
+    entry = ScratchVar(TealType.bytes)
+
+    return Seq([
+        Assert(count.get() > Int(0)),
+        Assert(count.get() <= MAX_DISBURSE_PAGE),
+        Assert(start.get() + count.get() <= App.globalGet(NEXT_SLOT_KEY)),
+        start_disbursement(cycle, payments),
+
+        For(slot.store(start.get()), slot.load() < start.get() + count.get(), slot.store(slot.load() + Int(1))).Do(Seq([
+            entry.store(get_directory_entry(slot.load())),
+            If(Not(is_free_slot_entry(entry.load())),
+                payments.store(payments.load() + pay_if_due(entry.load(), cycle.load(), payments.load()))
+            ),
+        ])),
+
+        finish_disbursement(payments),
+        output.set(payments.load()),
+    ])
+
+@router.method
+def claim(employee_address: abi.Address, *, output: abi.Uint64) -> Expr:
+    """Pay a streaming employee what accrued since they were last paid
+
+    Anyone may call it, the employee or a keeper bot, and the payment always
+    goes to the employee. The cost is the same whatever the elapsed time; the
+    caller covers the inner payment fee. Returns the amount paid.
+    """
+    employee_box_key = get_employee_box_key(employee_address.get())
+    employee_box = App.box_length(employee_box_key)
+
+    return Seq([
+        Assert(App.globalGet(CYCLE_SECS_KEY) > Int(0)),
+
+        employee_box,
+        Assert(employee_box.hasValue()),
+        Assert(get_employee_streaming(employee_box_key) == Int(1)),
+        Assert(get_employee_paused(employee_box_key) == Int(0)),
+
+        output.set(settle_stream(employee_address.get())),
+    ])
+
+@router.method
+def claim_merkle(
+    employee_address: abi.Address,
+    amount: abi.Uint64,
+    asa_id: abi.Uint64,
+    index: abi.Uint64,
+    proof: abi.DynamicArray[abi.StaticBytes[Literal[32]]],
+    *,
+    output: abi.Uint64,
+) -> Expr:
+    """Pay an employee's leaf of the committed Merkle payroll, once per root
+
+    Anyone may call it and the payment always goes to the employee; the
+    caller covers the inner payment fee and the claimed bitmap shard's
+    first use (paid from the app balance). Deep trees need more opcode
+    budget than one call: pad the group with bare no-op calls to the app,
+    as merkle.claim does through BudgetPadder. Returns the amount paid.
+    """
+    proof_bytes = proof.encode()
+
+    node = ScratchVar(TealType.bytes)
+    sibling = ScratchVar(TealType.bytes)
+    i = ScratchVar(TealType.uint64)
+
+    return Seq([
+        Assert(Len(App.globalGet(MERKLE_ROOT_KEY)) == MERKLE_HASH_LENGTH),
+        Assert(index.get() < App.globalGet(MERKLE_SIZE_KEY)),
+        Assert(proof.length() <= MAX_MERKLE_DEPTH),
+
+        # Hash up from the leaf: bit i of the index is 1 when the node is
+        # the right child at level i
+        node.store(get_merkle_leaf(employee_address.get(), amount.get(), asa_id.get())),
+        For(i.store(Int(0)), i.load() < proof.length(), i.store(i.load() + Int(1))).Do(Seq([
+            sibling.store(get_array_element(proof_bytes, i.load(), MERKLE_HASH_LENGTH)),
+            node.store(Sha512_256(If(ShiftRight(index.get(), i.load()) & Int(1),
+                Concat(MERKLE_NODE_PREFIX, sibling.load(), node.load()),
+                Concat(MERKLE_NODE_PREFIX, node.load(), sibling.load())
+            ))),
+        ])),
+        Assert(node.load() == App.globalGet(MERKLE_ROOT_KEY)),
+
+        # Each leaf is paid once per committed root
+        Assert(Not(set_bitmap_bit(
+            get_bitmap_shard_key(MERKLE_CLAIMED_PREFIX, App.globalGet(MERKLE_CYCLE_KEY), index.get()),
+            index.get(),
+        ))),
+
+        InnerTxnBuilder.Begin(),
+        pay_employee(employee_address.get(), amount.get(), asa_id.get()),
+        InnerTxnBuilder.Submit(),
+        output.set(amount.get()),
+    ])
+
+@router.method
+def add_employees(employees: abi.DynamicArray[abi.Tuple2[abi.Address, abi.Uint64]]) -> Expr:
+    """Add a batch of employees to payroll
+
+    May be grouped with other calls, so several batches can share one atomic
+    group and its box references, including the slot directory shards the
+    new employees are assigned to.
+    """
+    employees_bytes = employees.encode()
+
+    i = ScratchVar(TealType.uint64)
+    entry = ScratchVar(TealType.bytes)
+
+    return Seq([
+        Assert(is_admin()),
+        Assert(employees.length() > Int(0)),
+        Assert(employees.length() <= MAX_EMPLOYEE_BATCH),
+
+        For(i.store(Int(0)), i.load() < employees.length(), i.store(i.load() + Int(1))).Do(Seq([
+            entry.store(get_array_element(employees_bytes, i.load(), EMPLOYEE_ENTRY_LENGTH)),
+            create_employee(
+                Extract(entry.load(), Int(0), ADDRESS_LENGTH),
+                ExtractUint64(entry.load(), ADDRESS_LENGTH),
+                Bytes(""),
+                Bytes(""),
+            ),
+        ])),
+
+        # Update total employees count once for the whole batch
+        App.globalPut(TOTAL_EMPLOYEES_KEY, App.globalGet(TOTAL_EMPLOYEES_KEY) + employees.length()),
+    ])
+
+@router.method
+def add_employee(employee_address: abi.Address, amount: abi.Uint64) -> Expr:
+    """Add employee to payroll"""
+    return Seq([
+        Assert(Global.group_size() == Int(1)),
+        Assert(is_admin()),
+
+        create_employee(employee_address.get(), amount.get(), Bytes(""), Bytes("")),
+
         # Update total employees count
         App.globalPut(TOTAL_EMPLOYEES_KEY, App.globalGet(TOTAL_EMPLOYEES_KEY) + Int(1)),
-        
-        Approve()
     ])
 
-def remove_employee() -> Expr:
-    """Remove employee from payroll"""
-    employee_address = Txn.application_args[0]
-    
+@router.method
+def add_employee_with_asset(employee_address: abi.Address, amount: abi.Uint64, asa_id: abi.Uint64) -> Expr:
+    """Add employee to payroll, paid in their own asset"""
     return Seq([
-        Assert(Txn.on_completion() == OnComplete.NoOp),
         Assert(Global.group_size() == Int(1)),
-        Assert(Txn.sender() == App.globalGet(ADMIN_KEY)),
-        
-        # Check if employee exists
-        employee_box_key = get_employee_box_key(employee_address),
-        Assert(App.box_length(employee_box_key) > Int(0)),
-        
-        # Delete employee box storage
-        App.box_delete(employee_box_key),
-        
+        Assert(is_admin()),
+
+        create_employee(employee_address.get(), amount.get(), Bytes(""), Itob(asa_id.get())),
+
         # Update total employees count
-        App.globalPut(TOTAL_EMPLOYEES_KEY, App.globalGet(TOTAL_EMPLOYEES_KEY) - Int(1)),
-        
-        Approve()
+        App.globalPut(TOTAL_EMPLOYEES_KEY, App.globalGet(TOTAL_EMPLOYEES_KEY) + Int(1)),
     ])
 
-def fund_app() -> Expr:
-    """Fund the application with ALGO or ASA"""
-    amount = Btoi(Txn.application_args[0])
-    asa_id = App.globalGet(ASA_ID_KEY)
-    
-    return Seq([
-        Assert(Txn.on_completion() == OnComplete.NoOp),
-        Assert(Global.group_size() == Int(2)),
-        Assert(Gtxn[0].type_enum() == TxnType.Payment),
-        Assert(Gtxn[0].receiver() == Global.current_application_address()),
-        Assert(Gtxn[0].amount() == amount),
-        
-        # If ASA is specified, also check ASA transfer
-        If(asa_id > Int(0), Seq([
-            Assert(Gtxn[1].type_enum() == TxnType.AssetTransfer),
-            Assert(Gtxn[1].asset_receiver() == Global.current_application_address()),
-            Assert(Gtxn[1].xfer_asset() == asa_id),
-        ]),
-        
-        Approve()
+@router.method
+def add_streaming_employee(employee_address: abi.Address, amount: abi.Uint64) -> Expr:
+    """Add employee paid amount per cycle continuously, settled by claim"""
+    return Seq([
+        Assert(Global.group_size() == Int(1)),
+        Assert(is_admin()),
+        Assert(App.globalGet(CYCLE_SECS_KEY) > Int(0)),
+
+        # Start accruing now
+        create_employee(employee_address.get(), amount.get(), Itob(Global.latest_timestamp()), Bytes("")),
+
+        # Update total employees count
+        App.globalPut(TOTAL_EMPLOYEES_KEY, App.globalGet(TOTAL_EMPLOYEES_KEY) + Int(1)),
     ])
 
-def disburse() -> Expr:
-    """Disburse payments to employees in batches"""
-    # Note: In PyTeal, we can't iterate through all employees easily
-    # The frontend will handle individual payments and call this to update state
-    
+@router.method
+def remove_employee(employee_address: abi.Address) -> Expr:
+    """Remove employee from payroll"""
     return Seq([
-        Assert(Txn.on_completion() == OnComplete.NoOp),
         Assert(Global.group_size() == Int(1)),
-        Assert(Txn.sender() == App.globalGet(ADMIN_KEY)),
-        
-        # Update last disbursement timestamp
-        App.globalPut(LAST_DISBURSEMENT_KEY, Global.latest_timestamp()),
-        
-        # Log disbursement completion
-        Log(Bytes("Disbursement completed")),
-        
-        Approve()
+        Assert(is_admin()),
+
+        delete_employee(employee_address.get()),
+
+        # Update total employees count
+        App.globalPut(TOTAL_EMPLOYEES_KEY, App.globalGet(TOTAL_EMPLOYEES_KEY) - Int(1)),
     ])
 
-def pause_employee() -> Expr:
+@router.method
+def remove_employees(employees: abi.DynamicArray[abi.Address]) -> Expr:
+    """Remove a batch of employees from payroll
+
+    May be grouped with other calls, which can carry the references to the
+    directory shards of the employees' slots.
+    """
+    employees_bytes = employees.encode()
+
+    i = ScratchVar(TealType.uint64)
+
+    return Seq([
+        Assert(is_admin()),
+        Assert(employees.length() > Int(0)),
+        Assert(employees.length() <= MAX_EMPLOYEE_BATCH),
+
+        For(i.store(Int(0)), i.load() < employees.length(), i.store(i.load() + Int(1))).Do(
+            delete_employee(get_array_element(employees_bytes, i.load(), ADDRESS_LENGTH))
+        ),
+
+        # Update total employees count once for the whole batch
+        App.globalPut(TOTAL_EMPLOYEES_KEY, App.globalGet(TOTAL_EMPLOYEES_KEY) - employees.length()),
+    ])
+
+@router.method
+def pause_employee(employee_address: abi.Address, paused: abi.Bool) -> Expr:
     """Pause or unpause an employee"""
-    employee_address = Txn.application_args[0]
-    paused = Btoi(Txn.application_args[1])
-    
+    employee_box_key = get_employee_box_key(employee_address.get())
+    employee_box = App.box_length(employee_box_key)
+
     return Seq([
-        Assert(Txn.on_completion() == OnComplete.NoOp),
         Assert(Global.group_size() == Int(1)),
-        Assert(Txn.sender() == App.globalGet(ADMIN_KEY)),
-        Assert(Or(paused == Int(0), paused == Int(1))),
-        
+        Assert(is_admin()),
+
         # Check if employee exists
-        employee_box_key = get_employee_box_key(employee_address),
-        Assert(App.box_length(employee_box_key) > Int(0)),
-        
+        employee_box,
+        Assert(employee_box.hasValue()),
+
+        # Streaming employees are paid up to the pause and accrue again from
+        # the unpause, so a paused period is never paid. While paused, the
+        # box keeps the seconds still owed, as a deferred or rounded-down
+        # settlement leaves some, and unpausing carries them over
+        If(get_employee_streaming(employee_box_key) == Int(1), Seq([
+            If(And(paused.get(), get_employee_paused(employee_box_key) == Int(0)),
+                Pop(settle_stream(employee_address.get()))
+            ),
+            If(paused.get() != get_employee_paused(employee_box_key),
+                set_employee_stream_state(employee_box_key,
+                    Global.latest_timestamp() - get_employee_stream_state(employee_box_key)
+                )
+            ),
+        ])),
+
         # Update paused status
-        paused_key = get_employee_paused_key(),
-        App.box_put(employee_box_key, paused_key, Itob(paused)),
-        
-        Approve()
+        set_employee_paused(employee_box_key, paused.get()),
     ])
 
-def get_employee_info() -> Expr:
-    """Get employee information"""
-    employee_address = Txn.application_args[0]
-    
+@router.method
+def fund_app(payment: abi.PaymentTransaction, amount: abi.Uint64) -> Expr:
+    """Fund the application with ALGO or ASA
+
+    When the payroll pays in an ASA, the asset transfer must directly follow
+    the app call in the group.
+    """
+    asa_id = App.globalGet(ASA_ID_KEY)
+    asset_transfer = Gtxn[Txn.group_index() + Int(1)]
+
+    return Seq([
+        Assert(payment.get().receiver() == Global.current_application_address()),
+        Assert(payment.get().amount() == amount.get()),
+
+        # If ASA is specified, also check ASA transfer
+        If(asa_id > Int(0), Seq([
+            Assert(Txn.group_index() + Int(1) < Global.group_size()),
+            Assert(asset_transfer.type_enum() == TxnType.AssetTransfer),
+            Assert(asset_transfer.asset_receiver() == Global.current_application_address()),
+            Assert(asset_transfer.xfer_asset() == asa_id),
+        ])),
+    ])
+
+@router.method
+def opt_in_assets(asset_ids: abi.DynamicArray[abi.Uint64]) -> Expr:
+    """Opt the application in to the assets its employees are paid in
+
+    Opt-ins are sent as one inner group, with fees pooled on the outer call.
+    """
+    i = ScratchVar(TealType.uint64)
+    asset_id = abi.Uint64()
+
+    return Seq([
+        Assert(is_admin()),
+        Assert(asset_ids.length() > Int(0)),
+        Assert(asset_ids.length() <= MAX_ASSET_BATCH),
+
+        For(i.store(Int(0)), i.load() < asset_ids.length(), i.store(i.load() + Int(1))).Do(Seq([
+            asset_ids[i.load()].store_into(asset_id),
+            If(i.load() == Int(0), InnerTxnBuilder.Begin(), InnerTxnBuilder.Next()),
+            InnerTxnBuilder.SetFields({
+                TxnField.type_enum: TxnType.AssetTransfer,
+                TxnField.xfer_asset: asset_id.get(),
+                TxnField.asset_receiver: Global.current_application_address(),
+                TxnField.asset_amount: Int(0),
+                TxnField.fee: Int(0),
+            }),
+        ])),
+        InnerTxnBuilder.Submit(),
+    ])
+
+@router.method
+def fund_app_assets(asset_ids: abi.DynamicArray[abi.Uint64]) -> Expr:
+    """Fund the application with several assets in one group
+
+    One asset transfer per asset ID must directly follow the app call in the
+    group, in the same order.
+    """
+    i = ScratchVar(TealType.uint64)
+    asset_id = abi.Uint64()
+    asset_transfer = Gtxn[Txn.group_index() + Int(1) + i.load()]
+
+    return Seq([
+        Assert(asset_ids.length() > Int(0)),
+        Assert(Txn.group_index() + asset_ids.length() < Global.group_size()),
+
+        For(i.store(Int(0)), i.load() < asset_ids.length(), i.store(i.load() + Int(1))).Do(Seq([
+            asset_ids[i.load()].store_into(asset_id),
+            Assert(asset_transfer.type_enum() == TxnType.AssetTransfer),
+            Assert(asset_transfer.asset_receiver() == Global.current_application_address()),
+            Assert(asset_transfer.xfer_asset() == asset_id.get()),
+            Assert(asset_transfer.asset_amount() > Int(0)),
+        ])),
+    ])
+
+@router.method
+def commit_merkle_root(root: abi.StaticBytes[Literal[32]], size: abi.Uint64) -> Expr:
+    """Commit the Merkle payroll of the current cycle (admin only)
+
+    At most one root per cycle, so the claimed bitmap of a cycle always
+    refers to the same leaves.
+    """
+    return Seq([
+        Assert(is_admin()),
+        Assert(App.globalGet(CYCLE_SECS_KEY) > Int(0)),
+        Assert(size.get() > Int(0)),
+        Assert(size.get() <= ShiftLeft(Int(1), MAX_MERKLE_DEPTH)),
+        Assert(get_current_cycle() > App.globalGet(MERKLE_CYCLE_KEY)),
+
+        App.globalPut(MERKLE_ROOT_KEY, root.get()),
+        App.globalPut(MERKLE_SIZE_KEY, size.get()),
+        App.globalPut(MERKLE_CYCLE_KEY, get_current_cycle()),
+    ])
+
+@router.method
+def clear_merkle_claims(cycle: abi.Uint64, shards: abi.DynamicArray[abi.Uint64]) -> Expr:
+    """Delete claimed bitmap shards of a past Merkle cycle, freeing their MBR (admin only)"""
+    shards_bytes = shards.encode()
+    i = ScratchVar(TealType.uint64)
+
+    return Seq([
+        Assert(is_admin()),
+        Assert(cycle.get() < App.globalGet(MERKLE_CYCLE_KEY)),
+
+        For(i.store(Int(0)), i.load() < shards.length(), i.store(i.load() + Int(1))).Do(
+            # Shards nobody claimed from were never created
+            Pop(App.box_delete(Concat(
+                MERKLE_CLAIMED_PREFIX,
+                Itob(cycle.get()),
+                get_array_element(shards_bytes, i.load(), Int(8)),
+            )))
+        ),
+    ])
+
+@router.method
+def clear_paid_bitmaps(cycle: abi.Uint64, shards: abi.DynamicArray[abi.Uint64]) -> Expr:
+    """Delete paid bitmap shards of a past disburse cycle, freeing their MBR (admin only)"""
+    shards_bytes = shards.encode()
+    i = ScratchVar(TealType.uint64)
+
+    return Seq([
+        Assert(is_admin()),
+        Assert(cycle.get() < App.globalGet(DISBURSE_CYCLE_KEY)),
+
+        For(i.store(Int(0)), i.load() < shards.length(), i.store(i.load() + Int(1))).Do(
+            # Shards of slots nobody was paid at were never created
+            Pop(App.box_delete(Concat(
+                PAID_PREFIX,
+                Itob(cycle.get()),
+                get_array_element(shards_bytes, i.load(), Int(8)),
+            )))
+        ),
+    ])
+
+def load_employee_info(employee_address: abi.Address, info: EmployeeInfo) -> Expr:
+    """Read an employee record into an EmployeeInfo tuple"""
+    employee_box_key = get_employee_box_key(employee_address.get())
+    employee_box = App.box_length(employee_box_key)
+
+    exists = abi.Bool()
+    paused = abi.Bool()
+    streaming = abi.Bool()
+    amount = abi.Uint64()
+    asa_id = abi.Uint64()
+    last_paid_cycle = abi.Uint64()
+    stream_state = abi.Uint64()
+
     return Seq([
-        Assert(Txn.on_completion() == OnComplete.NoOp),
-        Assert(Global.group_size() == Int(1)),
-        
         # Check if employee exists
-        employee_box_key = get_employee_box_key(employee_address),
-        
-        If(App.box_length(employee_box_key) > Int(0), Seq([
-            # Employee exists - return their info
-            amount_key = get_employee_amount_key(),
-            paused_key = get_employee_paused_key(),
-            
-            amount_data = App.box_get(employee_box_key, amount_key),
-            paused_data = App.box_get(employee_box_key, paused_key),
-            
-            # Log the information (in a real app, you'd return this data)
-            Log(Concat(Bytes("Employee: "), employee_address)),
-            Log(Concat(Bytes("Amount: "), amount_data)),
-            Log(Concat(Bytes("Paused: "), paused_data)),
+        employee_box,
+        exists.set(employee_box.hasValue()),
+
+        If(employee_box.hasValue(), Seq([
+            paused.set(get_employee_paused(employee_box_key)),
+            streaming.set(get_employee_streaming(employee_box_key)),
+            amount.set(get_employee_amount(employee_box_key)),
+            asa_id.set(get_employee_asa_id(employee_box_key, employee_box.value())),
+
+            # Employees paid per cycle are only known paid in the current one
+            If(streaming.get(), Seq([
+                last_paid_cycle.set(Int(0)),
+                stream_state.set(get_employee_stream_state(employee_box_key)),
+            ]), Seq([
+                last_paid_cycle.set(If(
+                    get_bitmap_bit(
+                        get_bitmap_shard_key(PAID_PREFIX, App.globalGet(DISBURSE_CYCLE_KEY), get_employee_slot(employee_box_key)),
+                        get_employee_slot(employee_box_key),
+                    ),
+                    App.globalGet(DISBURSE_CYCLE_KEY),
+                    Int(0)
+                )),
+                stream_state.set(Int(0)),
+            ])),
         ]), Seq([
             # Employee doesn't exist
-            Log(Bytes("Employee not found")),
+            paused.set(False),
+            streaming.set(False),
+            amount.set(Int(0)),
+            asa_id.set(Int(0)),
+            last_paid_cycle.set(Int(0)),
+            stream_state.set(Int(0)),
         ])),
-        
-        Approve()
+
+        info.set(employee_address, exists, paused, streaming, amount, asa_id, last_paid_cycle, stream_state),
     ])
 
-def get_payroll_info() -> Expr:
+@router.method
+def get_employees_info(
+    employees: abi.DynamicArray[abi.Address],
+    *,
+    output: abi.DynamicArray[EmployeeInfo],
+) -> Expr:
+    """Get information for a batch of employees, in request order"""
+    employees_bytes = employees.encode()
+
+    i = ScratchVar(TealType.uint64)
+    records = ScratchVar(TealType.bytes)
+    employee_address = abi.Address()
+    info = EmployeeInfo()
+
+    return Seq([
+        Assert(employees.length() <= MAX_EMPLOYEE_INFO_BATCH),
+
+        # EmployeeInfo is a static type, so the array encoding is the element
+        # count followed by the packed records
+        records.store(Bytes("")),
+        For(i.store(Int(0)), i.load() < employees.length(), i.store(i.load() + Int(1))).Do(Seq([
+            employee_address.decode(get_array_element(employees_bytes, i.load(), ADDRESS_LENGTH)),
+            load_employee_info(employee_address, info),
+            records.store(Concat(records.load(), info.encode())),
+        ])),
+
+        output.decode(Concat(Extract(Itob(employees.length()), Int(6), Int(2)), records.load())),
+    ])
+
+@router.method
+def get_slot_directory(
+    start: abi.Uint64,
+    count: abi.Uint64,
+    *,
+    output: abi.DynamicArray[abi.Address],
+) -> Expr:
+    """Get the addresses of a contiguous slot range, the zero address for free slots"""
+    slot = ScratchVar(TealType.uint64)
+    entry = ScratchVar(TealType.bytes)
+    entries = ScratchVar(TealType.bytes)
+
+    return Seq([
+        Assert(count.get() <= MAX_DIRECTORY_BATCH),
+        Assert(start.get() + count.get() <= App.globalGet(NEXT_SLOT_KEY)),
+
+        entries.store(Bytes("")),
+        For(slot.store(start.get()), slot.load() < start.get() + count.get(), slot.store(slot.load() + Int(1))).Do(Seq([
+            entry.store(get_directory_entry(slot.load())),
+            entries.store(Concat(entries.load(), If(is_free_slot_entry(entry.load()), Global.zero_address(), entry.load()))),
+        ])),
+
+        output.decode(Concat(Extract(Itob(count.get()), Int(6), Int(2)), entries.load())),
+    ])
+
+@router.method
+def get_employee_info(employee_address: abi.Address, *, output: EmployeeInfo) -> Expr:
+    """Get employee information"""
+    return load_employee_info(employee_address, output)
+
+@router.method
+def get_payroll_info(*, output: PayrollInfo) -> Expr:
     """Get payroll system information"""
+    asa_id = abi.Uint64()
+    cycle_secs = abi.Uint64()
+    admin = abi.Address()
+    total_employees = abi.Uint64()
+    last_disbursement = abi.Uint64()
+    disburse_cycle = abi.Uint64()
+    disbursed_count = abi.Uint64()
+
     return Seq([
-        Assert(Txn.on_completion() == OnComplete.NoOp),
-        Assert(Global.group_size() == Int(1)),
-        
-        # Log payroll information
-        Log(Concat(Bytes("ASA ID: "), Itob(App.globalGet(ASA_ID_KEY)))),
-        Log(Concat(Bytes("Cycle Seconds: "), Itob(App.globalGet(CYCLE_SECS_KEY)))),
-        Log(Concat(Bytes("Admin: "), App.globalGet(ADMIN_KEY))),
-        Log(Concat(Bytes("Total Employees: "), Itob(App.globalGet(TOTAL_EMPLOYEES_KEY)))),
-        Log(Concat(Bytes("Last Disbursement: "), Itob(App.globalGet(LAST_DISBURSEMENT_KEY)))),
-        
-        Approve()
-    ])
-
-def get_total_employees() -> Expr:
+        asa_id.set(App.globalGet(ASA_ID_KEY)),
+        cycle_secs.set(App.globalGet(CYCLE_SECS_KEY)),
+        admin.set(App.globalGet(ADMIN_KEY)),
+        total_employees.set(App.globalGet(TOTAL_EMPLOYEES_KEY)),
+        last_disbursement.set(App.globalGet(LAST_DISBURSEMENT_KEY)),
+        disburse_cycle.set(App.globalGet(DISBURSE_CYCLE_KEY)),
+        disbursed_count.set(App.globalGet(DISBURSED_COUNT_KEY)),
+
+        output.set(
+            asa_id,
+            cycle_secs,
+            admin,
+            total_employees,
+            last_disbursement,
+            disburse_cycle,
+            disbursed_count,
+        ),
+    ])
+
+@router.method
+def get_total_employees(*, output: abi.Uint64) -> Expr:
     """Get total number of employees"""
+    return output.set(App.globalGet(TOTAL_EMPLOYEES_KEY))
+
+@router.method(no_op=CallConfig.ALL)
+def create_payroll(asa_id: abi.Uint64, cycle_secs: abi.Uint64, admin: abi.Address) -> Expr:
+    """Create the payroll system, or re-initialize it after creation (admin only)
+
+    Re-initialization may change the asset and the admin, not cycle_secs.
+    """
     return Seq([
-        Assert(Txn.on_completion() == OnComplete.NoOp),
-        Assert(Global.group_size() == Int(1)),
-        
-        # Log total employees
-        Log(Concat(Bytes("Total Employees: "), Itob(App.globalGet(TOTAL_EMPLOYEES_KEY)))),
-        
-        Approve()
-    ])
-
-def router() -> Expr:
-    """Main router for the application"""
-    return Cond(
-        [Txn.application_id() == Int(0), create_payroll()],
-        [Txn.on_completion() == OnComplete.DeleteApplication, Return(Txn.sender() == App.globalGet(ADMIN_KEY))],
-        [Txn.on_completion() == OnComplete.UpdateApplication, Return(Txn.sender() == App.globalGet(ADMIN_KEY))],
-        [Txn.on_completion() == OnComplete.CloseOut, Approve()],
-        [Txn.on_completion() == OnComplete.OptIn, Approve()],
-        [Txn.application_args[0] == Bytes("create_payroll"), initialize_payroll()],
-        [Txn.application_args[0] == Bytes("add_employee"), add_employee()],
-        [Txn.application_args[0] == Bytes("remove_employee"), remove_employee()],
-        [Txn.application_args[0] == Bytes("fund_app"), fund_app()],
-        [Txn.application_args[0] == Bytes("disburse"), disburse()],
-        [Txn.application_args[0] == Bytes("pause_employee"), pause_employee()],
-        [Txn.application_args[0] == Bytes("get_employee_info"), get_employee_info()],
-        [Txn.application_args[0] == Bytes("get_payroll_info"), get_payroll_info()],
-        [Txn.application_args[0] == Bytes("get_total_employees"), get_total_employees()],
-    )
+        # Debug logs
+        debug_log(Bytes("Starting initialize_payroll")),
+        debug_log(Concat(Bytes("OnCompletion: "), Itob(Txn.on_completion()))),
+        debug_log(Concat(Bytes("Group size: "), Itob(Global.group_size()))),
+        debug_log(Concat(Bytes("Args count: "), Itob(Txn.application_args.length()))),
+
+        # Creates may share a group (deploy.py batches tenants); a
+        # re-initialization stands alone and keeps the cycle length, as the
+        # disburse and Merkle cycle numbers and the paid bitmap keys are
+        # counted in cycles of it
+        If(Txn.application_id() != Int(0), Seq([
+            Assert(Global.group_size() == Int(1)),
+            Assert(is_admin()),
+            Assert(cycle_secs.get() == App.globalGet(CYCLE_SECS_KEY)),
+        ])),
+
+        # Debug parameter values
+        debug_log(Concat(Bytes("ASA ID: "), Itob(asa_id.get()))),
+        debug_log(Concat(Bytes("Cycle secs: "), Itob(cycle_secs.get()))),
+        debug_log(Concat(Bytes("Admin: "), admin.get())),
+
+        # Update global state (allow re-initialization)
+        App.globalPut(ASA_ID_KEY, asa_id.get()),
+        App.globalPut(CYCLE_SECS_KEY, cycle_secs.get()),
+        App.globalPut(ADMIN_KEY, admin.get()),
+
+        # Counters only start at creation: re-initializing keeps the employee
+        # records, the paid bitmaps they are counted from, the slot allocator
+        # and the Merkle keys (a cycle's root must never change)
+        If(Txn.application_id() == Int(0), Seq([
+            App.globalPut(TOTAL_EMPLOYEES_KEY, Int(0)),
+            App.globalPut(LAST_DISBURSEMENT_KEY, Int(0)),
+            App.globalPut(DISBURSE_CYCLE_KEY, Int(0)),
+            App.globalPut(DISBURSED_COUNT_KEY, Int(0)),
+        ])),
+
+        debug_log(Bytes("initialize_payroll completed successfully")),
+    ])
 
-def approval_program() -> Expr:
-    """Approval program"""
-    return router()
+def compile_contract(build_profile: str = RELEASE_PROFILE) -> tuple[str, str, sdk_abi.Contract]:
+    """Compile approval and clear programs and the ARC-4 contract description
 
-def clear_state_program() -> Expr:
-    """Clear state program"""
-    return Approve()
+    PyTeal builds each method body once per process, so a process can only
+    compile a single profile.
+    """
+    global profile
+
+    if build_profile not in PROFILES:
+        raise ValueError(f"Unknown compile profile {build_profile!r}, expected one of {PROFILES}")
+    if profile not in (None, build_profile):
+        raise ValueError(f"Already compiled the {profile!r} profile in this process")
+    profile = build_profile
+
+    return router.compile_program(
+        version=PROGRAM_VERSION,
+        optimize=OptimizeOptions(scratch_slots=True),
+    )
 
 if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Compile the payroll contract")
+    parser.add_argument("--profile", choices=PROFILES, default=RELEASE_PROFILE,
+                        help="debug keeps trace logs for LocalNet (default: %(default)s)")
+    args = parser.parse_args()
+
     # Compile the contracts
+    approval, clear, contract = compile_contract(args.profile)
+
     with open("contract.algo", "w") as f:
-        f.write(compileTeal(approval_program(), Mode.Application, version=8))
-    
+        f.write(approval)
+
     with open("contract.clear.algo", "w") as f:
-        f.write(compileTeal(clear_state_program(), Mode.Application, version=8))
\ No newline at end of file
+        f.write(clear)
+
+    with open("contract.json", "w") as f:
+        f.write(json.dumps(contract.dictify(), indent=2))
@@ -1,74 +1,264 @@
 #!/usr/bin/env python3
+"""
+Batch deployment of PayrollApp, one application per tenant
 
-import os
-from algokit_utils import (
-    ApplicationClient,
-    ApplicationSpecification,
-    get_localnet_default_account,
-    get_algod_client,
-    get_indexer_client,
+Tenants are read from a JSON manifest (admin defaults to the deployer):
+
+    [
+      {"tenant": "acme", "asa_id": 0, "cycle_secs": 2592000, "admin": "<address>"},
+      ...
+    ]
+
+Without a manifest a single "default" tenant paying in ALGO every 30 days is
+deployed. Creates are signed by the deployer (DEPLOYER_MNEMONIC, or the
+LocalNet default account), share one suggested params fetch and are submitted
+in atomic groups of up to 16. All app IDs are written to deployment_info.json
+next to this script at the end of the run.
+
+Deploys are idempotent: tenants already listed in deployment_info.json (or
+the app in app_id.txt, as the default tenant) are compared with the compiled
+programs by hash, and only updated when their approval or clear program
+differs.
+
+    python -m smart_contracts.payroll_app.deploy --manifest tenants.json
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import math
+from datetime import datetime
+from pathlib import Path
+
+from algosdk import abi
+from algosdk.atomic_transaction_composer import (
+    AccountTransactionSigner,
+    AtomicTransactionComposer,
+    TransactionWithSigner,
 )
-from algosdk import account
-from algosdk.transaction import PaymentTxn
-from algosdk.atomic_transaction_composer import TransactionWithSigner
+from algosdk.error import AlgodHTTPError
+from algosdk.logic import get_application_address
+from algosdk.transaction import ApplicationUpdateTxn, StateSchema, wait_for_confirmation
+from algosdk.v2client import algod
 
-# Load environment variables
-ALGOD_SERVER = os.getenv("ALGOD_SERVER", "https://testnet-api.algonode.cloud")
-INDEXER_SERVER = os.getenv("INDEXER_SERVER", "https://testnet-idx.algonode.cloud")
+from smart_contracts.network import get_account, get_algod_client
+from smart_contracts.payroll_app import contract
 
-def main():
-    print("🚀 Deploying PayrollApp to Testnet...")
-    
-    # Get clients
-    algod_client = get_algod_client(ALGOD_SERVER)
-    indexer_client = get_indexer_client(INDEXER_SERVER)
-    
-    # Get default account (for testnet, you'd use a funded account)
+MAX_GROUP_SIZE = 16
+MAX_PROGRAM_PAGE_SIZE = 2048
+DEFAULT_CYCLE_SECS = 30 * 24 * 60 * 60
+
+DEPLOYMENT_INFO_PATH = Path(__file__).with_name("deployment_info.json")
+APP_ID_PATH = Path(__file__).with_name("app_id.txt")
+
+def load_tenants(manifest_path: str | None, deployer: str) -> list[dict]:
+    """Read the tenant manifest, filling in defaults"""
+    if manifest_path is None:
+        tenants = [{"tenant": "default"}]
+    else:
+        tenants = json.loads(Path(manifest_path).read_text())
+
+    names = [tenant["tenant"] for tenant in tenants]
+    duplicates = {name for name in names if names.count(name) > 1}
+    if duplicates:
+        raise ValueError(f"Duplicate tenants in manifest: {', '.join(sorted(duplicates))}")
+
+    return [{
+        "tenant": tenant["tenant"],
+        "asa_id": int(tenant.get("asa_id", 0)),
+        "cycle_secs": int(tenant.get("cycle_secs", DEFAULT_CYCLE_SECS)),
+        "admin": tenant.get("admin", deployer),
+    } for tenant in tenants]
+
+def load_deployment_info() -> dict:
+    """Deployments recorded by previous runs, including a legacy app_id.txt"""
+    if DEPLOYMENT_INFO_PATH.exists():
+        return json.loads(DEPLOYMENT_INFO_PATH.read_text())
+    if APP_ID_PATH.exists():
+        return {"tenants": {"default": {"app_id": int(APP_ID_PATH.read_text().strip())}}}
+    return {"tenants": {}}
+
+def program_hash(program: bytes) -> str:
+    """SHA-256 of an assembled program"""
+    return hashlib.sha256(program).hexdigest()
+
+def get_extra_pages(approval_program: bytes, clear_program: bytes) -> int:
+    """Extra program pages needed by an application"""
+    return max(0, math.ceil((len(approval_program) + len(clear_program)) / MAX_PROGRAM_PAGE_SIZE) - 1)
+
+def get_app_params(algod_client: algod.AlgodClient, app_id: int) -> dict | None:
+    """Parameters of a deployed application, None if it is gone"""
     try:
-        account_info = get_localnet_default_account(algod_client)
-        print(f"Using account: {account_info.address}")
-    except:
-        # For testnet, we'll need a funded account
-        print("⚠️  Please provide a funded testnet account")
-        return
-    
-    # Create application client
-    app_spec = ApplicationSpecification.from_json({
-        "contract": {
-            "name": "PayrollApp",
-            "version": "1.0.0"
-        },
-        "source": {
-            "approval": "contract.algo",
-            "clear": "contract.clear.algo"
+        return algod_client.application_info(app_id)["params"]
+    except AlgodHTTPError as e:
+        if e.code == 404:
+            return None
+        raise
+
+def compile_programs(algod_client: algod.AlgodClient) -> tuple[bytes, bytes, abi.Contract]:
+    """Compile the payroll contract and assemble it with algod once for all tenants"""
+    approval, clear, abi_contract = contract.compile_contract()
+    approval_program = base64.b64decode(algod_client.compile(approval)["result"])
+    clear_program = base64.b64decode(algod_client.compile(clear)["result"])
+    return approval_program, clear_program, abi_contract
+
+def submit_in_groups(algod_client: algod.AlgodClient, tenants: list[dict], add_txn) -> list[tuple[dict, str]]:
+    """Submit one transaction per tenant in atomic groups of up to 16
+
+    add_txn(atc, tenant) adds the tenant's transaction. All groups are
+    submitted before waiting for any of them. Returns the tenants of the
+    confirmed groups with their transaction IDs.
+    """
+    submitted = []
+    for start in range(0, len(tenants), MAX_GROUP_SIZE):
+        batch = tenants[start:start + MAX_GROUP_SIZE]
+        atc = AtomicTransactionComposer()
+        for tenant in batch:
+            add_txn(atc, tenant)
+        try:
+            submitted.append((batch, atc.submit(algod_client)))
+            print(f"📤 Submitted group of {len(batch)} transactions")
+        except AlgodHTTPError as e:
+            print(f"❌ Group starting at {batch[0]['tenant']} rejected: {e}")
+
+    confirmed = []
+    for batch, tx_ids in submitted:
+        try:
+            wait_for_confirmation(algod_client, tx_ids[0], 4)
+        except Exception as e:
+            print(f"❌ Group starting at {batch[0]['tenant']} not confirmed: {e}")
+            continue
+        confirmed += zip(batch, tx_ids)
+    return confirmed
+
+def deploy_tenants(algod_client: algod.AlgodClient, sp, deployer: str, signer: AccountTransactionSigner,
+                   tenants: list[dict], approval_program: bytes, clear_program: bytes,
+                   abi_contract: abi.Contract) -> dict:
+    """Create one application per tenant"""
+    create_payroll = abi_contract.get_method_by_name("create_payroll")
+    extra_pages = get_extra_pages(approval_program, clear_program)
+
+    def add_create(atc: AtomicTransactionComposer, tenant: dict):
+        atc.add_method_call(
+            app_id=0,
+            method=create_payroll,
+            sender=deployer,
+            sp=sp,
+            signer=signer,
+            method_args=[tenant["asa_id"], tenant["cycle_secs"], tenant["admin"]],
+            approval_program=approval_program,
+            clear_program=clear_program,
+            global_schema=StateSchema(contract.GLOBAL_NUM_UINTS, contract.GLOBAL_NUM_BYTE_SLICES),
+            local_schema=StateSchema(0, 0),
+            extra_pages=extra_pages,
+            # Tenants with identical settings would otherwise be identical transactions
+            note=f"payroll:{tenant['tenant']}".encode(),
+        )
+
+    deployed = {}
+    for tenant, tx_id in submit_in_groups(algod_client, tenants, add_create):
+        app_id = algod_client.pending_transaction_info(tx_id)["application-index"]
+        deployed[tenant["tenant"]] = {
+            "app_id": app_id,
+            "app_address": get_application_address(app_id),
+            "admin_address": tenant["admin"],
+            "asa_id": tenant["asa_id"],
+            "cycle_secs": tenant["cycle_secs"],
         }
-    })
-    
-    client = ApplicationClient(
-        algod_client=algod_client,
-        app_spec=app_spec,
-        signer=account_info,
-    )
-    
-    try:
-        # Deploy the application
-        print("📦 Deploying application...")
-        app_id, app_address, txid = client.create()
-        
-        print(f"✅ PayrollApp deployed successfully!")
-        print(f"📋 App ID: {app_id}")
-        print(f"📍 App Address: {app_address}")
-        print(f"🔗 Transaction ID: {txid}")
-        print(f"🌐 AlgoExplorer: https://testnet.algoexplorer.io/application/{app_id}")
-        
-        # Save App ID to file for frontend
-        with open("app_id.txt", "w") as f:
-            f.write(str(app_id))
-        
-        print(f"💾 App ID saved to app_id.txt")
-        
-    except Exception as e:
-        print(f"❌ Deployment failed: {e}")
+        print(f"✅ {tenant['tenant']}: App ID {app_id}")
+
+    return deployed
+
+def update_tenants(algod_client: algod.AlgodClient, sp, deployer: str, signer: AccountTransactionSigner,
+                   tenants: list[dict], approval_program: bytes, clear_program: bytes) -> list[str]:
+    """Update the programs of existing applications (the deployer must be their admin)"""
+    def add_update(atc: AtomicTransactionComposer, tenant: dict):
+        atc.add_transaction(TransactionWithSigner(
+            ApplicationUpdateTxn(
+                deployer, sp, tenant["app_id"], approval_program, clear_program,
+                note=f"payroll:{tenant['tenant']}".encode(),
+            ),
+            signer,
+        ))
+
+    updated = []
+    for tenant, _ in submit_in_groups(algod_client, tenants, add_update):
+        updated.append(tenant["tenant"])
+        print(f"🔄 {tenant['tenant']}: App ID {tenant['app_id']} updated")
+    return updated
+
+def main():
+    """Create or update the payroll application of every tenant"""
+    parser = argparse.ArgumentParser(description="Deploy PayrollApp for each tenant of a manifest")
+    parser.add_argument("--manifest", help="JSON list of tenants (default: a single default tenant)")
+    args = parser.parse_args()
+
+    print("🚀 Deploying PayrollApp...")
+
+    algod_client = get_algod_client()
+    deployer, signer = get_account(algod_client, "DEPLOYER_MNEMONIC")
+    print(f"Using account: {deployer}")
+
+    deployment_info = load_deployment_info()
+    tenants = load_tenants(args.manifest, deployer)
+
+    print("📦 Compiling application...")
+    approval_program, clear_program, abi_contract = compile_programs(algod_client)
+    approval_hash, clear_hash = program_hash(approval_program), program_hash(clear_program)
+    extra_pages = get_extra_pages(approval_program, clear_program)
+
+    # Compare existing applications with the compiled programs
+    to_create, to_update = [], []
+    for tenant in tenants:
+        existing = deployment_info["tenants"].get(tenant["tenant"])
+        params = existing and get_app_params(algod_client, existing["app_id"])
+        if not params:
+            if existing:
+                print(f"⚠️  {tenant['tenant']}: App ID {existing['app_id']} no longer exists, creating a new one")
+            to_create.append(tenant)
+            continue
+
+        onchain_hashes = (
+            program_hash(base64.b64decode(params["approval-program"])),
+            program_hash(base64.b64decode(params["clear-state-program"])),
+        )
+        if onchain_hashes == (approval_hash, clear_hash):
+            print(f"⏭️  {tenant['tenant']} is up to date")
+        elif existing.get("admin_address", deployer) != deployer:
+            print(f"⚠️  {tenant['tenant']}: programs changed but only its admin can update it")
+        elif params.get("extra-program-pages", 0) < extra_pages:
+            # Extra pages are fixed at creation
+            print(f"⚠️  {tenant['tenant']}: programs outgrew App ID {existing['app_id']}, it must be redeployed")
+        elif (params["global-state-schema"].get("num-uint", 0) < contract.GLOBAL_NUM_UINTS
+              or params["global-state-schema"].get("num-byte-slice", 0) < contract.GLOBAL_NUM_BYTE_SLICES):
+            # So is the global state schema
+            print(f"⚠️  {tenant['tenant']}: App ID {existing['app_id']} lacks global state keys, it must be redeployed")
+        else:
+            to_update.append({**tenant, "app_id": existing["app_id"]})
+
+    if not to_create and not to_update:
+        return 0
+
+    sp = algod_client.suggested_params()
+    deployed = deploy_tenants(algod_client, sp, deployer, signer, to_create, approval_program, clear_program, abi_contract)
+    updated = update_tenants(algod_client, sp, deployer, signer, to_update, approval_program, clear_program)
+
+    # Write all app IDs at once
+    deployment_info["tenants"].update(deployed)
+    for name in (*deployed, *updated):
+        deployment_info["tenants"][name].update({"approval_hash": approval_hash, "clear_hash": clear_hash})
+    deployment_info["deployer_address"] = deployer
+    deployment_info["deployment_time"] = datetime.now().isoformat()
+    DEPLOYMENT_INFO_PATH.write_text(json.dumps(deployment_info, indent=2) + "\n")
+    print(f"💾 {len(deployed)} created and {len(updated)} updated App IDs saved to {DEPLOYMENT_INFO_PATH}")
+
+    # Single tenant deployments keep app_id.txt for the frontend
+    if len(tenants) == 1 and tenants[0]["tenant"] in deployed:
+        APP_ID_PATH.write_text(str(deployed[tenants[0]["tenant"]]["app_id"]))
+        print(f"💾 App ID saved to {APP_ID_PATH}")
+
+    return 0 if len(deployed) == len(to_create) and len(updated) == len(to_update) else 1
 
 if __name__ == "__main__":
-    main()
+    exit(main())
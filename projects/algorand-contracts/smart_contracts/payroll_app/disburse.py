@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Concurrent payroll run against a deployed PayrollApp
+
+Employees are read from the app's emp_ boxes. Paused, streaming (paid by
+`claim`) and already paid employees are skipped, as are employees not
+opted in to the asset they are paid in (checked up front against one
+indexer listing of each asset's holders). The rest
+are sorted by asset and paid in pages of up to 16 through the contract's
+`disburse` method. Each page is one atomic group: the disburse call plus
+zero-fee app calls carrying the page's account, box (employee and paid
+bitmap shard) and asset references, with every fee (including the inner
+payments) pooled on the disburse call.
+
+Pages are submitted concurrently under a rate limit and an in-flight window,
+tracked until confirmed and retried on failure. Retrying is safe: the
+contract marks each employee's slot in the cycle's paid bitmap, so a page
+that did land is a no-op the second time.
+
+    python -m smart_contracts.payroll_app.disburse --app-id 1234 --rate 20 --window 32
+"""
+
+import argparse
+import asyncio
+import base64
+import copy
+import time
+
+from algosdk import encoding
+from algosdk.atomic_transaction_composer import AccountTransactionSigner, AtomicTransactionComposer
+from algosdk.error import AlgodHTTPError
+from algosdk.v2client import algod, indexer
+
+from smart_contracts.box_export import EMPLOYEE_PREFIX, PAID_PREFIX, export_records, is_slot_set
+from smart_contracts.network import get_account, get_algod_client, get_indexer_client
+from smart_contracts.payroll_app import contract
+from smart_contracts.payroll_app.deploy import APP_ID_PATH
+
+# Employees per disburse call, one inner payment each
+PAGE_SIZE = contract.MAX_DISBURSE_PAGE.value
+
+# References per transaction: each employee needs an account and a box
+# reference, and a transaction holds at most 4 accounts and 8 references
+EMPLOYEES_PER_TXN = 4
+MAX_REFS_PER_TXN = 8
+
+# Holders per page when listing an asset's holders from the indexer
+INDEXER_PAGE_SIZE = 1000
+
+DEFAULT_RATE = 20.0
+DEFAULT_WINDOW = 32
+DEFAULT_MAX_RETRIES = 3
+POLL_INTERVAL = 1.0
+
+# ARC-4 return value log prefix
+RETURN_PREFIX = bytes.fromhex("151f7c75")
+
+def get_payroll_state(algod_client: algod.AlgodClient, app_id: int) -> dict:
+    """Global state of a payroll application"""
+    state = {}
+    for entry in algod_client.application_info(app_id)["params"].get("global-state", []):
+        key = base64.b64decode(entry["key"]).decode()
+        value = entry["value"]
+        state[key] = base64.b64decode(value["bytes"]) if value["type"] == 1 else value["uint"]
+    return state
+
+def get_current_cycle(algod_client: algod.AlgodClient, cycle_secs: int) -> int:
+    """Cycle the contract pays in now, from the last block's timestamp
+
+    Calls confirmed in the next round see it as Global.latest_timestamp().
+    """
+    last_round = algod_client.status()["last-round"]
+    return algod_client.block_info(last_round)["block"]["ts"] // cycle_secs
+
+def get_paid_shard_key(cycle: int, slot: int) -> bytes:
+    """Box name of the paid bitmap shard of a slot"""
+    shard = slot // contract.BITMAP_SHARD_BITS.value
+    return PAID_PREFIX + cycle.to_bytes(8, "big") + shard.to_bytes(8, "big")
+
+def load_payable_employees(algod_client: algod.AlgodClient, app_id: int, cycle: int) -> list[dict]:
+    """Employees paid per cycle that are not paused and not yet paid in cycle"""
+    employees = []
+    paid_bitmaps = {}
+    for record in export_records(algod_client, "payroll_app", app_id):
+        if record["type"] == "employee" and not record["paused"] and not record["streaming"]:
+            employees.append(record)
+        elif record["type"] == "paid_bitmap" and record["cycle"] == cycle:
+            paid_bitmaps[record["shard"]] = bytes.fromhex(record["bitmap"])
+
+    shard_bits = contract.BITMAP_SHARD_BITS.value
+    return [
+        employee for employee in employees
+        if not is_slot_set(paid_bitmaps.get(employee["slot"] // shard_bits, bytes(1)), employee["slot"])
+    ]
+
+def get_pages(employees: list[dict], page_size: int = PAGE_SIZE) -> list[list[dict]]:
+    """Split employees into disburse pages"""
+    return [employees[start:start + page_size] for start in range(0, len(employees), page_size)]
+
+class RateLimiter:
+    """Space out acquisitions to at most `rate` per second"""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self.next_time = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class Disbursement:
+    """One payroll run: concurrent disburse pages with confirmation tracking"""
+
+    def __init__(self, algod_client: algod.AlgodClient, indexer_client: indexer.IndexerClient, app_id: int,
+                 admin: str, signer: AccountTransactionSigner, cycle: int, asa_id: int = 0,
+                 rate: float = DEFAULT_RATE, window: int = DEFAULT_WINDOW, max_retries: int = DEFAULT_MAX_RETRIES,
+                 poll_interval: float = POLL_INTERVAL):
+        self.algod_client = algod_client
+        self.indexer_client = indexer_client
+        self.app_id = app_id
+        self.admin = admin
+        self.signer = signer
+        self.cycle = cycle
+        self.asa_id = asa_id
+        self.max_retries = max_retries
+        self.poll_interval = poll_interval
+
+        abi_contract = contract.router.contract_construct()
+        self.disburse_method = abi_contract.get_method_by_name("disburse")
+        self.reference_method = abi_contract.get_method_by_name("get_total_employees")
+
+        self.rate_limiter = RateLimiter(rate)
+        self.window = asyncio.Semaphore(window)
+        self.sp = None
+
+    def get_asset(self, employee: dict) -> int:
+        """Asset an employee is paid in, 0 for ALGO"""
+        return employee.get("asa_id", self.asa_id)
+
+    async def get_asset_holders(self, asset_id: int) -> set[str]:
+        """Accounts opted in to an asset, as the indexer lists them"""
+        holders = set()
+        next_page = None
+        while True:
+            async with self.window:
+                response = await asyncio.to_thread(
+                    self.indexer_client.asset_balances, asset_id, limit=INDEXER_PAGE_SIZE, next_page=next_page,
+                )
+            holders.update(balance["address"] for balance in response.get("balances", []))
+
+            next_page = response.get("next-token")
+            if not next_page or not response.get("balances"):
+                return holders
+
+    async def filter_opted_in(self, employees: list[dict]) -> list[dict]:
+        """Drop employees that cannot receive their asset yet
+
+        An opt-in the indexer has not caught up with only defers the
+        employee to the next run, and the contract itself skips employees
+        that opted out since.
+        """
+        asset_ids = sorted({self.get_asset(employee) for employee in employees} - {0})
+        holders = dict(zip(asset_ids, await asyncio.gather(*(self.get_asset_holders(a) for a in asset_ids))))
+
+        payable = []
+        for employee in employees:
+            asset_id = self.get_asset(employee)
+            if asset_id and employee["address"] not in holders[asset_id]:
+                print(f"⚠️  {employee['address']} is not opted in to asset {asset_id}, skipped")
+            else:
+                payable.append(employee)
+        return payable
+
+    async def refresh_params(self):
+        """Fetch suggested params shared by every page"""
+        self.sp = await asyncio.to_thread(self.algod_client.suggested_params)
+
+    def params(self, fee: int):
+        """Shared suggested params with a flat fee"""
+        sp = copy.copy(self.sp)
+        sp.flat_fee = True
+        sp.fee = fee
+        return sp
+
+    def build_group(self, page: list[dict]) -> AtomicTransactionComposer:
+        """Disburse call for a page plus the calls carrying its references"""
+        reference_txns = []
+        for start in range(0, len(page), EMPLOYEES_PER_TXN):
+            employees = page[start:start + EMPLOYEES_PER_TXN]
+            reference_txns.append({
+                "accounts": [e["address"] for e in employees],
+                "boxes": [(0, EMPLOYEE_PREFIX + encoding.decode_address(e["address"])) for e in employees],
+                "foreign_assets": [],
+            })
+
+        # Asset references of ASA payrolls and per-employee asset overrides,
+        # and the paid bitmap shards of the page's slots
+        asset_ids = sorted({self.get_asset(e) for e in page} - {0})
+        shard_keys = sorted({get_paid_shard_key(self.cycle, e["slot"]) for e in page})
+        refs = [("foreign_assets", asset_id) for asset_id in asset_ids] + [("boxes", (0, key)) for key in shard_keys]
+        for start in range(0, len(refs), MAX_REFS_PER_TXN):
+            txn_refs = {"accounts": [], "boxes": [], "foreign_assets": []}
+            for kind, ref in refs[start:start + MAX_REFS_PER_TXN]:
+                txn_refs[kind].append(ref)
+            reference_txns.append(txn_refs)
+
+        # The disburse call carries the first references and every fee: the
+        # group's transactions plus one inner payment per employee
+        min_fee = max(self.sp.min_fee, 1000)
+        atc = AtomicTransactionComposer()
+        atc.add_method_call(
+            app_id=self.app_id,
+            method=self.disburse_method,
+            sender=self.admin,
+            sp=self.params((len(reference_txns) + len(page)) * min_fee),
+            signer=self.signer,
+            method_args=[[e["address"] for e in page]],
+            **reference_txns[0],
+        )
+        for refs in reference_txns[1:]:
+            atc.add_method_call(
+                app_id=self.app_id,
+                method=self.reference_method,
+                sender=self.admin,
+                sp=self.params(0),
+                signer=self.signer,
+                **refs,
+            )
+        return atc
+
+    async def confirm(self, tx_id: str, last_valid: int) -> dict:
+        """Wait until a transaction is confirmed, rejected or expired"""
+        while True:
+            try:
+                info = await asyncio.to_thread(self.algod_client.pending_transaction_info, tx_id)
+            except AlgodHTTPError as e:
+                if e.code != 404:
+                    raise
+                info = {}
+            if info.get("confirmed-round"):
+                return info
+            if info.get("pool-error"):
+                raise RuntimeError(info["pool-error"])
+
+            status = await asyncio.to_thread(self.algod_client.status)
+            if status["last-round"] > last_valid:
+                raise TimeoutError(f"{tx_id} expired at round {last_valid}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def disburse_page(self, page: list[dict]) -> int:
+        """Submit a page until it is confirmed, returning the employees paid"""
+        for attempt in range(self.max_retries + 1):
+            async with self.window:
+                await self.rate_limiter.wait()
+                try:
+                    atc = self.build_group(page)
+                    tx_ids = await asyncio.to_thread(atc.submit, self.algod_client)
+                    info = await self.confirm(tx_ids[0], atc.txn_list[0].txn.last_valid_round)
+                except Exception as e:
+                    if attempt == self.max_retries:
+                        raise
+                    print(f"🔁 Page of {len(page)} from {page[0]['address']} failed ({e}), retrying")
+                else:
+                    logs = [base64.b64decode(log) for log in info.get("logs", [])]
+                    returns = [log for log in logs if log.startswith(RETURN_PREFIX)]
+                    return int.from_bytes(returns[-1][len(RETURN_PREFIX):], "big") if returns else 0
+
+            # Back off, then retry with fresh params so the group gets new IDs
+            await asyncio.sleep(self.poll_interval * 2 ** attempt)
+            await self.refresh_params()
+
+    async def run(self, employees: list[dict]) -> dict:
+        """Disburse all pages concurrently"""
+        await self.refresh_params()
+
+        # Pages of a single asset need the fewest asset references
+        payable = await self.filter_opted_in(employees)
+        pages = get_pages(sorted(payable, key=self.get_asset))
+        results = await asyncio.gather(*(self.disburse_page(page) for page in pages), return_exceptions=True)
+
+        failed = [(page, result) for page, result in zip(pages, results) if isinstance(result, BaseException)]
+        for page, error in failed:
+            print(f"❌ Page of {len(page)} from {page[0]['address']} failed: {error}")
+        return {
+            "skipped": len(employees) - len(payable),
+            "pages": len(pages),
+            "failed_pages": len(failed),
+            "paid": sum(result for result in results if not isinstance(result, BaseException)),
+        }
+
+def main():
+    """Pay every payable employee of a payroll application"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--app-id", type=int, help=f"payroll application ID (default: {APP_ID_PATH})")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE,
+                        help="groups submitted per second (default: %(default)s)")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW,
+                        help="groups in flight at once (default: %(default)s)")
+    parser.add_argument("--max-retries", type=int, default=DEFAULT_MAX_RETRIES,
+                        help="retries per page (default: %(default)s)")
+    args = parser.parse_args()
+
+    app_id = args.app_id or int(APP_ID_PATH.read_text().strip())
+    algod_client = get_algod_client()
+    admin, signer = get_account(algod_client, "DEPLOYER_MNEMONIC")
+
+    state = get_payroll_state(algod_client, app_id)
+    if encoding.encode_address(state["admin"]) != admin:
+        print(f"❌ {admin} is not the admin of App ID {app_id}")
+        return 1
+
+    # Pages confirmed after the next cycle boundary reference the wrong paid
+    # bitmap and fail until the next run
+    cycle = get_current_cycle(algod_client, state["cycle_secs"])
+    employees = load_payable_employees(algod_client, app_id, cycle)
+    print(f"💸 Paying {len(employees)} employees of App ID {app_id} in cycle {cycle}...")
+
+    disbursement = Disbursement(algod_client, get_indexer_client(), app_id, admin, signer, cycle,
+                                asa_id=state["asa_id"], rate=args.rate, window=args.window,
+                                max_retries=args.max_retries)
+    started = time.monotonic()
+    summary = asyncio.run(disbursement.run(employees))
+    elapsed = time.monotonic() - started
+
+    print(f"✅ Paid {summary['paid']} employees in {summary['pages']} pages ({elapsed:.1f}s), "
+          f"{summary['skipped']} not opted in")
+    return 1 if summary["failed_pages"] else 0
+
+if __name__ == "__main__":
+    exit(main())
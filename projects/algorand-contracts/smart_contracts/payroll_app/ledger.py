@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Local SQLite cache of a payroll application's state
+
+The first sync snapshots the global state and every emp_ box. Later syncs
+only replay the app calls confirmed since the last synced round, read from
+the indexer: employee adds, removals and pauses, disburse calls, whose
+inner payments tell which employees were paid, and streaming claims. Calls
+are replayed at the timestamp the contract saw, the one of the previous
+block. Global state is refreshed from algod on every sync.
+
+Claims and pauses of streaming employees move their last paid time
+relative to its current value, so their emp_ boxes are read again from
+algod after a replay. Every other replayed call is an overwrite (adds are
+upserts, pauses and paid cycles set a value), so replaying a round twice,
+as the first replay does with the snapshot round, leaves the cache as is.
+
+    python -m smart_contracts.payroll_app.ledger sync --app-id 1234
+    python -m smart_contracts.payroll_app.ledger get <address>
+    python -m smart_contracts.payroll_app.ledger list --after <address> --limit 50
+"""
+
+import argparse
+import base64
+import json
+import sqlite3
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from algosdk import encoding
+from algosdk.v2client import algod, indexer
+
+from smart_contracts.box_export import EMPLOYEE_PREFIX, decode_payroll_box, export_records, fetch_boxes, is_slot_set
+from smart_contracts.network import get_algod_client, get_indexer_client
+from smart_contracts.payroll_app import contract
+from smart_contracts.payroll_app.deploy import APP_ID_PATH
+from smart_contracts.payroll_app.disburse import get_payroll_state
+
+DEFAULT_DB_PATH = Path("payroll_ledger.sqlite")
+INDEXER_PAGE_SIZE = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sync (
+    app_id INTEGER PRIMARY KEY,
+    last_round INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS payroll (
+    app_id INTEGER PRIMARY KEY,
+    asa_id INTEGER NOT NULL,
+    cycle_secs INTEGER NOT NULL,
+    admin TEXT NOT NULL,
+    total_employees INTEGER NOT NULL,
+    last_disbursement INTEGER NOT NULL,
+    disburse_cycle INTEGER NOT NULL,
+    disbursed_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS employees (
+    app_id INTEGER NOT NULL,
+    address TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    paused INTEGER NOT NULL,
+    streaming INTEGER NOT NULL,
+    last_paid_cycle INTEGER NOT NULL,
+    stream_state INTEGER,
+    asa_id INTEGER,
+    PRIMARY KEY (app_id, address)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS employees_by_amount ON employees (app_id, amount);
+"""
+
+EMPLOYEE_COLUMNS = ("address", "amount", "paused", "streaming", "last_paid_cycle", "stream_state", "asa_id")
+PAYROLL_COLUMNS = ("asa_id", "cycle_secs", "admin", "total_employees", "last_disbursement", "disburse_cycle", "disbursed_count")
+
+# Methods replayed from the indexer, by selector
+METHODS = {
+    method.get_selector(): method
+    for method in contract.router.contract_construct().methods
+    if method.name in (
+        "add_employee", "add_employee_with_asset", "add_employees", "add_streaming_employee",
+        "remove_employee", "remove_employees", "pause_employee", "disburse", "disburse_slots", "claim",
+    )
+}
+
+class LedgerCache:
+    """SQLite mirror of one payroll application"""
+
+    def __init__(self, app_id: int, path: Path | str = DEFAULT_DB_PATH):
+        self.app_id = app_id
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.executescript(SCHEMA)
+        # Timestamps of the blocks before each replayed round
+        self.timestamps = {}
+
+    def close(self):
+        self.db.close()
+
+    @property
+    def last_round(self) -> int | None:
+        """Last round synced, None before the first sync"""
+        row = self.db.execute("SELECT last_round FROM sync WHERE app_id = ?", (self.app_id,)).fetchone()
+        return row["last_round"] if row else None
+
+    def get_payroll(self) -> dict | None:
+        """Cached global state"""
+        row = self.db.execute("SELECT * FROM payroll WHERE app_id = ?", (self.app_id,)).fetchone()
+        return {column: row[column] for column in PAYROLL_COLUMNS} if row else None
+
+    def get_employee(self, address: str) -> dict | None:
+        """Cached employee record"""
+        row = self.db.execute(
+            "SELECT * FROM employees WHERE app_id = ? AND address = ?", (self.app_id, address),
+        ).fetchone()
+        return self.employee(row) if row else None
+
+    def list_employees(self, after: str = "", limit: int = 100) -> list[dict]:
+        """Employees ordered by address, starting after an address"""
+        rows = self.db.execute(
+            "SELECT * FROM employees WHERE app_id = ? AND address > ? ORDER BY address LIMIT ?",
+            (self.app_id, after, limit),
+        )
+        return [self.employee(row) for row in rows]
+
+    def employees_by_amount(self, min_amount: int = 0, max_amount: int = 2**64 - 1) -> list[dict]:
+        """Employees paid between two amounts, inclusive"""
+        rows = self.db.execute(
+            "SELECT * FROM employees WHERE app_id = ? AND amount BETWEEN ? AND ? ORDER BY amount, address",
+            (self.app_id, min_amount, max_amount),
+        )
+        return [self.employee(row) for row in rows]
+
+    @staticmethod
+    def employee(row: sqlite3.Row) -> dict:
+        record = {column: row[column] for column in EMPLOYEE_COLUMNS}
+        record["paused"] = bool(record["paused"])
+        record["streaming"] = bool(record["streaming"])
+        return record
+
+    def sync(self, algod_client: algod.AlgodClient, indexer_client: indexer.IndexerClient) -> int:
+        """Bring the cache up to date, returning the number of app calls replayed"""
+        with self.db:
+            if self.last_round is None:
+                self.snapshot(algod_client)
+                replayed = 0
+            else:
+                replayed = self.replay(algod_client, indexer_client)
+            self.save_payroll(get_payroll_state(algod_client, self.app_id))
+        return replayed
+
+    def snapshot(self, algod_client: algod.AlgodClient):
+        """Load every employee box, recording the round the snapshot started at
+
+        Calls confirmed during the export are replayed by the next sync, as
+        replaying leaves boxes already read unchanged. Employees paid per
+        cycle get their last paid cycle from the latest paid bitmap; earlier
+        ones are not recorded on chain.
+        """
+        start_round = algod_client.status()["last-round"]
+        self.db.execute("DELETE FROM employees WHERE app_id = ?", (self.app_id,))
+        addresses_by_slot = {}
+        paid_bitmaps = {}
+        for record in export_records(algod_client, "payroll_app", self.app_id):
+            if record["type"] == "employee":
+                self.put_employee(record["address"], record["amount"], record["paused"], 0,
+                                  record.get("asa_id"), record.get("stream_state"))
+                if not record["streaming"]:
+                    addresses_by_slot[record["slot"]] = record["address"]
+            elif record["type"] == "paid_bitmap":
+                paid_bitmaps.setdefault(record["cycle"], {})[record["shard"]] = bytes.fromhex(record["bitmap"])
+
+        if paid_bitmaps:
+            cycle = max(paid_bitmaps)
+            shard_bits = contract.BITMAP_SHARD_BITS.value
+            self.db.executemany(
+                "UPDATE employees SET last_paid_cycle = ? WHERE app_id = ? AND address = ?",
+                [
+                    (cycle, self.app_id, address) for slot, address in addresses_by_slot.items()
+                    if is_slot_set(paid_bitmaps[cycle].get(slot // shard_bits, bytes(1)), slot)
+                ],
+            )
+        self.set_last_round(start_round)
+
+    def replay(self, algod_client: algod.AlgodClient, indexer_client: indexer.IndexerClient) -> int:
+        """Apply the app calls confirmed after the last synced round"""
+        replayed = 0
+        streams = set()
+        for txn in self.search_app_calls(indexer_client, self.last_round + 1):
+            replayed += self.apply(txn, self.get_latest_timestamp(indexer_client, txn["confirmed-round"]))
+            streams.update(self.get_settled_streams(txn))
+        self.refresh_employees(algod_client, streams)
+        return replayed
+
+    def get_latest_timestamp(self, indexer_client: indexer.IndexerClient, confirmed_round: int) -> int:
+        """Global.latest_timestamp() of the calls of a round: the previous block's timestamp"""
+        if confirmed_round not in self.timestamps:
+            block = indexer_client.block_info(round_num=confirmed_round - 1, header_only=True)
+            self.timestamps[confirmed_round] = block["timestamp"]
+        return self.timestamps[confirmed_round]
+
+    def get_settled_streams(self, txn: dict) -> list[str]:
+        """Streaming employees whose last paid time a call moved"""
+        args = [base64.b64decode(arg) for arg in txn["application-transaction"].get("application-args", [])]
+        method = METHODS.get(args[0]) if args else None
+        if method is None or method.name not in ("claim", "pause_employee"):
+            return []
+        employee = self.get_employee(method.args[0].type.decode(args[1]))
+        return [employee["address"]] if employee and employee["streaming"] else []
+
+    def refresh_employees(self, algod_client: algod.AlgodClient, addresses: Iterable[str]):
+        """Read employees' emp_ boxes again, dropping those removed since"""
+        names = [EMPLOYEE_PREFIX + encoding.decode_address(address) for address in sorted(addresses)]
+        found = set()
+        for name, value in fetch_boxes(algod_client, self.app_id, names):
+            record = decode_payroll_box(name, value)
+            self.put_employee(record["address"], record["amount"], record["paused"], 0,
+                              record.get("asa_id"), record.get("stream_state"))
+            found.add(name)
+        self.delete_employees([
+            encoding.encode_address(name[len(EMPLOYEE_PREFIX):]) for name in names if name not in found
+        ])
+
+    def search_app_calls(self, indexer_client: indexer.IndexerClient, min_round: int) -> Iterator[dict]:
+        """App calls to the application from min_round, in confirmation order"""
+        next_page = None
+        max_round = None
+        while True:
+            response = indexer_client.search_transactions(
+                application_id=self.app_id, txn_type="appl", min_round=min_round, max_round=max_round,
+                limit=INDEXER_PAGE_SIZE, next_page=next_page,
+            )
+            # Pin later pages to the round of the first one
+            if max_round is None:
+                max_round = response["current-round"]
+            yield from response.get("transactions", [])
+
+            next_page = response.get("next-token")
+            if not next_page or not response.get("transactions"):
+                break
+        # An indexer lagging behind the last sync must not move it back
+        self.set_last_round(max(max_round, min_round - 1))
+
+    def apply(self, txn: dict, latest_timestamp: int) -> int:
+        """Replay one app call made at latest_timestamp, returning 1 if it changed employees"""
+        app_call = txn["application-transaction"]
+        args = [base64.b64decode(arg) for arg in app_call.get("application-args", [])]
+        if app_call["application-id"] != self.app_id or not args or args[0] not in METHODS:
+            return 0
+
+        method = METHODS[args[0]]
+        values = [arg.type.decode(value) for arg, value in zip(method.args, args[1:])]
+
+        if method.name == "add_employee":
+            self.put_employee(values[0], values[1], False, 0, None)
+        elif method.name == "add_employee_with_asset":
+            self.put_employee(values[0], values[1], False, 0, values[2])
+        elif method.name == "add_employees":
+            for address, amount in values[0]:
+                self.put_employee(address, amount, False, 0, None)
+        elif method.name == "add_streaming_employee":
+            self.put_employee(values[0], values[1], False, 0, None, stream_state=latest_timestamp)
+        elif method.name == "remove_employee":
+            self.delete_employees([values[0]])
+        elif method.name == "remove_employees":
+            self.delete_employees(values[0])
+        elif method.name == "pause_employee":
+            # Streaming employees are paid up to a pause, keep the seconds
+            # still owed while paused and accrue again from an unpause
+            employee = self.get_employee(values[0])
+            if employee and employee["streaming"] and employee["paused"] != values[1]:
+                last_paid = self.settle_stream(txn, employee) if values[1] else employee["stream_state"]
+                self.db.execute(
+                    "UPDATE employees SET stream_state = ? WHERE app_id = ? AND address = ?",
+                    (latest_timestamp - last_paid, self.app_id, values[0]),
+                )
+            self.db.execute(
+                "UPDATE employees SET paused = ? WHERE app_id = ? AND address = ?",
+                (int(values[1]), self.app_id, values[0]),
+            )
+        elif method.name == "claim":
+            employee = self.get_employee(values[0])
+            if employee and employee["streaming"]:
+                self.db.execute(
+                    "UPDATE employees SET stream_state = ? WHERE app_id = ? AND address = ?",
+                    (self.settle_stream(txn, employee), self.app_id, values[0]),
+                )
+        elif method.name in ("disburse", "disburse_slots"):
+            # The inner payments are the employees actually paid, whether the
+            # page was given by address or by slot range
+            cycle = latest_timestamp // self.get_payroll()["cycle_secs"]
+            receivers = [
+                (inner.get("payment-transaction") or inner.get("asset-transfer-transaction"))["receiver"]
+                for inner in txn.get("inner-txns", [])
+            ]
+            self.db.executemany(
+                "UPDATE employees SET last_paid_cycle = ? WHERE app_id = ? AND address = ?",
+                [(cycle, self.app_id, receiver) for receiver in receivers],
+            )
+        return 1
+
+    def settle_stream(self, txn: dict, employee: dict) -> int:
+        """Last paid time of a streaming employee after the settlement of a call"""
+        # The contract moves it forward only by the time the inner payment
+        # covers, and not at all when the payment was deferred
+        paid = sum(
+            (inner.get("payment-transaction") or inner.get("asset-transfer-transaction"))["amount"]
+            for inner in txn.get("inner-txns", [])
+        )
+        return employee["stream_state"] + paid * self.get_payroll()["cycle_secs"] // employee["amount"]
+
+    def put_employee(self, address: str, amount: int, paused: bool, last_paid_cycle: int, asa_id: int | None,
+                     stream_state: int | None = None):
+        """Upsert an employee, streaming when they have a stream state"""
+        self.db.execute(
+            "INSERT OR REPLACE INTO employees VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (self.app_id, address, amount, int(paused), int(stream_state is not None), last_paid_cycle,
+             stream_state, asa_id),
+        )
+
+    def delete_employees(self, addresses: list[str]):
+        self.db.executemany(
+            "DELETE FROM employees WHERE app_id = ? AND address = ?",
+            [(self.app_id, address) for address in addresses],
+        )
+
+    def save_payroll(self, state: dict):
+        self.db.execute(
+            "INSERT OR REPLACE INTO payroll VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (self.app_id, *(
+                encoding.encode_address(state["admin"]) if column == "admin" else state.get(column, 0)
+                for column in PAYROLL_COLUMNS
+            )),
+        )
+
+    def set_last_round(self, last_round: int):
+        self.db.execute("INSERT OR REPLACE INTO sync VALUES (?, ?)", (self.app_id, last_round))
+
+def main():
+    """Sync or query the payroll ledger cache"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--app-id", type=int, help=f"payroll application ID (default: {APP_ID_PATH})")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="SQLite database (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("sync", help="sync the cache from the network")
+    get_parser = commands.add_parser("get", help="show one employee")
+    get_parser.add_argument("address")
+    list_parser = commands.add_parser("list", help="list employees by address")
+    list_parser.add_argument("--after", default="", help="list employees after this address")
+    list_parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+
+    cache = LedgerCache(args.app_id or int(APP_ID_PATH.read_text().strip()), args.db)
+    try:
+        if args.command == "sync":
+            previous_round = cache.last_round
+            replayed = cache.sync(get_algod_client(), get_indexer_client())
+            if previous_round is None:
+                print(f"📸 Snapshot of App ID {cache.app_id} at round {cache.last_round}")
+            else:
+                print(f"🔄 Replayed {replayed} app calls, rounds {previous_round + 1}-{cache.last_round}")
+        elif args.command == "get":
+            employee = cache.get_employee(args.address)
+            if employee is None:
+                print(f"❌ {args.address} is not an employee")
+                return 1
+            print(json.dumps(employee, indent=2))
+        else:
+            for employee in cache.list_employees(args.after, args.limit):
+                print(json.dumps(employee))
+    finally:
+        cache.close()
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
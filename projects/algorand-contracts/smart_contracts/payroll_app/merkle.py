@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Merkle payroll trees: build them offline, commit their root and claim
+
+A Merkle payroll keeps no per-employee state on chain. Once per cycle the
+admin commits the root of a tree of (address, amount, asset) leaves, and
+each employee (or a keeper bot) claims their leaf with a proof through
+`claim_merkle`. The contract marks claimed leaves in a bitmap.
+
+Employees are read from a CSV with address, amount and optional asa_id
+columns and hashed as they are read, so only the 32-byte leaf hashes are
+held in memory. Proofs are written as one JSON line per employee.
+
+    python -m smart_contracts.payroll_app.merkle build employees.csv --proofs proofs.jsonl
+    python -m smart_contracts.payroll_app.merkle commit --app-id 1234 --root <hex> --size 100000
+    python -m smart_contracts.payroll_app.merkle claim --app-id 1234 --proofs proofs.jsonl <address>
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from algosdk import encoding
+from algosdk.atomic_transaction_composer import AtomicTransactionComposer
+from algosdk.v2client import algod
+
+from smart_contracts.box_export import MERKLE_CLAIMED_PREFIX
+from smart_contracts.budget import BudgetPadder
+from smart_contracts.network import get_account, get_algod_client
+from smart_contracts.payroll_app import contract
+from smart_contracts.payroll_app.deploy import APP_ID_PATH
+from smart_contracts.payroll_app.disburse import get_payroll_state
+
+HASH_LENGTH = contract.MERKLE_HASH_LENGTH.value
+MAX_DEPTH = contract.MAX_MERKLE_DEPTH.value
+LEAF_PREFIX = bytes.fromhex("00")
+NODE_PREFIX = bytes.fromhex("01")
+
+# Budget calls measured per proof length, so later claims skip the simulation
+BUDGET_CACHE_PATH = Path("budget_cache.json")
+
+def sha512_256(data: bytes) -> bytes:
+    """SHA-512/256, as the AVM's sha512_256 opcode"""
+    # OpenSSL's implementation is several times faster than algosdk's
+    if "sha512_256" in hashlib.algorithms_available:
+        return hashlib.new("sha512_256", data).digest()
+    return encoding.checksum(data)
+
+def leaf_hash(address: str, amount: int, asa_id: int) -> bytes:
+    """Hash of a leaf, as claim_merkle computes it"""
+    return sha512_256(
+        LEAF_PREFIX + encoding.decode_address(address) + amount.to_bytes(8, "big") + asa_id.to_bytes(8, "big")
+    )
+
+def node_hash(left: bytes, right: bytes) -> bytes:
+    """Hash of an inner node"""
+    return sha512_256(NODE_PREFIX + left + right)
+
+# Roots of the all-empty subtrees of each height, padding the tree to a
+# power of two without storing the padding
+EMPTY_HASHES = [bytes(HASH_LENGTH)]
+for _ in range(MAX_DEPTH):
+    EMPTY_HASHES.append(node_hash(EMPTY_HASHES[-1], EMPTY_HASHES[-1]))
+
+class MerkleTree:
+    """Merkle tree of payroll leaves, stored as one packed bytearray per level"""
+
+    def __init__(self, leaves: Iterable[bytes] = ()):
+        self.levels = [bytearray()]
+        for leaf in leaves:
+            self.add(leaf)
+
+    def add(self, leaf: bytes) -> int:
+        """Append a leaf hash, returning its index"""
+        if len(self.levels) > 1:
+            raise ValueError("Tree is already built")
+        self.levels[0] += leaf
+        return self.size - 1
+
+    @property
+    def size(self) -> int:
+        return len(self.levels[0]) // HASH_LENGTH
+
+    @property
+    def depth(self) -> int:
+        return max(0, self.size - 1).bit_length()
+
+    def node(self, level: int, index: int) -> bytes:
+        """Node of a level, or the empty subtree root past its end"""
+        nodes = self.levels[level]
+        start = index * HASH_LENGTH
+        return bytes(nodes[start:start + HASH_LENGTH]) if start < len(nodes) else EMPTY_HASHES[level]
+
+    def build(self):
+        """Hash the levels above the leaves"""
+        if not self.size:
+            raise ValueError("Tree has no leaves")
+        if self.depth > MAX_DEPTH:
+            raise ValueError(f"Tree of {self.size} leaves is deeper than {MAX_DEPTH}")
+
+        while len(self.levels) <= self.depth:
+            level = len(self.levels) - 1
+            parents = bytearray()
+            for index in range(0, (len(self.levels[level]) // HASH_LENGTH + 1) // 2):
+                parents += node_hash(self.node(level, 2 * index), self.node(level, 2 * index + 1))
+            self.levels.append(parents)
+
+    @property
+    def root(self) -> bytes:
+        return self.node(self.depth, 0)
+
+    def proof(self, index: int) -> list[bytes]:
+        """Sibling hashes from a leaf up to the root"""
+        return [self.node(level, (index >> level) ^ 1) for level in range(self.depth)]
+
+def verify(root: bytes, leaf: bytes, index: int, proof: list[bytes]) -> bool:
+    """Check a proof the way claim_merkle does"""
+    node = leaf
+    for level, sibling in enumerate(proof):
+        node = node_hash(sibling, node) if index >> level & 1 else node_hash(node, sibling)
+    return node == root
+
+def read_employees(path: str, default_asa_id: int = 0) -> Iterator[tuple[str, int, int]]:
+    """(address, amount, asa_id) rows of an employee CSV"""
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            asa_id = row.get("asa_id") or default_asa_id
+            yield row["address"], int(row["amount"]), int(asa_id)
+
+def build_tree(employees: Iterable[tuple[str, int, int]]) -> MerkleTree:
+    """Hash employees into a built tree"""
+    tree = MerkleTree(leaf_hash(*employee) for employee in employees)
+    tree.build()
+    return tree
+
+def write_proofs(tree: MerkleTree, employees: Iterable[tuple[str, int, int]], output) -> int:
+    """Write one JSON line per employee, in leaf order"""
+    count = 0
+    for index, (address, amount, asa_id) in enumerate(employees):
+        output.write(json.dumps({
+            "index": index,
+            "address": address,
+            "amount": amount,
+            "asa_id": asa_id,
+            "proof": [sibling.hex() for sibling in tree.proof(index)],
+        }) + "\n")
+        count += 1
+    return count
+
+def find_proof(path: str, address: str) -> dict | None:
+    """Proof line of an employee"""
+    with open(path) as f:
+        for line in f:
+            entry = json.loads(line)
+            if entry["address"] == address:
+                return entry
+    return None
+
+def get_claimed_shard_key(cycle: int, index: int) -> bytes:
+    """Box name of the claimed bitmap shard of a leaf"""
+    shard = index // contract.BITMAP_SHARD_BITS.value
+    return MERKLE_CLAIMED_PREFIX + cycle.to_bytes(8, "big") + shard.to_bytes(8, "big")
+
+def commit_root(algod_client: algod.AlgodClient, app_id: int, root: bytes, size: int) -> int:
+    """Commit the Merkle payroll of the current cycle as its admin, returning the round"""
+    admin, signer = get_account(algod_client, "DEPLOYER_MNEMONIC")
+    abi_contract = contract.router.contract_construct()
+
+    atc = AtomicTransactionComposer()
+    atc.add_method_call(
+        app_id=app_id,
+        method=abi_contract.get_method_by_name("commit_merkle_root"),
+        sender=admin,
+        sp=algod_client.suggested_params(),
+        signer=signer,
+        method_args=[root, size],
+    )
+    return atc.execute(algod_client, 4).confirmed_round
+
+def claim(algod_client: algod.AlgodClient, app_id: int, entry: dict, padder: BudgetPadder | None = None) -> int:
+    """Claim an employee's leaf, returning the amount paid"""
+    claimer, signer = get_account(algod_client, "CLAIMER_MNEMONIC")
+    abi_contract = contract.router.contract_construct()
+    state = get_payroll_state(algod_client, app_id)
+    padder = padder or BudgetPadder(algod_client, app_id, claimer, signer, cache_path=BUDGET_CACHE_PATH)
+
+    # The claim pools the inner payment fee; budget calls pay their own
+    sp = algod_client.suggested_params()
+    sp.flat_fee = True
+    sp.fee = 2 * max(sp.min_fee, 1000)
+
+    def build(atc: AtomicTransactionComposer):
+        atc.add_method_call(
+            app_id=app_id,
+            method=abi_contract.get_method_by_name("claim_merkle"),
+            sender=claimer,
+            sp=sp,
+            signer=signer,
+            method_args=[
+                entry["address"], entry["amount"], entry["asa_id"], entry["index"],
+                [bytes.fromhex(sibling) for sibling in entry["proof"]],
+            ],
+            accounts=[entry["address"]],
+            foreign_assets=[entry["asa_id"]] if entry["asa_id"] else [],
+            boxes=[(0, get_claimed_shard_key(state["merkle_cycle"], entry["index"]))],
+        )
+
+    # The proof length drives the cost: one hash per level
+    return padder.execute("claim_merkle", len(entry["proof"]), build).abi_results[0].return_value
+
+def main():
+    """Build, commit or claim a Merkle payroll"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--app-id", type=int, help=f"payroll application ID (default: {APP_ID_PATH})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="build the tree and proofs of an employee CSV")
+    build_parser.add_argument("employees", help="CSV with address, amount and optional asa_id columns")
+    build_parser.add_argument("--proofs", required=True, help="JSON lines output, one proof per employee")
+    build_parser.add_argument("--asa-id", type=int, default=0, help="asset of rows without asa_id (default: ALGO)")
+    commit_parser = commands.add_parser("commit", help="commit a root for the current cycle")
+    commit_parser.add_argument("--root", required=True, help="root as printed by build")
+    commit_parser.add_argument("--size", type=int, required=True, help="number of leaves")
+    claim_parser = commands.add_parser("claim", help="claim an employee's leaf")
+    claim_parser.add_argument("address")
+    claim_parser.add_argument("--proofs", required=True, help="JSON lines written by build")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        tree = build_tree(read_employees(args.employees, args.asa_id))
+        with open(args.proofs, "w") as output:
+            count = write_proofs(tree, read_employees(args.employees, args.asa_id), output)
+        print(f"🌳 {count} leaves, depth {tree.depth}, root {tree.root.hex()}")
+        print(f"💾 Proofs saved to {args.proofs}")
+        return 0
+
+    algod_client = get_algod_client()
+    app_id = args.app_id or int(APP_ID_PATH.read_text().strip())
+
+    if args.command == "commit":
+        confirmed_round = commit_root(algod_client, app_id, bytes.fromhex(args.root), args.size)
+        print(f"✅ Root committed to App ID {app_id} in round {confirmed_round}")
+        return 0
+
+    entry = find_proof(args.proofs, args.address)
+    if entry is None:
+        print(f"❌ {args.address} has no leaf in {args.proofs}")
+        return 1
+    paid = claim(algod_client, app_id, entry)
+    print(f"✅ Paid {paid} to {args.address}")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
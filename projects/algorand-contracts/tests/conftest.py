@@ -0,0 +1,18 @@
+"""Shared fixtures"""
+
+import pytest
+from algosdk import account
+
+from helpers import FakeAlgod, FakeIndexer
+
+@pytest.fixture
+def algod_client() -> FakeAlgod:
+    return FakeAlgod()
+
+@pytest.fixture
+def addresses() -> list[str]:
+    return sorted(account.generate_account()[1] for _ in range(20))
+
+@pytest.fixture
+def indexer_client() -> FakeIndexer:
+    return FakeIndexer()
@@ -0,0 +1,162 @@
+"""Test helpers: an in-memory algod and indexer serving one application, and box builders"""
+
+import base64
+
+from algosdk import encoding
+from algosdk.error import AlgodHTTPError
+from algosdk.transaction import ApplicationCallTxn, SuggestedParams
+
+from smart_contracts.box_export import DIRECTORY_PREFIX, EMPLOYEE_PREFIX, PAID_PREFIX
+from smart_contracts.payroll_app import contract
+
+APP_ID = 1234
+
+# Opcodes a bare budget call costs the group
+BUDGET_CALL_COST = 2
+
+class FakeAlgod:
+    """The algod endpoints the scripts read, backed by dicts"""
+
+    def __init__(self, page_size: int = 2):
+        self.boxes = {}
+        self.global_state = {}
+        self.page_size = page_size
+        self.last_round = 100
+        self.timestamps = {}
+        self.groups = []
+        self.pending = {}
+        self.next_app_id = APP_ID + 1
+        # Opcodes of the app call a group carries, besides its budget calls
+        self.app_cost = 0
+        self.simulations = 0
+
+    def algod_request(self, method: str, path: str, params: dict | None = None) -> dict:
+        assert (method, path) == ("GET", f"/applications/{APP_ID}/boxes")
+        # Pages of page_size names, with the next name as the token
+        names = sorted(self.boxes)
+        start = names.index(base64.b64decode(params["next"])) if "next" in (params or {}) else 0
+        page = names[start:start + self.page_size]
+        response = {"boxes": [{"name": base64.b64encode(name).decode()} for name in page]}
+        if start + self.page_size < len(names):
+            response["next-token"] = base64.b64encode(names[start + self.page_size]).decode()
+        return response
+
+    def application_box_by_name(self, app_id: int, name: bytes) -> dict:
+        if app_id != APP_ID or name not in self.boxes:
+            raise AlgodHTTPError("box not found", code=404)
+        return {"name": base64.b64encode(name).decode(), "value": base64.b64encode(self.boxes[name]).decode()}
+
+    def application_info(self, app_id: int) -> dict:
+        global_state = []
+        for key, value in self.global_state.items():
+            if isinstance(value, bytes):
+                state_value = {"type": 1, "bytes": base64.b64encode(value).decode(), "uint": 0}
+            else:
+                state_value = {"type": 2, "bytes": "", "uint": value}
+            global_state.append({"key": base64.b64encode(key.encode()).decode(), "value": state_value})
+        return {"id": app_id, "params": {"global-state": global_state}}
+
+    def status(self) -> dict:
+        return {"last-round": self.last_round}
+
+    def block_info(self, block: int) -> dict:
+        return {"block": {"rnd": block, "ts": self.timestamps[block]}}
+
+    def is_over_budget(self, signed_txns: list, extra_opcode_budget: int = 0) -> bool:
+        """Check a group's app calls cost more than its pooled opcode budget"""
+        app_calls = [stxn.transaction for stxn in signed_txns if isinstance(stxn.transaction, ApplicationCallTxn)]
+        budget_calls = sum(1 for txn in app_calls if (txn.note or b"").startswith(b"budget:"))
+        return self.app_cost + BUDGET_CALL_COST * budget_calls > 700 * len(app_calls) + extra_opcode_budget
+
+    def simulate_transactions(self, request) -> dict:
+        self.simulations += 1
+        signed_txns = request.txn_groups[0].txns
+        group = {
+            "txn-results": [{"txn-result": {}} for _ in signed_txns],
+            "app-budget-consumed": self.app_cost,
+        }
+        if self.is_over_budget(signed_txns, request.extra_opcode_budget or 0):
+            group["failure-message"] = "logic eval error: dynamic cost budget exceeded"
+        return {"version": 2, "txn-groups": [group]}
+
+    def send_transactions(self, signed_txns: list) -> str:
+        """Accept a group, confirming it in the next round and numbering its app creates"""
+        if self.is_over_budget(signed_txns):
+            raise AlgodHTTPError("TransactionPool.Remember: logic eval error: dynamic cost budget exceeded", code=400)
+        self.groups.append(signed_txns)
+        for signed_txn in signed_txns:
+            info = {"confirmed-round": self.last_round + 1}
+            if isinstance(signed_txn.transaction, ApplicationCallTxn) and signed_txn.transaction.index == 0:
+                info["application-index"] = self.next_app_id
+                self.next_app_id += 1
+            self.pending[signed_txn.get_txid()] = info
+        return signed_txns[0].get_txid()
+
+    def pending_transaction_info(self, tx_id: str) -> dict:
+        return self.pending[tx_id]
+
+    def suggested_params(self) -> SuggestedParams:
+        return SuggestedParams(
+            1000, self.last_round, self.last_round + 1000, base64.b64encode(bytes(32)).decode(),
+            gen="fakenet-v1", min_fee=1000,
+        )
+
+def employee_value(amount: int, slot: int, paused: bool = False, stream_state: int | None = None,
+                   asa_id: int | None = None) -> bytes:
+    """Employee box value in the contract's layout, streaming when it has a stream state"""
+    streaming = stream_state is not None
+    flags = (paused << (7 - contract.EMPLOYEE_PAUSED_BIT.value)) | (streaming << (7 - contract.EMPLOYEE_STREAMING_BIT.value))
+    value = amount.to_bytes(8, "big") + bytes([flags]) + slot.to_bytes(8, "big")
+    if streaming:
+        value += stream_state.to_bytes(8, "big")
+    return value + asa_id.to_bytes(8, "big") if asa_id is not None else value
+
+def employee_key(address: str) -> bytes:
+    return EMPLOYEE_PREFIX + encoding.decode_address(address)
+
+def paid_key(cycle: int, shard: int) -> bytes:
+    return PAID_PREFIX + cycle.to_bytes(8, "big") + shard.to_bytes(8, "big")
+
+def directory_key(shard: int) -> bytes:
+    return DIRECTORY_PREFIX + shard.to_bytes(8, "big")
+
+def bitmap(*slots: int) -> bytes:
+    """Paid bitmap shard with the given slots set"""
+    value = bytearray(contract.BITMAP_SHARD_SIZE.value)
+    for slot in slots:
+        value[slot // 8] |= 0x80 >> (slot % 8)
+    return bytes(value)
+
+class FakeIndexer:
+    """The indexer endpoints the scripts read: app calls, block timestamps and asset holders"""
+
+    def __init__(self, page_size: int = 2):
+        self.transactions = []
+        self.timestamps = {}
+        self.holdings = set()
+        self.page_size = page_size
+        self.asset_requests = []
+        self.current_round = 100
+
+    def search_transactions(self, application_id: int, txn_type: str, min_round: int, max_round: int | None,
+                            limit: int, next_page: str | None) -> dict:
+        assert (application_id, txn_type) == (APP_ID, "appl")
+        transactions = [
+            txn for txn in self.transactions
+            if min_round <= txn["confirmed-round"] <= (max_round or self.current_round)
+        ]
+        return {"current-round": self.current_round, "transactions": transactions}
+
+    def block_info(self, round_num: int, header_only: bool | None = None) -> dict:
+        return {"round": round_num, "timestamp": self.timestamps[round_num]}
+
+    def asset_balances(self, asset_id: int, limit: int, next_page: str | None = None) -> dict:
+        self.asset_requests.append(asset_id)
+        # Pages of page_size holders, with the offset of the next one as the token
+        holders = sorted(address for address, holding in self.holdings if holding == asset_id)
+        start = int(next_page or 0)
+        page = holders[start:start + self.page_size]
+        response = {"balances": [{"address": address, "amount": 0} for address in page]}
+        if start + self.page_size < len(holders):
+            response["next-token"] = str(start + self.page_size)
+        return response
@@ -0,0 +1,87 @@
+from algosdk import encoding
+
+from smart_contracts import box_export
+from smart_contracts.box_export import decode_file_sharing_box, decode_payroll_box, export_records
+from smart_contracts.file_sharing_app import contract as file_sharing_contract
+
+from helpers import APP_ID, bitmap, directory_key, employee_key, employee_value, paid_key
+
+def test_prefixes_match_contracts():
+    assert box_export.EMPLOYEE_PREFIX == b"emp_"
+    assert box_export.PAID_PREFIX == b"paid_"
+    assert box_export.FILE_REQUEST_PREFIX == b"file_req_"
+
+def test_decode_employee(addresses):
+    record = decode_payroll_box(employee_key(addresses[0]), employee_value(500, 3, paused=True))
+    assert record == {
+        "type": "employee",
+        "address": addresses[0],
+        "amount": 500,
+        "paused": True,
+        "streaming": False,
+        "slot": 3,
+    }
+
+def test_decode_employee_with_asset(addresses):
+    record = decode_payroll_box(employee_key(addresses[0]), employee_value(500, 0, asa_id=42))
+    assert record["asa_id"] == 42 and "stream_state" not in record
+
+def test_decode_streaming_employee(addresses):
+    record = decode_payroll_box(employee_key(addresses[0]), employee_value(500, 0, stream_state=1000))
+    assert record["streaming"] and not record["paused"]
+    assert record["stream_state"] == 1000 and "asa_id" not in record
+
+    record = decode_payroll_box(employee_key(addresses[0]), employee_value(500, 0, stream_state=1000, asa_id=42))
+    assert (record["stream_state"], record["asa_id"]) == (1000, 42)
+
+def test_decode_slot_directory(addresses):
+    # Slot 1 is free and links to slot 4 (stored as 4 + 1)
+    free_entry = bytes(24) + (5).to_bytes(8, "big")
+    value = encoding.decode_address(addresses[0]) + free_entry + encoding.decode_address(addresses[1])
+    record = decode_payroll_box(directory_key(2), value)
+    assert record == {"type": "slot_directory", "shard": 2, "addresses": [addresses[0], "", addresses[1]]}
+
+def test_decode_bitmaps():
+    record = decode_payroll_box(paid_key(9, 1), bitmap(0, 5, 8191))
+    assert (record["type"], record["cycle"], record["shard"], record["claimed"]) == ("paid_bitmap", 9, 1, 3)
+
+    name = box_export.MERKLE_CLAIMED_PREFIX + (4).to_bytes(8, "big") + (0).to_bytes(8, "big")
+    record = decode_payroll_box(name, bitmap(2))
+    assert (record["type"], record["cycle"], record["claimed"]) == ("merkle_claims", 4, 1)
+
+def test_decode_unknown_box():
+    assert decode_payroll_box(b"other", b"\x01")["type"] == "unknown"
+
+def test_is_slot_set():
+    shard = bitmap(0, 9)
+    assert box_export.is_slot_set(shard, 0)
+    assert box_export.is_slot_set(shard, 9)
+    assert not box_export.is_slot_set(shard, 1)
+    # Slots of later shards wrap around to their offset in the shard
+    assert box_export.is_slot_set(shard, 8192 + 9)
+
+def test_decode_user_files_page(addresses):
+    slot_length = file_sharing_contract.FILE_ID_SLOT_LENGTH.value
+    value = (bytes([3]) + b"abc").ljust(slot_length, b"\0") + bytes(slot_length)
+    name = box_export.USER_FILES_PAGE_PREFIX + encoding.decode_address(addresses[0]) + (2).to_bytes(8, "big")
+    record = decode_file_sharing_box(name, value)
+    assert record == {"type": "user_files_page", "address": addresses[0], "page": 2, "file_ids": ["abc"]}
+
+def test_export_records_pages_through_boxes(algod_client, addresses):
+    for slot, address in enumerate(addresses[:5]):
+        algod_client.boxes[employee_key(address)] = employee_value(100, slot)
+    algod_client.boxes[paid_key(0, 0)] = bitmap(1)
+
+    records = list(export_records(algod_client, "payroll_app", APP_ID, page_size=2, concurrency=2))
+    assert sorted(r["address"] for r in records if r["type"] == "employee") == addresses[:5]
+    assert [r["type"] for r in records].count("paid_bitmap") == 1
+
+def test_export_records_skips_deleted_boxes(algod_client, addresses):
+    algod_client.boxes[employee_key(addresses[0])] = employee_value(100, 0)
+    algod_client.boxes[employee_key(addresses[1])] = employee_value(100, 1)
+
+    # Deleted between the listing and the fetch
+    names = list(box_export.list_box_names(algod_client, APP_ID))
+    del algod_client.boxes[names[1]]
+    values = list(box_export.fetch_boxes(algod_client, APP_ID, names))
+    assert [name for name, _ in values] == [names[0]]
@@ -0,0 +1,95 @@
+import pytest
+from algosdk import account
+from algosdk.atomic_transaction_composer import AccountTransactionSigner, TransactionWithSigner
+from algosdk.transaction import ApplicationNoOpTxn
+
+from smart_contracts.budget import BudgetError, BudgetPadder, get_bucket
+
+from helpers import APP_ID
+
+@pytest.fixture
+def padder(algod_client, tmp_path) -> BudgetPadder:
+    private_key, sender = account.generate_account()
+    return BudgetPadder(algod_client, APP_ID, sender, AccountTransactionSigner(private_key),
+                        cache_path=tmp_path / "budget_cache.json")
+
+def make_build(padder: BudgetPadder):
+    """build() adding a single app call"""
+    def build(atc):
+        atc.add_transaction(TransactionWithSigner(
+            ApplicationNoOpTxn(padder.sender, padder.algod_client.suggested_params(), APP_ID, app_args=[b"call"]),
+            padder.signer,
+        ))
+    return build
+
+def test_get_bucket():
+    assert [get_bucket(size) for size in (0, 1, 2, 3, 4, 5, 8, 9, 1000)] == [1, 1, 2, 4, 4, 8, 8, 16, 1024]
+
+@pytest.mark.parametrize("app_cost, padding", [
+    (0, 0),
+    (700, 0),
+    (701, 1),
+    # ceil(2000 / 700) - 1, with room left for the budget calls' own cost
+    (2000, 2),
+    # The estimate of 1 falls 2 opcodes short once its budget call is counted
+    (1399, 2),
+])
+def test_measure(algod_client, padder, app_cost, padding):
+    algod_client.app_cost = app_cost
+    assert padder.measure(make_build(padder)) == padding
+
+def test_padding_must_fit_in_a_group(algod_client, padder):
+    algod_client.app_cost = 16 * 700
+    with pytest.raises(BudgetError):
+        padder.measure(make_build(padder))
+
+def test_execute_pads_the_group(algod_client, padder):
+    algod_client.app_cost = 2000
+    padder.execute("update_file_metadata", 5, make_build(padder))
+
+    group = algod_client.groups[-1]
+    assert len(group) == 3
+    assert all(stxn.transaction.note.startswith(b"budget:") for stxn in group[1:])
+    assert len({stxn.transaction.note for stxn in group[1:]}) == 2
+
+def test_padding_is_cached_per_method_and_bucket(algod_client, padder):
+    algod_client.app_cost = 2000
+    build = make_build(padder)
+    padder.execute("update_file_metadata", 5, build)
+    simulations = algod_client.simulations
+
+    # 7 shares the bucket of 5 (8): no new simulation, same padding
+    padder.execute("update_file_metadata", 7, build)
+    assert algod_client.simulations == simulations
+    assert len(algod_client.groups[-1]) == 3
+
+    # Another bucket and another method are measured again
+    padder.execute("update_file_metadata", 9, build)
+    assert algod_client.simulations > simulations
+    simulations = algod_client.simulations
+    padder.execute("confirm_receipts", 5, build)
+    assert algod_client.simulations > simulations
+
+    assert padder.cache == {"update_file_metadata": {"8": 2, "16": 2}, "confirm_receipts": {"8": 2}}
+
+def test_cache_is_shared_through_its_file(algod_client, padder):
+    algod_client.app_cost = 2000
+    padder.execute("update_file_metadata", 5, make_build(padder))
+
+    reloaded = BudgetPadder(algod_client, APP_ID, padder.sender, padder.signer, cache_path=padder.cache_path)
+    assert reloaded.get_padding("update_file_metadata", 6) == 2
+    assert reloaded.get_padding("update_file_metadata", 9) is None
+
+def test_remeasures_when_the_budget_is_exceeded(algod_client, padder):
+    build = make_build(padder)
+    algod_client.app_cost = 500
+    padder.execute("update_file_metadata", 5, build)
+    assert len(algod_client.groups[-1]) == 1
+
+    # A larger payload of the same bucket no longer fits the cached padding
+    algod_client.app_cost = 2000
+    simulations = algod_client.simulations
+    padder.execute("update_file_metadata", 8, build)
+    assert algod_client.simulations > simulations
+    assert len(algod_client.groups[-1]) == 3
+    assert padder.get_padding("update_file_metadata", 8) == 2
@@ -0,0 +1,155 @@
+import pytest
+from algosdk import account
+from algosdk.error import AlgodHTTPError
+from algosdk.logic import get_application_address
+from algosdk.transaction import StateSchema
+
+from smart_contracts.benchmark import Benchmark, directory_box, employee_box, file_request_boxes
+from smart_contracts.box_export import export_records
+from smart_contracts.budget import BudgetPadder
+from smart_contracts.file_sharing_app import contract as file_sharing_contract
+from smart_contracts.network import get_account, get_algod_client, get_indexer_client
+from smart_contracts.payroll_app import contract as payroll_contract
+from smart_contracts.payroll_app import merkle
+from smart_contracts.payroll_app.disburse import Disbursement, get_current_cycle, load_payable_employees
+
+# Contract behavior runs against LocalNet (algokit localnet start), and these
+# tests are skipped without it. Cycles are long enough that each test runs
+# within one.
+CYCLE_SECS = 10**9
+AMOUNT = 200_000
+
+@pytest.fixture(scope="module")
+def bench() -> Benchmark:
+    client = get_algod_client()
+    try:
+        client.status()
+        dispenser_address, dispenser = get_account(client, "DISPENSER_MNEMONIC")
+    except Exception:
+        pytest.skip("LocalNet is not running")
+    return Benchmark(client, dispenser, dispenser_address)
+
+@pytest.fixture
+def payroll(bench):
+    admin, admin_signer = bench.new_account(50_000_000)
+    app_id = bench.deploy(
+        "payroll_app", payroll_contract, admin, admin_signer,
+        StateSchema(payroll_contract.GLOBAL_NUM_UINTS, payroll_contract.GLOBAL_NUM_BYTE_SLICES),
+        create_method="create_payroll", create_args=[0, CYCLE_SECS, admin],
+    )
+    bench.pay(get_application_address(app_id), 10_000_000)
+    return admin, admin_signer
+
+@pytest.fixture
+def file_sharing(bench):
+    admin, admin_signer = bench.new_account(50_000_000)
+    app_id = bench.deploy(
+        "file_sharing_app", file_sharing_contract, admin, admin_signer,
+        StateSchema(file_sharing_contract.GLOBAL_NUM_UINTS, file_sharing_contract.GLOBAL_NUM_BYTE_SLICES),
+    )
+    bench.pay(get_application_address(app_id), 10_000_000)
+    return app_id
+
+def call(bench, payroll, method_name, args, boxes=()):
+    admin, admin_signer = payroll
+    return bench.run(None, bench.call(method_name, args, admin, admin_signer, boxes=boxes)).abi_results[0].return_value
+
+def add_employee(bench, payroll, address):
+    call(bench, payroll, "add_employee", [address, AMOUNT], boxes=[employee_box(address), directory_box(0)])
+
+def remove_employee(bench, payroll, address):
+    call(bench, payroll, "remove_employee", [address], boxes=[employee_box(address), directory_box(0)])
+
+def get_employee_slots(bench) -> dict[str, int]:
+    return {
+        record["address"]: record["slot"]
+        for record in export_records(bench.client, "payroll_app", bench.app_id) if record["type"] == "employee"
+    }
+
+def disburse(bench, payroll, addresses) -> int:
+    admin, admin_signer = payroll
+    cycle = get_current_cycle(bench.client, CYCLE_SECS)
+    disbursement = Disbursement(bench.client, get_indexer_client(), bench.app_id, admin, admin_signer, cycle)
+    disbursement.sp = bench.client.suggested_params()
+    slots = get_employee_slots(bench)
+    atc = disbursement.build_group([{"address": address, "slot": slots[address]} for address in addresses])
+    return atc.execute(bench.client, 4).abi_results[0].return_value
+
+def test_removed_employee_added_back_is_not_paid_twice(bench, payroll):
+    employee = account.generate_account()[1]
+    add_employee(bench, payroll, employee)
+    assert disburse(bench, payroll, [employee]) == 1
+
+    remove_employee(bench, payroll, employee)
+    add_employee(bench, payroll, employee)
+    assert disburse(bench, payroll, [employee]) == 0
+    assert bench.client.account_info(employee)["amount"] == AMOUNT
+
+def test_disburse_pays_once_per_cycle(bench, payroll):
+    employees = [account.generate_account()[1] for _ in range(3)]
+    for employee in employees:
+        add_employee(bench, payroll, employee)
+
+    assert disburse(bench, payroll, employees[:2]) == 2
+    # A retried or overlapping page only pays the employees it missed
+    assert disburse(bench, payroll, employees) == 1
+    assert disburse(bench, payroll, employees) == 0
+
+    cycle = get_current_cycle(bench.client, CYCLE_SECS)
+    assert load_payable_employees(bench.client, bench.app_id, cycle) == []
+    assert all(bench.client.account_info(employee)["amount"] == AMOUNT for employee in employees)
+
+def test_removed_slots_are_reused_last_freed_first(bench, payroll):
+    employees = [account.generate_account()[1] for _ in range(6)]
+    for employee in employees[:3]:
+        add_employee(bench, payroll, employee)
+    remove_employee(bench, payroll, employees[0])
+    remove_employee(bench, payroll, employees[2])
+
+    # Freed slots 0 then 2 are taken back before a new slot is allocated
+    for employee in employees[3:]:
+        add_employee(bench, payroll, employee)
+    slots = get_employee_slots(bench)
+    assert [slots[employee] for employee in employees[3:]] == [2, 0, 3]
+    assert slots[employees[1]] == 1
+
+def test_claim_merkle_pays_a_leaf_once(bench, payroll, tmp_path):
+    employees = [(account.generate_account()[1], AMOUNT, 0) for _ in range(5)]
+    tree = merkle.build_tree(employees)
+    call(bench, payroll, "commit_merkle_root", [tree.root, tree.size])
+
+    entry = {"address": employees[3][0], "amount": AMOUNT, "asa_id": 0, "index": 3,
+             "proof": [sibling.hex() for sibling in tree.proof(3)]}
+    padder = BudgetPadder(bench.client, bench.app_id, bench.dispenser_address, bench.dispenser,
+                          cache_path=tmp_path / "budget_cache.json")
+    assert merkle.claim(bench.client, bench.app_id, entry, padder) == AMOUNT
+    with pytest.raises(AlgodHTTPError):
+        merkle.claim(bench.client, bench.app_id, entry, padder)
+    assert bench.client.account_info(entry["address"])["amount"] == AMOUNT
+
+def test_file_request_is_paid_out_once(bench, file_sharing):
+    sender, sender_signer = bench.new_account()
+    recipient, recipient_signer = bench.new_account()
+    fee = 100_000
+
+    bench.run(None, bench.call(
+        "create_file_request", ["file-a", recipient, bytes(32), 1024, fee, "pdf", False, ""],
+        sender, sender_signer, boxes=file_request_boxes("file-a", sender, recipient),
+    ))
+    bench.run(None, bench.call(
+        "approve_and_pay",
+        ["file-a", bench.payment(recipient, recipient_signer, get_application_address(file_sharing), fee)],
+        recipient, recipient_signer, boxes=[b"file_req_file-a"],
+    ))
+
+    # The sender's own call makes their account available to the payout
+    def confirm():
+        atc = bench.call("confirm_receipt", ["file-a", bytes(32)], recipient, recipient_signer,
+                         boxes=[b"file_req_file-a"])
+        return bench.run(None, bench.call("get_stats", [], sender, sender_signer, atc=atc))
+
+    balance = bench.client.account_info(sender)["amount"]
+    confirm()
+    assert bench.client.account_info(sender)["amount"] - balance == fee - 1000
+    with pytest.raises(AlgodHTTPError):
+        confirm()
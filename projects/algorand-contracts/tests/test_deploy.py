@@ -0,0 +1,36 @@
+from algosdk import account
+from algosdk.atomic_transaction_composer import AccountTransactionSigner
+
+from smart_contracts.file_sharing_app import deploy as file_sharing_deploy
+from smart_contracts.payroll_app import contract
+from smart_contracts.payroll_app.deploy import deploy_tenants
+
+def test_deploy_tenants_batches_creates(algod_client, addresses):
+    private_key, deployer = account.generate_account()
+    tenants = [
+        {"tenant": f"tenant-{i}", "asa_id": 0, "cycle_secs": 60, "admin": addresses[i % len(addresses)]}
+        for i in range(18)
+    ]
+    _, _, abi_contract = contract.compile_contract()
+
+    deployed = deploy_tenants(
+        algod_client, algod_client.suggested_params(), deployer, AccountTransactionSigner(private_key),
+        tenants, b"\x09\x81\x01", b"\x09\x81\x01", abi_contract,
+    )
+
+    # Up to 16 creates per atomic group, one app per tenant
+    assert [len(group) for group in algod_client.groups] == [16, 2]
+    assert all(len({stxn.transaction.group for stxn in group}) == 1 for group in algod_client.groups)
+    assert list(deployed) == [tenant["tenant"] for tenant in tenants]
+    assert len({info["app_id"] for info in deployed.values()}) == len(tenants)
+    assert deployed["tenant-3"]["admin_address"] == addresses[3]
+
+def test_file_sharing_deployment_info_falls_back_to_app_id(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_sharing_deploy, "DEPLOYMENT_INFO_PATH", tmp_path / "deployment_info.json")
+    monkeypatch.setattr(file_sharing_deploy, "APP_ID_PATH", tmp_path / "app_id.txt")
+    assert file_sharing_deploy.load_deployment_info() == {}
+
+    # A deployment_info.json from the mock deployment records no app
+    (tmp_path / "deployment_info.json").write_text('{"app_id": 0, "status": "demo_mode"}')
+    (tmp_path / "app_id.txt").write_text("1234\n")
+    assert file_sharing_deploy.load_deployment_info() == {"app_id": 1234}
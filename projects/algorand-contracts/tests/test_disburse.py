@@ -0,0 +1,77 @@
+import asyncio
+
+from algosdk import account
+from algosdk.atomic_transaction_composer import AccountTransactionSigner
+
+from smart_contracts.payroll_app.disburse import (
+    Disbursement,
+    get_current_cycle,
+    get_pages,
+    get_payroll_state,
+    load_payable_employees,
+)
+
+from helpers import APP_ID, bitmap, employee_key, employee_value, paid_key
+
+def test_get_payroll_state(algod_client):
+    algod_client.global_state = {"cycle_secs": 60, "admin": bytes(32)}
+    assert get_payroll_state(algod_client, APP_ID) == {"cycle_secs": 60, "admin": bytes(32)}
+
+def test_get_current_cycle(algod_client):
+    # The last block is in the cycle starting at 600
+    algod_client.timestamps[algod_client.last_round] = 659
+    assert get_current_cycle(algod_client, 60) == 10
+
+def test_load_payable_employees(algod_client, addresses):
+    algod_client.boxes[employee_key(addresses[0])] = employee_value(100, 0)
+    algod_client.boxes[employee_key(addresses[1])] = employee_value(100, 1, paused=True)
+    algod_client.boxes[employee_key(addresses[2])] = employee_value(100, 2, stream_state=0)
+    algod_client.boxes[employee_key(addresses[3])] = employee_value(100, 3)
+    algod_client.boxes[employee_key(addresses[4])] = employee_value(100, 8192 + 3)
+
+    # Slot 3 was paid this cycle, and slot 8195 in the previous one
+    algod_client.boxes[paid_key(5, 0)] = bitmap(3)
+    algod_client.boxes[paid_key(4, 1)] = bitmap(3)
+
+    payable = load_payable_employees(algod_client, APP_ID, 5)
+    assert sorted(e["address"] for e in payable) == sorted([addresses[0], addresses[4]])
+
+def make_disbursement(algod_client, indexer_client) -> Disbursement:
+    private_key, admin = account.generate_account()
+    disbursement = Disbursement(algod_client, indexer_client, APP_ID, admin, AccountTransactionSigner(private_key),
+                                cycle=5)
+    asyncio.run(disbursement.refresh_params())
+    return disbursement
+
+def test_build_group_spreads_references(algod_client, indexer_client, addresses):
+    disbursement = make_disbursement(algod_client, indexer_client)
+    page = [{"address": address, "slot": slot} for slot, address in enumerate(addresses[:10])]
+    page.append({"address": addresses[10], "slot": 8192, "asa_id": 42})
+
+    txns = [t.txn for t in disbursement.build_group(page).txn_list]
+
+    # 4 employees per call, then the asset and the two paid shards
+    assert [len(t.boxes) for t in txns] == [4, 4, 3, 2]
+    assert [len(t.accounts or []) for t in txns] == [4, 4, 3, 0]
+    assert txns[-1].foreign_assets == [42]
+    assert {box.name for box in txns[-1].boxes} == {paid_key(5, 0), paid_key(5, 1)}
+
+    # The disburse call pools every fee: the group plus the inner payments
+    assert txns[0].fee == (len(txns) + len(page)) * 1000
+    assert all(t.fee == 0 for t in txns[1:])
+
+def test_filter_opted_in_lists_each_asset_once(algod_client, indexer_client, addresses):
+    disbursement = make_disbursement(algod_client, indexer_client)
+    indexer_client.holdings = {(address, 42) for address in addresses[:5]} | {(addresses[5], 43)}
+    employees = [{"address": address, "asa_id": 42} for address in addresses[:6]]
+    employees += [{"address": addresses[5], "asa_id": 43}, {"address": addresses[6]}]
+
+    payable = asyncio.run(disbursement.filter_opted_in(employees))
+
+    # Every holder of asset 42 across pages of 2, and ALGO needs no opt-in
+    assert payable == employees[:5] + employees[6:]
+    assert sorted(indexer_client.asset_requests) == [42, 42, 42, 43]
+
+def test_get_pages(addresses):
+    employees = [{"address": address} for address in addresses]
+    assert [len(page) for page in get_pages(employees, 8)] == [8, 8, 4]
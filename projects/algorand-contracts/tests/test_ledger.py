@@ -0,0 +1,120 @@
+import base64
+
+import pytest
+from algosdk import encoding
+
+from smart_contracts.payroll_app import contract
+from smart_contracts.payroll_app.ledger import LedgerCache
+
+from helpers import APP_ID, employee_key, employee_value
+
+CYCLE_SECS = 7
+
+def app_call(method_name: str, args: list, confirmed_round: int = 101, paid: dict | None = None) -> dict:
+    """Indexer record of a payroll call, with an inner payment per paid address"""
+    method = contract.router.contract_construct().get_method_by_name(method_name)
+    app_args = [method.get_selector()] + [arg.type.encode(value) for arg, value in zip(method.args, args)]
+    return {
+        "confirmed-round": confirmed_round,
+        "application-transaction": {
+            "application-id": APP_ID,
+            "application-args": [base64.b64encode(arg).decode() for arg in app_args],
+        },
+        "inner-txns": [
+            {"tx-type": "pay", "payment-transaction": {"receiver": receiver, "amount": amount}}
+            for receiver, amount in (paid or {}).items()
+        ],
+    }
+
+@pytest.fixture
+def ledger(addresses):
+    ledger = LedgerCache(APP_ID, ":memory:")
+    ledger.save_payroll({"cycle_secs": CYCLE_SECS, "admin": encoding.decode_address(addresses[-1])})
+    yield ledger
+    ledger.close()
+
+def test_add_and_remove(ledger, addresses):
+    assert ledger.apply(app_call("add_employees", [[(a, 100) for a in addresses[:3]]]), 1000) == 1
+    assert ledger.apply(app_call("add_employee_with_asset", [addresses[3], 50, 42]), 1000) == 1
+    assert ledger.get_employee(addresses[3])["asa_id"] == 42
+
+    ledger.apply(app_call("remove_employees", [addresses[:2]]), 1001)
+    assert [e["address"] for e in ledger.list_employees()] == [addresses[2], addresses[3]]
+
+def test_ignores_other_calls(ledger):
+    assert ledger.apply(app_call("get_total_employees", []), 1000) == 0
+
+def test_disburse_cycle_comes_from_the_previous_block(ledger, algod_client, indexer_client, addresses):
+    ledger.apply(app_call("add_employees", [[(a, 100) for a in addresses[:2]]]), 1000)
+    ledger.set_last_round(100)
+
+    # The block before round 101 is still in cycle 9 (63-69), whatever the
+    # timestamp of round 101 itself
+    indexer_client.transactions = [app_call("disburse", [addresses[:2]], 101, paid={addresses[0]: 100})]
+    indexer_client.timestamps = {100: 69}
+    indexer_client.current_round = 101
+    assert ledger.replay(algod_client, indexer_client) == 1
+    assert [e["last_paid_cycle"] for e in ledger.list_employees()] == [9, 0]
+    assert ledger.last_round == 101
+
+def test_replaying_a_round_twice(ledger, algod_client, indexer_client, addresses):
+    ledger.apply(app_call("add_streaming_employee", [addresses[0], 30]), 1000)
+
+    # The claim paid 42 for 9 of the 10 seconds accrued, as the box shows
+    algod_client.boxes[employee_key(addresses[0])] = employee_value(30, 0, stream_state=1009)
+    indexer_client.transactions = [app_call("claim", [addresses[0]], 101, paid={addresses[0]: 42})]
+    indexer_client.timestamps = {100: 1010}
+    indexer_client.current_round = 101
+
+    for _ in range(2):
+        ledger.set_last_round(100)
+        ledger.replay(algod_client, indexer_client)
+        assert ledger.get_employee(addresses[0])["stream_state"] == 1009
+
+def test_replay_drops_employees_removed_since(ledger, algod_client, indexer_client, addresses):
+    ledger.apply(app_call("add_streaming_employee", [addresses[0], 30]), 1000)
+    ledger.set_last_round(100)
+
+    # Paused, then removed in a round the indexer has not caught up with
+    indexer_client.transactions = [app_call("pause_employee", [addresses[0], True], 101)]
+    indexer_client.timestamps = {100: 1010}
+    indexer_client.current_round = 101
+    ledger.replay(algod_client, indexer_client)
+    assert ledger.get_employee(addresses[0]) is None
+
+def test_claim_moves_forward_by_the_time_paid(ledger, addresses):
+    ledger.apply(app_call("add_streaming_employee", [addresses[0], 30]), 1000)
+
+    # 10 seconds accrue 42 (30 * 10 / 7), which covers only 9 of them
+    ledger.apply(app_call("claim", [addresses[0]], paid={addresses[0]: 42}), 1010)
+    assert ledger.get_employee(addresses[0])["stream_state"] == 1009
+
+def test_deferred_claim_keeps_stream_state(ledger, addresses):
+    ledger.apply(app_call("add_streaming_employee", [addresses[0], 30]), 1000)
+    ledger.apply(app_call("claim", [addresses[0]]), 1010)
+    assert ledger.get_employee(addresses[0])["stream_state"] == 1000
+
+def test_pause_keeps_seconds_owed(ledger, addresses):
+    ledger.apply(app_call("add_streaming_employee", [addresses[0], 30]), 1000)
+
+    # A deferred settlement leaves all 10 seconds owed across the pause
+    ledger.apply(app_call("pause_employee", [addresses[0], True]), 1010)
+    employee = ledger.get_employee(addresses[0])
+    assert employee["paused"] and employee["stream_state"] == 10
+
+    ledger.apply(app_call("pause_employee", [addresses[0], False]), 2000)
+    employee = ledger.get_employee(addresses[0])
+    assert not employee["paused"] and employee["stream_state"] == 1990
+
+def test_pause_employee_paid_per_cycle(ledger, addresses):
+    ledger.apply(app_call("add_employee", [addresses[0], 100]), 1000)
+    ledger.apply(app_call("pause_employee", [addresses[0], True]), 1010)
+    employee = ledger.get_employee(addresses[0])
+    assert employee["paused"] and employee["stream_state"] is None
+
+def test_disburse_slots_marks_inner_receivers_paid(ledger, addresses):
+    ledger.apply(app_call("add_employees", [[(a, 100) for a in addresses[:3]]]), 1000)
+
+    # Slot ranges name no employees: only the inner payments tell who was paid
+    ledger.apply(app_call("disburse_slots", [0, 16], paid={addresses[0]: 100, addresses[2]: 100}), 70)
+    assert [e["last_paid_cycle"] for e in ledger.list_employees()] == [10, 0, 10]
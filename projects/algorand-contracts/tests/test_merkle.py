@@ -0,0 +1,77 @@
+import pytest
+from algosdk import encoding
+
+from smart_contracts.payroll_app.merkle import (
+    EMPTY_HASHES,
+    LEAF_PREFIX,
+    NODE_PREFIX,
+    MerkleTree,
+    build_tree,
+    leaf_hash,
+    node_hash,
+    sha512_256,
+    verify,
+)
+
+def employees(addresses: list[str], count: int) -> list[tuple[str, int, int]]:
+    return [(addresses[i], 100 * (i + 1), i % 2) for i in range(count)]
+
+@pytest.mark.parametrize("count", [1, 2, 3, 5, 8, 13, 16])
+def test_every_proof_verifies(addresses, count):
+    tree = build_tree(employees(addresses, count))
+    assert tree.depth == (count - 1).bit_length()
+    for index, employee in enumerate(employees(addresses, count)):
+        proof = tree.proof(index)
+        assert len(proof) == tree.depth
+        assert verify(tree.root, leaf_hash(*employee), index, proof)
+
+def test_proof_is_bound_to_its_leaf_and_index(addresses):
+    tree = build_tree(employees(addresses, 5))
+    leaf = leaf_hash(*employees(addresses, 5)[2])
+    assert not verify(tree.root, leaf, 3, tree.proof(2))
+    assert not verify(tree.root, leaf_hash(addresses[2], 301, 0), 2, tree.proof(2))
+
+def test_odd_trees_are_padded_with_empty_subtrees(addresses):
+    leaves = [leaf_hash(*employee) for employee in employees(addresses, 5)]
+    tree = MerkleTree(leaves)
+    tree.build()
+
+    # 5 leaves pad to 8: the last two pairs are an empty leaf and a whole
+    # empty subtree of height 1
+    left = node_hash(node_hash(leaves[0], leaves[1]), node_hash(leaves[2], leaves[3]))
+    right = node_hash(node_hash(leaves[4], EMPTY_HASHES[0]), EMPTY_HASHES[1])
+    assert tree.root == node_hash(left, right)
+    assert tree.proof(4) == [EMPTY_HASHES[0], EMPTY_HASHES[1], left]
+
+def test_empty_hashes():
+    assert EMPTY_HASHES[0] == bytes(32)
+    for height in range(1, 4):
+        assert EMPTY_HASHES[height] == node_hash(EMPTY_HASHES[height - 1], EMPTY_HASHES[height - 1])
+
+def test_power_of_two_tree_needs_no_padding(addresses):
+    leaves = [leaf_hash(*employee) for employee in employees(addresses, 4)]
+    tree = MerkleTree(leaves)
+    tree.build()
+    assert tree.root == node_hash(node_hash(leaves[0], leaves[1]), node_hash(leaves[2], leaves[3]))
+
+def test_leaves_and_nodes_are_domain_separated(addresses):
+    assert (LEAF_PREFIX, NODE_PREFIX) == (b"\x00", b"\x01")
+    preimage = encoding.decode_address(addresses[0]) + (1).to_bytes(8, "big") + (0).to_bytes(8, "big")
+    assert leaf_hash(addresses[0], 1, 0) == sha512_256(b"\x00" + preimage)
+
+    # The same bytes hash differently as a leaf and as a node, so an inner
+    # node can never be claimed as a leaf
+    left, right = leaf_hash(addresses[0], 1, 0), leaf_hash(addresses[1], 2, 0)
+    assert node_hash(left, right) == sha512_256(b"\x01" + left + right)
+    assert node_hash(left, right) != sha512_256(b"\x00" + left + right)
+
+def test_single_leaf_tree(addresses):
+    tree = build_tree([(addresses[0], 1, 0)])
+    assert tree.root == leaf_hash(addresses[0], 1, 0) and tree.proof(0) == []
+
+def test_tree_is_frozen_once_built(addresses):
+    tree = build_tree(employees(addresses, 2))
+    with pytest.raises(ValueError):
+        tree.add(bytes(32))
+    with pytest.raises(ValueError):
+        MerkleTree().build()